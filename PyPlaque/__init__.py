@@ -0,0 +1,10 @@
+import importlib
+
+SUBPACKAGES = ('bench', 'experiment', 'phenotypes', 'specimen', 'utils', 'view')
+
+
+def __getattr__(name):
+  # subpackages are imported on first access, e.g. PyPlaque.utils after import PyPlaque
+  if name in SUBPACKAGES:
+    return importlib.import_module(f"{__name__}.{name}")
+  raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
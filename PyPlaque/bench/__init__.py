@@ -0,0 +1,9 @@
+from PyPlaque.lazy_import import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+  'synthetic_plate': ['WELL_ROWS', 'well_names', 'synthetic_fluorescence_well',
+                      'synthetic_fluorescence_params', 'synthetic_crystal_violet_well',
+                      'make_fluorescence_plate', 'make_crystal_violet_plate'],
+  'benchmark': ['BENCHMARK_SUITES', 'benchmark_fluorescence', 'benchmark_crystal_violet',
+                'benchmark_preview', 'run_benchmarks', 'compare_benchmarks']
+})
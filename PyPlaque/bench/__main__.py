@@ -0,0 +1,92 @@
+import argparse
+import json
+import sys
+
+from PyPlaque.bench import BENCHMARK_SUITES, compare_benchmarks, run_benchmarks
+
+
+def _format(value, spec):
+  """
+  **_format Function**
+  Formats a result that may be undefined, i.e. None.
+  """
+  return 'n/a' if value is None else format(value, spec)
+
+
+def main(argv=None):
+  """
+  **main Function**
+  Runs the PyPlaque benchmarks from the command line, e.g.
+
+  ```
+  python -m PyPlaque.bench --output bench.json --wells 12 --image-size 2048
+  python -m PyPlaque.bench --output new.json --compare bench.json
+  python -m PyPlaque.bench --preview-factor 4
+  ```
+
+  With `--compare`, the exit status is 1 if any stage is slower than the baseline by more than the
+  tolerance.
+  """
+  parser = argparse.ArgumentParser(prog='python -m PyPlaque.bench',
+                                   description='Time the PyPlaque pipeline stages on synthetic '
+                                               'plates.')
+  parser.add_argument('--suite', choices=BENCHMARK_SUITES, action='append',
+                      help='benchmark to run, may be repeated (default: all)')
+  parser.add_argument('--output', help='JSON file for the results')
+  parser.add_argument('--folder', help='directory for the synthetic plates (default: temporary)')
+  parser.add_argument('--repeats', type=int, default=3, help='timed runs per benchmark')
+  parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic plates')
+  parser.add_argument('--wells', type=int, default=6, help='wells per plate')
+  parser.add_argument('--image-size', type=int, help='side length of the well images in pixels')
+  parser.add_argument('--plaques-per-well', type=float, help='mean number of plaques per well')
+  parser.add_argument('--plaque-radius', type=float, nargs=2, metavar=('MIN', 'MAX'),
+                      help='smallest and largest plaque radius in pixels')
+  parser.add_argument('--preview-factor', type=int,
+                      help='also compare the preview mode with this factor to full resolution')
+  parser.add_argument('--compare', metavar='BASELINE', help='JSON results to compare against')
+  parser.add_argument('--tolerance', type=float, default=0.2,
+                      help='accepted relative slowdown when comparing (default: 0.2)')
+  args = parser.parse_args(argv)
+
+  well_kwargs = {'n_wells': args.wells}
+  if args.image_size is not None:
+    well_kwargs['image_size'] = args.image_size
+  if args.plaques_per_well is not None:
+    well_kwargs['plaques_per_well'] = args.plaques_per_well
+  if args.plaque_radius is not None:
+    well_kwargs['plaque_radius'] = tuple(args.plaque_radius)
+
+  results = run_benchmarks(suites=args.suite or BENCHMARK_SUITES, output=args.output,
+                           folder=args.folder, repeats=args.repeats, seed=args.seed,
+                           fluorescence_kwargs=well_kwargs, crystal_violet_kwargs=well_kwargs,
+                           preview_factor=args.preview_factor)
+  for suite, stages in results['suites'].items():
+    for stage, times in stages.items():
+      print(f"{suite:>16} {stage:>20} {times['median']:10.4f} s")
+    print(f"{suite:>16} {'plaques found':>20} {sum(results['plaque_counts'][suite]):10d}")
+  for suite, preview in results.get('preview', {}).items():
+    print(f"{suite:>16} {'preview':>20} {preview['preview_time']:10.4f} s "
+          f"({_format(preview['speedup'], '.1f')}x)")
+    agreements = {'preview vs full': preview['agreement'],
+                  'full vs truth': preview['ground_truth_agreement']['full'],
+                  'preview vs truth': preview['ground_truth_agreement']['preview']}
+    for name, agreement in agreements.items():
+      print(f"{suite:>16} {name:>20} counts exact in {_format(agreement['exact'], '.0%')} of "
+            f"wells, relative error {_format(agreement['relative_error'], '.2f')}, "
+            f"correlation {_format(agreement['correlation'], '.2f')}")
+
+  if args.compare:
+    regressions = compare_benchmarks(args.compare, results, tolerance=args.tolerance)
+    for regression in regressions:
+      print(f"slower: {regression['suite']} {regression['stage']} "
+            f"{regression['baseline']:.4f} s -> {regression['current']:.4f} s "
+            f"({regression['ratio']:.2f}x)")
+    if regressions:
+      return 1
+  elif args.output is None:
+    json.dump(results, sys.stdout, indent=2)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
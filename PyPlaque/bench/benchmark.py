@@ -0,0 +1,419 @@
+from collections import defaultdict
+import datetime
+import json
+import os
+from pathlib import Path
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+from skimage.exposure import adjust_gamma
+import tifffile as TIFF
+
+from PyPlaque.bench.synthetic_plate import make_crystal_violet_plate, make_fluorescence_plate
+from PyPlaque.bench.synthetic_plate import synthetic_fluorescence_params
+from PyPlaque.experiment import CrystalViolet, FluorescenceMicroscopy
+from PyPlaque.specimen import PlaquesImageGray, PlaquesMask
+from PyPlaque.utils import count_agreement, get_plaque_mask, remove_artifacts, remove_background
+from PyPlaque.view import LabelImageReadout, PlateReadout
+
+try:
+  from PIL import Image as pil_image
+except ImportError:
+  pil_image = None
+
+BENCHMARK_SUITES = ('fluorescence', 'crystal_violet')
+
+
+class _StageTimes:
+  """
+  **_StageTimes Class**
+  Accumulates the wall time spent in each named stage of one benchmark run.
+  """
+  def __init__(self):
+    self.times = defaultdict(float)
+
+  def __call__(self, stage, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    self.times[stage] += time.perf_counter() - start
+    return result
+
+
+def _fluorescence_run(image_files, params):
+  """
+  **_fluorescence_run Function**
+  Runs the fluorescence pipeline once over all wells of a plate and returns the time of each stage
+  and the plaque count of each well.
+  """
+  timer = _StageTimes()
+  counts = []
+  nuclei_params, virus_params = params['nuclei'], params['virus']
+  for nuclei_file, virus_file in image_files:
+    nuclei_image = timer('load', TIFF.imread, nuclei_file)
+    virus_image = timer('load', TIFF.imread, virus_file)
+    nuclei_image = timer('artifact_removal', remove_artifacts, nuclei_image,
+                         nuclei_params['artifact_threshold'])
+    bg_removed_image = timer('background_removal', remove_background, nuclei_image,
+                             radius=nuclei_params['correction_ball_radius'],
+                             method=nuclei_params.get('correction_method', 'opencv'))[1]
+    nuclei_mask = np.where(bg_removed_image > nuclei_params['manual_threshold'], 1, 0)
+    virus_mask, virus_peaks = timer('segmentation', get_plaque_mask, virus_image, virus_params)
+
+    def readouts():
+      readout = LabelImageReadout(nuclei_image_name=Path(nuclei_file).name,
+                                  plaque_image_name=Path(virus_file).name,
+                                  nuclei_image=nuclei_image,
+                                  plaque_image=virus_image,
+                                  nuclei_mask=nuclei_mask,
+                                  plaque_mask=virus_mask,
+                                  virus_params=virus_params,
+                                  global_peak_coords=virus_peaks)
+      return readout.get_well_readouts(), readout.get_mean_object_readouts()
+
+    well_readouts, _ = timer('readouts', readouts)
+    counts.append(int(well_readouts['numberOfPlaques']))
+  return dict(timer.times), counts
+
+
+def _crystal_violet_run(image_files, params):
+  """
+  **_crystal_violet_run Function**
+  Runs the crystal violet pipeline once over all wells of a plate and returns the time of each
+  stage and the plaque count of each well.
+  """
+  timer = _StageTimes()
+  counts = []
+  cv_params = params['crystal_violet']
+  for image_file in image_files:
+    image = timer('load', lambda f: np.asarray(pil_image.open(f).convert('L')), image_file)
+
+    def segmentation():
+      img_gadjusted = adjust_gamma(image, gamma=cv_params['gamma'], gain=cv_params['gain'])
+      return PlaquesImageGray(Path(image_file).stem, img_gadjusted,
+                              threshold=cv_params['threshold'], sigma=cv_params['sigma'])
+
+    plaques_mask = timer('segmentation', segmentation).plaques_mask
+
+    def readouts():
+      # binary uint8 masks, as read from disk, for the OpenCV contour based measures
+      plaques_image = PlaquesMask(Path(image_file).stem, plaques_mask.astype(np.uint8))
+      plaques = plaques_image.get_plaques(cv_params['min_area'], cv_params['max_area'])
+      return len(plaques), plaques_image.get_measure(plaques)
+
+    count, _ = timer('readouts', readouts)
+    counts.append(count)
+  return dict(timer.times), counts
+
+
+def _summarise(runs):
+  """
+  **_summarise Function**
+  Summarises the stage times of repeated runs with their minimum, median and mean, and returns
+  them with the plaque counts of the last run.
+  """
+  counts = runs[-1][1]
+  runs = [times for times, _ in runs]
+  stages = {}
+  for stage in runs[0]:
+    times = [run[stage] for run in runs]
+    stages[stage] = {'times': times, 'min': float(np.min(times)),
+                     'median': float(np.median(times)), 'mean': float(np.mean(times))}
+  totals = [sum(run.values()) for run in runs]
+  stages['total'] = {'times': totals, 'min': float(np.min(totals)),
+                     'median': float(np.median(totals)), 'mean': float(np.mean(totals))}
+  return stages, counts
+
+
+def _fluorescence_suite(folder, n_wells=6, repeats=3, seed=0, params=None, **well_kwargs):
+  """
+  **_fluorescence_suite Function**
+  Runs `benchmark_fluorescence` and returns its stage times together with the plaque count of
+  every well.
+  """
+  image_folder, mask_folder, _ = make_fluorescence_plate(folder, n_wells=n_wells, seed=seed,
+                                                         **well_kwargs)
+  exp = FluorescenceMicroscopy(image_folder, mask_folder,
+                               params=params or synthetic_fluorescence_params(**well_kwargs))
+  exp.get_individual_plates()
+  image_files = list(zip(exp.get_image_files(file_pattern=r'_w1'),
+                         exp.get_image_files(file_pattern=r'_w2')))
+  return _summarise([_fluorescence_run(image_files, exp.get_params()) for _ in range(repeats)])
+
+
+def benchmark_fluorescence(folder, n_wells=6, repeats=3, seed=0, params=None, **well_kwargs):
+  """
+  **benchmark_fluorescence Function**
+  This function writes a synthetic fluorescence plate and times the stages of the fluorescence
+  pipeline on it: 'load' (decoding the TIFF files), 'artifact_removal', 'background_removal'
+  (nuclei channel), 'segmentation' (plaque mask and peaks of the virus channel) and 'readouts'
+  (well and object level readouts). The whole plate is processed `repeats` times.
+
+  Args:
+    folder (str or Path, required): The directory in which the synthetic plate is written.
+    n_wells (int, optional): The number of wells. Defaults to 6.
+    repeats (int, optional): The number of timed runs over the plate. Defaults to 3.
+    seed (int, optional): The seed of the synthetic plate. Defaults to 0.
+    params (dict, optional): The parameters of `FluorescenceMicroscopy`. Defaults to None, which
+                            uses `synthetic_fluorescence_params` matched to the wells.
+    **well_kwargs: Keyword arguments passed to `synthetic_fluorescence_well`.
+
+  Returns:
+    dict: The minimum, median, mean and individual times in seconds of each stage and of their
+    total, by stage name.
+  """
+  return _fluorescence_suite(folder, n_wells, repeats, seed, params, **well_kwargs)[0]
+
+
+def _crystal_violet_suite(folder, n_wells=6, repeats=3, seed=0, params=None, **well_kwargs):
+  """
+  **_crystal_violet_suite Function**
+  Runs `benchmark_crystal_violet` and returns its stage times together with the plaque count of
+  every well.
+  """
+  if pil_image is None:
+    raise ImportError("Could not import PIL.Image. The crystal violet benchmark requires PIL.")
+  image_folder, mask_folder, _ = make_crystal_violet_plate(folder, n_wells=n_wells, seed=seed,
+                                                           **well_kwargs)
+  exp = CrystalViolet(image_folder, mask_folder, params=params)
+  exp.get_individual_plates()
+  image_files = sorted((Path(image_folder) / exp.plate_indiv_dir[0]).glob('*.png'))
+  return _summarise([_crystal_violet_run(image_files, exp.get_params()) for _ in range(repeats)])
+
+
+def benchmark_crystal_violet(folder, n_wells=6, repeats=3, seed=0, params=None, **well_kwargs):
+  """
+  **benchmark_crystal_violet Function**
+  This function writes a synthetic crystal violet plate and times the stages of the crystal
+  violet pipeline on it: 'load' (decoding the PNG files), 'segmentation' (gamma adjustment and
+  fixed thresholding) and 'readouts' (plaque objects and their measures). The whole plate is
+  processed `repeats` times.
+
+  Args:
+    folder (str or Path, required): The directory in which the synthetic plate is written.
+    n_wells (int, optional): The number of wells. Defaults to 6.
+    repeats (int, optional): The number of timed runs over the plate. Defaults to 3.
+    seed (int, optional): The seed of the synthetic plate. Defaults to 0.
+    params (dict, optional): The parameters of `CrystalViolet`. Defaults to None, which uses its
+                            default parameters.
+    **well_kwargs: Keyword arguments passed to `synthetic_crystal_violet_well`.
+
+  Returns:
+    dict: The minimum, median, mean and individual times in seconds of each stage and of their
+    total, by stage name.
+
+  Raises:
+    ImportError: If PIL is not available.
+  """
+  return _crystal_violet_suite(folder, n_wells, repeats, seed, params, **well_kwargs)[0]
+
+
+def _plaque_counts(exp, preview):
+  """
+  **_plaque_counts Function**
+  Returns the plaque count of every well of the first plate of an experiment, loaded at full
+  resolution or as a preview.
+  """
+  if isinstance(exp, FluorescenceMicroscopy):
+    readout = PlateReadout(exp, object_level_readouts=False)
+    wells = exp.iter_wells(nuclei_file_pattern=r'_w1', virus_file_pattern=r'_w2', prefetch=0,
+                           preview=preview)
+    well_df = readout.generate_readouts_dataframe(wells=wells)
+    return [int(count) for count in well_df['numberOfPlaques']]
+  exp.load_well_images_and_masks_for_plate(read_mask=False, all_grayscale=True, preview=preview)
+  return exp.get_plaque_counts()
+
+
+def benchmark_preview(folder, suite='fluorescence', factor=4, n_wells=6, repeats=3, seed=0,
+                      params=None, **well_kwargs):
+  """
+  **benchmark_preview Function**
+  This function writes a synthetic plate and compares the plaque counts of the preview mode of
+  `FluorescenceMicroscopy` or `CrystalViolet`, which segments images reduced by `factor` with
+  scaled parameters, with the counts at full resolution and with the plaques drawn by the
+  generator. Both modes are timed end to end, from decoding the files to the per-well plaque
+  counts, and the counts are compared with `count_agreement`. The generator counts plaques that
+  overlap or lie partly outside of the well, so even full resolution does not match it exactly.
+
+  Args:
+    folder (str or Path, required): The directory in which the synthetic plate is written.
+    suite (str, optional): 'fluorescence' or 'crystal_violet'. Defaults to 'fluorescence'.
+    factor (int, optional): The preview factor. Defaults to 4.
+    n_wells (int, optional): The number of wells. Defaults to 6.
+    repeats (int, optional): The number of timed runs of each mode. Defaults to 3.
+    seed (int, optional): The seed of the synthetic plate. Defaults to 0.
+    params (dict, optional): The parameters of the experiment. Defaults to None, which uses the
+                            default parameters of `CrystalViolet`, and for fluorescence
+                            parameters matched to the plaque radii of the synthetic wells.
+    **well_kwargs: Keyword arguments passed to the synthetic well generator.
+
+  Returns:
+    dict: A dictionary containing:
+        - 'factor' (int): The preview factor.
+        - 'full_time', 'preview_time' (float): The minimum time of each mode in seconds.
+        - 'speedup' (float): The ratio of the times.
+        - 'full_counts', 'preview_counts', 'ground_truth_counts' (list): The plaque counts of
+          every well.
+        - 'agreement' (dict): The `count_agreement` of the preview with full resolution.
+        - 'ground_truth_agreement' (dict): The `count_agreement` of the ground truth with the
+          'full' and the 'preview' counts.
+
+  Raises:
+    ValueError: If `suite` is unknown.
+  """
+  if suite == 'fluorescence':
+    image_folder, mask_folder, ground_truth = make_fluorescence_plate(folder, n_wells=n_wells,
+                                                                      seed=seed, **well_kwargs)
+    params = params or synthetic_fluorescence_params(**well_kwargs)
+    exp = FluorescenceMicroscopy(image_folder, mask_folder, params=params, preview_factor=factor)
+  elif suite == 'crystal_violet':
+    image_folder, mask_folder, ground_truth = make_crystal_violet_plate(folder, n_wells=n_wells,
+                                                                        seed=seed, **well_kwargs)
+    exp = CrystalViolet(image_folder, mask_folder, params=params, preview_factor=factor)
+  else:
+    raise ValueError(f"Unknown benchmark suite {suite}, expected one of {BENCHMARK_SUITES}")
+  exp.get_individual_plates()
+
+  times = {False: [], True: []}
+  counts = {}
+  for _ in range(repeats):
+    for preview in (False, True):
+      start = time.perf_counter()
+      counts[preview] = _plaque_counts(exp, preview)
+      times[preview].append(time.perf_counter() - start)
+  full_time, preview_time = min(times[False]), min(times[True])
+  # the wells are counted in the sorted order of their file names
+  ground_truth_counts = [len(ground_truth[well]) for well in sorted(ground_truth)]
+  return {
+    'factor': factor,
+    'full_time': full_time,
+    'preview_time': preview_time,
+    'speedup': full_time / preview_time if preview_time > 0 else None,
+    'full_counts': counts[False],
+    'preview_counts': counts[True],
+    'ground_truth_counts': ground_truth_counts,
+    'agreement': count_agreement(counts[False], counts[True]),
+    'ground_truth_agreement': {'full': count_agreement(ground_truth_counts, counts[False]),
+                               'preview': count_agreement(ground_truth_counts, counts[True])}
+  }
+
+
+def _git_commit():
+  """
+  **_git_commit Function**
+  Returns the commit of the PyPlaque source tree, or None outside of a git checkout.
+  """
+  try:
+    return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=Path(__file__).parent,
+                          capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def run_benchmarks(suites=BENCHMARK_SUITES, output=None, folder=None, repeats=3, seed=0,
+                   fluorescence_kwargs=None, crystal_violet_kwargs=None, preview_factor=None):
+  """
+  **run_benchmarks Function**
+  This function runs the fluorescence and crystal violet benchmarks on reproducible synthetic
+  plates and collects their stage times together with the commit, the Python and numpy versions
+  and the configuration, so that results of different commits can be compared with
+  `compare_benchmarks`. The plaque count found in every well is recorded under 'plaque_counts',
+  so that a run timing a pipeline that finds nothing is easy to spot.
+
+  Args:
+    suites (tuple, optional): The benchmarks to run, any of 'fluorescence' and 'crystal_violet'.
+                            Defaults to both.
+    output (str or Path, optional): A JSON file to which the results are written. Defaults to None.
+    folder (str or Path, optional): The directory in which the synthetic plates are written.
+                                    Defaults to None, which uses a temporary directory.
+    repeats (int, optional): The number of timed runs of each benchmark. Defaults to 3.
+    seed (int, optional): The seed of the synthetic plates. Defaults to 0.
+    fluorescence_kwargs (dict, optional): Keyword arguments of `benchmark_fluorescence`, e.g.
+                                          `n_wells`, `image_size` or `plaques_per_well`.
+                                          Defaults to None.
+    crystal_violet_kwargs (dict, optional): Keyword arguments of `benchmark_crystal_violet`.
+                                            Defaults to None.
+    preview_factor (int, optional): If set, the preview mode with this factor is also compared
+                                  with full resolution on the plate of every suite with
+                                  `benchmark_preview`, under 'preview' in the results. Defaults
+                                  to None.
+
+  Returns:
+    dict: The benchmark results.
+
+  Raises:
+    ValueError: If an unknown suite is requested.
+  """
+  unknown = set(suites) - set(BENCHMARK_SUITES)
+  if unknown:
+    raise ValueError(f"Unknown benchmark suites {sorted(unknown)}, expected {BENCHMARK_SUITES}")
+  kwargs = {'fluorescence': dict(fluorescence_kwargs or {}),
+            'crystal_violet': dict(crystal_violet_kwargs or {})}
+  benchmarks = {'fluorescence': _fluorescence_suite,
+                'crystal_violet': _crystal_violet_suite}
+
+  results = {
+    'commit': _git_commit(),
+    'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    'python': platform.python_version(),
+    'numpy': np.__version__,
+    'platform': platform.platform(),
+    'cpu_count': os.cpu_count(),
+    'config': {'repeats': repeats, 'seed': seed},
+    'suites': {},
+    'plaque_counts': {}
+  }
+  with tempfile.TemporaryDirectory() as tmp_folder:
+    for suite in suites:
+      results['config'][suite] = kwargs[suite]
+      (results['suites'][suite],
+       results['plaque_counts'][suite]) = benchmarks[suite](Path(folder or tmp_folder) / suite,
+                                                            repeats=repeats, seed=seed,
+                                                            **kwargs[suite])
+      if preview_factor is not None:
+        results['config']['preview_factor'] = preview_factor
+        results.setdefault('preview', {})[suite] = benchmark_preview(
+          Path(folder or tmp_folder) / suite, suite, preview_factor, repeats=repeats, seed=seed,
+          **kwargs[suite])
+
+  if output is not None:
+    with open(output, 'w') as f:
+      json.dump(results, f, indent=2)
+  return results
+
+
+def compare_benchmarks(baseline, current, tolerance=0.2):
+  """
+  **compare_benchmarks Function**
+  This function compares two sets of benchmark results, e.g. of two commits, and returns the
+  stages whose median time grew by more than `tolerance`.
+
+  Args:
+    baseline (dict or str or Path, required): The reference results or their JSON file.
+    current (dict or str or Path, required): The new results or their JSON file.
+    tolerance (float, optional): The accepted relative slowdown. Defaults to 0.2.
+
+  Returns:
+    list: A list of dictionaries with the 'suite', 'stage', 'baseline' and 'current' median times
+    and their 'ratio', for every stage that became slower than accepted.
+  """
+  if not isinstance(baseline, dict):
+    with open(baseline) as f:
+      baseline = json.load(f)
+  if not isinstance(current, dict):
+    with open(current) as f:
+      current = json.load(f)
+
+  regressions = []
+  for suite, stages in current['suites'].items():
+    for stage, times in stages.items():
+      reference = baseline['suites'].get(suite, {}).get(stage)
+      if reference is None or reference['median'] <= 0:
+        continue
+      ratio = times['median'] / reference['median']
+      if ratio > 1 + tolerance:
+        regressions.append({'suite': suite, 'stage': stage, 'baseline': reference['median'],
+                            'current': times['median'], 'ratio': ratio})
+  return regressions
@@ -0,0 +1,241 @@
+import math
+from pathlib import Path
+
+import cv2
+import numpy as np
+import tifffile as TIFF
+
+WELL_ROWS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def well_names(n_wells, ncols=12):
+  """
+  **well_names Function**
+  Returns the names of the first `n_wells` wells of a plate in row-major order, e.g. 'A01', 'A02'.
+
+  Args:
+    n_wells (int, required): The number of wells.
+    ncols (int, optional): The number of columns of the plate. Defaults to 12.
+
+  Returns:
+    list: The well names.
+
+  Raises:
+    ValueError: If the wells do not fit into 26 rows.
+  """
+  if n_wells > len(WELL_ROWS) * ncols:
+    raise ValueError(f"{n_wells} wells do not fit into a plate with {ncols} columns")
+  return [f"{WELL_ROWS[i // ncols]}{i % ncols + 1:02d}" for i in range(n_wells)]
+
+
+def _draw_plaques(rng, image_size, plaques_per_well, plaque_radius):
+  """
+  **_draw_plaques Function**
+  Draws the number, centres and radii of the plaques of a well. The number of plaques is Poisson
+  distributed and the radii are log-uniform between the bounds of `plaque_radius`.
+  """
+  n_plaques = rng.poisson(plaques_per_well)
+  min_radius, max_radius = plaque_radius
+  radii = np.exp(rng.uniform(math.log(min_radius), math.log(max_radius), n_plaques))
+  centres = rng.uniform(0, image_size, (n_plaques, 2))
+  return [(float(r), float(c), float(radius)) for (r, c), radius in zip(centres, radii)]
+
+
+def synthetic_fluorescence_well(image_size=1024,
+                                plaques_per_well=3,
+                                plaque_radius=(20, 80),
+                                nuclei_spacing=10,
+                                seed=None):
+  """
+  **synthetic_fluorescence_well Function**
+  This function generates the nuclei and virus channel images of a synthetic fluorescence well.
+  Nuclei are small bright disks on a jittered grid over a noisy background. Each plaque is a
+  Gaussian intensity profile in the virus channel that is restricted to the nuclei it covers, so
+  that plaques consist of separate infected cells like in real data.
+
+  Args:
+    image_size (int, optional): The side length of the square images in pixels. Defaults to 1024.
+    plaques_per_well (float, optional): The mean number of plaques per well. Defaults to 3.
+    plaque_radius (tuple, optional): The smallest and largest plaque radius (the standard deviation
+                                    of the intensity profile) in pixels. Defaults to (20, 80).
+    nuclei_spacing (int, optional): The distance between neighbouring nuclei in pixels.
+                                  Defaults to 10.
+    seed (int or np.random.SeedSequence, optional): The seed of the random generator.
+                                                    Defaults to None.
+
+  Returns:
+    tuple: A tuple containing three elements:
+        - nuclei_image (np.ndarray): A 2D uint16 numpy array of the nuclei channel.
+        - virus_image (np.ndarray): A 2D uint16 numpy array of the virus channel.
+        - plaques (list): The (row, column, radius) of every plaque.
+  """
+  rng = np.random.default_rng(seed)
+  n = image_size
+  nuclei = np.zeros((n, n), dtype=np.float32)
+  grid = np.arange(nuclei_spacing // 2, n, nuclei_spacing)
+  rows, cols = np.meshgrid(grid, grid, indexing='ij')
+  jitter = rng.integers(-(nuclei_spacing // 4), nuclei_spacing // 4 + 1, (2,) + rows.shape)
+  nuclei[np.clip(rows + jitter[0], 0, n - 1), np.clip(cols + jitter[1], 0, n - 1)] = 1
+  nucleus_size = max(3, nuclei_spacing // 3) | 1
+  nuclei = cv2.dilate(nuclei, cv2.getStructuringElement(cv2.MORPH_ELLIPSE,
+                                                        (nucleus_size, nucleus_size)))
+
+  plaques = _draw_plaques(rng, n, plaques_per_well, plaque_radius)
+  profile = np.zeros((n, n), dtype=np.float32)
+  for (r, c, radius) in plaques:
+    # only the box within four radii of the centre contributes
+    r0, r1 = max(0, int(r - 4*radius)), min(n, int(r + 4*radius) + 1)
+    c0, c1 = max(0, int(c - 4*radius)), min(n, int(c + 4*radius) + 1)
+    yy, xx = np.ogrid[r0:r1, c0:c1]
+    profile[r0:r1, c0:c1] += np.exp(-((yy - r)**2 + (xx - c)**2) / (2*radius**2))
+
+  nuclei_image = 500 + 5000*nuclei + rng.normal(0, 100, (n, n))
+  virus_image = 300 + 12000*np.minimum(profile, 1)*nuclei + rng.normal(0, 100, (n, n))
+  return (np.clip(nuclei_image, 0, 65535).astype(np.uint16),
+          np.clip(virus_image, 0, 65535).astype(np.uint16), plaques)
+
+
+def synthetic_fluorescence_params(plaque_radius=(20, 80), nuclei_spacing=10, **well_kwargs):
+  """
+  **synthetic_fluorescence_params Function**
+  This function returns parameters of `FluorescenceMicroscopy` matched to the wells of
+  `synthetic_fluorescence_well`. Only the infected nuclei of a plaque are above the virus
+  threshold, so the default 'min_plaque_area' drops most synthetic plaques. Here it is half of
+  the infected area of the smallest plaque, whose profile stays above the threshold up to about
+  twice its radius, and the smoothing and the peak region grow with the smallest radius.
+
+  Args:
+    plaque_radius (tuple, optional): The smallest and largest plaque radius of the wells.
+                                    Defaults to (20, 80).
+    nuclei_spacing (int, optional): The distance between neighbouring nuclei. Defaults to 10.
+    **well_kwargs: Further keyword arguments of `synthetic_fluorescence_well`, which do not
+                  affect the parameters.
+
+  Returns:
+    dict: The parameters, with the 'nuclei' and 'virus' parameters of `FluorescenceMicroscopy`.
+  """
+  from PyPlaque.experiment import FluorescenceMicroscopy
+
+  min_radius = plaque_radius[0]
+  nucleus_size = max(3, nuclei_spacing // 3) | 1
+  nucleus_area = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (nucleus_size, nucleus_size)).sum()
+  infected_area = math.pi*(2*min_radius)**2*nucleus_area/nuclei_spacing**2
+  params = FluorescenceMicroscopy('.', '.').get_params()
+  params['virus'].update({
+    'min_plaque_area': max(1, int(infected_area/2)),
+    'plaque_gaussian_filter_sigma': max(1, int(round(2.5*min_radius))),
+    'plaque_gaussian_filter_size': max(1, int(round(5*min_radius))),
+    'peak_region_size': max(1, int(round(2.5*min_radius)))
+  })
+  return params
+
+
+def synthetic_crystal_violet_well(image_size=512,
+                                  plaques_per_well=20,
+                                  plaque_radius=(5, 8),
+                                  seed=None):
+  """
+  **synthetic_crystal_violet_well Function**
+  This function generates the grayscale image of a synthetic crystal violet well, with bright
+  round plaques on a dark, unevenly stained cell monolayer inside a circular well.
+
+  Args:
+    image_size (int, optional): The side length of the square image in pixels. Defaults to 512.
+    plaques_per_well (float, optional): The mean number of plaques per well. Defaults to 20.
+    plaque_radius (tuple, optional): The smallest and largest plaque radius in pixels.
+                                    Defaults to (5, 8).
+    seed (int or np.random.SeedSequence, optional): The seed of the random generator.
+                                                    Defaults to None.
+
+  Returns:
+    tuple: A tuple containing two elements:
+        - image (np.ndarray): A 2D uint8 numpy array of the well.
+        - plaques (list): The (row, column, radius) of every plaque.
+  """
+  rng = np.random.default_rng(seed)
+  n = image_size
+  yy, xx = np.mgrid[:n, :n] / n
+  image = 30 + 15*np.sin(6*xx + rng.uniform(0, 2*np.pi))*np.cos(5*yy) + rng.normal(0, 6, (n, n))
+  plaques = _draw_plaques(rng, n, plaques_per_well, plaque_radius)
+  plaque_mask = np.zeros((n, n), dtype=np.uint8)
+  for (r, c, radius) in plaques:
+    cv2.circle(plaque_mask, (int(round(c)), int(round(r))), int(round(radius)), 1, -1)
+  image[plaque_mask > 0] += 140
+  # outside of the well
+  image[(yy - 0.5)**2 + (xx - 0.5)**2 > 0.49**2] = 0
+  return np.clip(image, 0, 255).astype(np.uint8), plaques
+
+
+def make_fluorescence_plate(folder,
+                            n_wells=12,
+                            plate_name='plate1',
+                            seed=0,
+                            **well_kwargs):
+  """
+  **make_fluorescence_plate Function**
+  This function writes a reproducible synthetic fluorescence plate in the folder layout expected
+  by `FluorescenceMicroscopy`: `<folder>/images/<plate_name>/<plate_name>_<well>_s1_w1.tif` for
+  the nuclei channel, `..._w2.tif` for the virus channel and an empty
+  `<folder>/masks/<plate_name>` directory. Every well has its own seed derived from `seed`, so the
+  same arguments always give the same plate.
+
+  Args:
+    folder (str or Path, required): The directory in which the plate is written.
+    n_wells (int, optional): The number of wells. Defaults to 12.
+    plate_name (str, optional): The name of the plate directory. Defaults to 'plate1'.
+    seed (int, optional): The seed of the plate. Defaults to 0.
+    **well_kwargs: Keyword arguments passed to `synthetic_fluorescence_well`, e.g. `image_size`,
+                  `plaques_per_well` or `plaque_radius`.
+
+  Returns:
+    tuple: The image folder and the mask folder as strings, ready for `FluorescenceMicroscopy`,
+    and a dictionary of the plaques of each well.
+  """
+  image_folder = Path(folder) / 'images'
+  mask_folder = Path(folder) / 'masks'
+  (image_folder / plate_name).mkdir(parents=True, exist_ok=True)
+  (mask_folder / plate_name).mkdir(parents=True, exist_ok=True)
+
+  ground_truth = {}
+  for well, well_seed in zip(well_names(n_wells), np.random.SeedSequence(seed).spawn(n_wells)):
+    nuclei_image, virus_image, plaques = synthetic_fluorescence_well(seed=well_seed,
+                                                                     **well_kwargs)
+    TIFF.imwrite(image_folder / plate_name / f"{plate_name}_{well}_s1_w1.tif", nuclei_image)
+    TIFF.imwrite(image_folder / plate_name / f"{plate_name}_{well}_s1_w2.tif", virus_image)
+    ground_truth[well] = plaques
+  return str(image_folder), str(mask_folder), ground_truth
+
+
+def make_crystal_violet_plate(folder,
+                              n_wells=6,
+                              plate_name='plate1',
+                              seed=0,
+                              **well_kwargs):
+  """
+  **make_crystal_violet_plate Function**
+  This function writes a reproducible synthetic crystal violet plate in the folder layout expected
+  by `CrystalViolet`: one grayscale PNG per well in `<folder>/images/<plate_name>/<well>.png` and an
+  empty `<folder>/masks/<plate_name>` directory.
+
+  Args:
+    folder (str or Path, required): The directory in which the plate is written.
+    n_wells (int, optional): The number of wells. Defaults to 6.
+    plate_name (str, optional): The name of the plate directory. Defaults to 'plate1'.
+    seed (int, optional): The seed of the plate. Defaults to 0.
+    **well_kwargs: Keyword arguments passed to `synthetic_crystal_violet_well`.
+
+  Returns:
+    tuple: The image folder and the mask folder as strings, ready for `CrystalViolet`, and a
+    dictionary of the plaques of each well.
+  """
+  image_folder = Path(folder) / 'images'
+  mask_folder = Path(folder) / 'masks'
+  (image_folder / plate_name).mkdir(parents=True, exist_ok=True)
+  (mask_folder / plate_name).mkdir(parents=True, exist_ok=True)
+
+  ground_truth = {}
+  for well, well_seed in zip(well_names(n_wells), np.random.SeedSequence(seed).spawn(n_wells)):
+    image, plaques = synthetic_crystal_violet_well(seed=well_seed, **well_kwargs)
+    cv2.imwrite(str(image_folder / plate_name / f"{well}.png"), image)
+    ground_truth[well] = plaques
+  return str(image_folder), str(mask_folder), ground_truth
@@ -0,0 +1,411 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import json
+import os
+from pathlib import Path
+import re
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+RUN_EXPERIMENTS = ('fluorescence', 'crystal_violet')
+
+DEFAULT_RUN_CONFIG = {
+  'experiment': 'fluorescence',
+  'plate_folder': None,
+  'plate_mask_folder': None,
+  'output': None,
+  'folder_pattern': None,
+  'additional_subfolders': None,
+  'params': {},
+  # fluorescence
+  'nuclei_file_pattern': r'_w1',
+  'virus_file_pattern': r'_w2',
+  'row_pattern': r'([A-Z]{1})[0-9]{2}',
+  'column_pattern': r'[A-Z]{1}([0-9]{2})',
+  'prefetch': 2,
+  'cache': None,
+  'stack_folder': None,
+  # crystal violet
+  'file_pattern': None,
+  'read_mask': False,
+  # default extension is '*.tif' for fluorescence and '*.png' for crystal violet plates
+  'ext': None
+}
+
+
+def load_run_config(config):
+  """
+  **load_run_config Function**
+  This function reads the configuration of a batch run from a JSON file, or takes it as a
+  dictionary, and fills in the defaults of `DEFAULT_RUN_CONFIG`. A configuration names the
+  'experiment' type ('fluorescence' or 'crystal_violet'), the 'plate_folder' and
+  'plate_mask_folder' of the experiment, the 'output' directory and optionally the folder and
+  file patterns and the 'params' of the experiment. Parameters are merged channel by channel into
+  the default parameters of the experiment, e.g. `{"virus": {"min_plaque_area": 500}}` only
+  changes the minimum plaque area.
+
+  Args:
+    config (str or Path or dict, required): The JSON file or the configuration dictionary.
+
+  Returns:
+    dict: The complete configuration.
+
+  Raises:
+    ValueError: If a required entry is missing or the configuration has unknown entries or an
+    unknown experiment type.
+  """
+  if not isinstance(config, dict):
+    with open(config) as f:
+      config = json.load(f)
+  unknown = set(config) - set(DEFAULT_RUN_CONFIG)
+  if unknown:
+    raise ValueError(f"Unknown configuration entries {sorted(unknown)}")
+  full_config = copy.deepcopy(DEFAULT_RUN_CONFIG)
+  full_config.update(copy.deepcopy(config))
+  for key in ('plate_folder', 'plate_mask_folder', 'output'):
+    if not full_config[key]:
+      raise ValueError(f"The configuration requires '{key}'")
+  if full_config['experiment'] not in RUN_EXPERIMENTS:
+    raise ValueError(f"Unknown experiment {full_config['experiment']}, expected one of "
+                     f"{RUN_EXPERIMENTS}")
+  if full_config['ext'] is None:
+    full_config['ext'] = '*.tif' if full_config['experiment'] == 'fluorescence' else '*.png'
+  return full_config
+
+
+def _make_experiment(config):
+  """
+  **_make_experiment Function**
+  Creates the experiment of a run configuration with its parameters merged into the defaults.
+  """
+  from PyPlaque.experiment import CrystalViolet, FluorescenceMicroscopy
+
+  plate_folder, mask_folder = str(config['plate_folder']), str(config['plate_mask_folder'])
+  if config['experiment'] == 'fluorescence':
+    params = FluorescenceMicroscopy(plate_folder, mask_folder).get_params()
+  else:
+    params = CrystalViolet(plate_folder, mask_folder).get_params()
+  for (channel, channel_params) in config['params'].items():
+    params.setdefault(channel, {}).update(channel_params)
+
+  if config['experiment'] == 'fluorescence':
+    exp = FluorescenceMicroscopy(plate_folder, mask_folder, params=params, cache=config['cache'],
+                                 stack_folder=config['stack_folder'])
+  else:
+    exp = CrystalViolet(plate_folder, mask_folder, params=params, cache=config['cache'])
+  exp.get_individual_plates(folder_pattern=config['folder_pattern'])
+  return exp
+
+
+def _json_default(value):
+  """
+  **_json_default Function**
+  Converts numpy scalars and arrays, which `json` cannot serialise, into Python values.
+  """
+  if isinstance(value, (np.generic, np.ndarray)):
+    return value.tolist()
+  return str(value)
+
+
+def _write_json(path, data):
+  """
+  **_write_json Function**
+  Writes a JSON file atomically, so that an interrupted run never leaves a partial file.
+  """
+  with tempfile.NamedTemporaryFile('w', dir=path.parent, suffix=".json.tmp", delete=False) as f:
+    json.dump(data, f, default=_json_default)
+  os.replace(f.name, path)
+
+
+class RunManifest:
+  """
+  **RunManifest Class**
+  This class records the wells and plates completed by batch runs in JSON lines files
+  `<output>/manifest/<name>.jsonl`. Every process of a run appends to its own file and all files
+  are read when a run resumes. Lines are flushed and synced as soon as a well is complete, so an
+  interrupted run loses at most the well in progress.
+
+  Attributes:
+    output (str or Path, required): The output directory of the run.
+    name (str, optional): The name of the manifest file written by this process.
+                        Defaults to 'manifest'.
+  """
+  def __init__(self, output, name='manifest'):
+    self.folder = Path(output) / "manifest"
+    self.folder.mkdir(parents=True, exist_ok=True)
+    self.path = self.folder / f"{name}.jsonl"
+    self.wells = {}
+    self.plates = set()
+    self.reload()
+
+  def reload(self):
+    """
+    **reload Method**
+    Reads the completed wells and plates from all manifest files. Incomplete lines of interrupted
+    runs are ignored.
+    """
+    self.wells, self.plates = {}, set()
+    for path in sorted(self.folder.glob("*.jsonl")):
+      with open(path) as f:
+        for line in f:
+          try:
+            entry = json.loads(line)
+          except json.JSONDecodeError:
+            continue
+          if entry.get('well') is None:
+            self.plates.add(entry['plate'])
+          else:
+            self.wells.setdefault(entry['plate'], set()).add(entry['well'])
+
+  def _append(self, entry):
+    """
+    **_append Method**
+    Appends an entry to the manifest file of this process and syncs it to disk.
+    """
+    entry['time'] = time.time()
+    with open(self.path, 'a') as f:
+      f.write(json.dumps(entry) + "\n")
+      f.flush()
+      os.fsync(f.fileno())
+
+  def done_wells(self, plate):
+    """
+    **done_wells Method**
+    Returns the names of the completed wells of a plate.
+    """
+    return set(self.wells.get(plate, set()))
+
+  def mark_well(self, plate, well):
+    """
+    **mark_well Method**
+    Records a well as completed.
+    """
+    self._append({'plate': plate, 'well': well})
+    self.wells.setdefault(plate, set()).add(well)
+
+  def mark_plate(self, plate):
+    """
+    **mark_plate Method**
+    Records a plate as completed, i.e. all its wells are processed and its tables are written.
+    """
+    self._append({'plate': plate, 'well': None})
+    self.plates.add(plate)
+
+
+def _fluorescence_plate(exp, config, plate_id, manifest, wells_dir, skip):
+  """
+  **_fluorescence_plate Function**
+  Computes the well and object readouts of the wells of a fluorescence plate that are not in
+  `skip`, writing each well to its own JSON file before recording it as completed.
+  Returns the names of all wells of the plate.
+  """
+  from PyPlaque.view import LabelImageReadout
+
+  plate = exp.plate_indiv_dir[plate_id]
+  well_names = [f.name for f in exp.get_image_files(plate_id, config['additional_subfolders'],
+                                                    config['virus_file_pattern'], config['ext'])]
+  wells = exp.iter_wells(plate_id, config['additional_subfolders'],
+                         config['nuclei_file_pattern'], config['virus_file_pattern'],
+                         config['ext'], prefetch=config['prefetch'], skip=skip)
+  for well in wells:
+    readout = LabelImageReadout(nuclei_image_name=Path(well['nuclei_image_name']).name,
+                                plaque_image_name=Path(well['virus_image_name']).name,
+                                nuclei_image=np.array(well['nuclei_image']),
+                                plaque_image=np.array(well['virus_image']),
+                                nuclei_mask=np.array(well['nuclei_mask']),
+                                plaque_mask=np.array(well['virus_mask']),
+                                virus_params=exp.params['virus'],
+                                global_peak_coords=well.get('virus_peaks'))
+    object_record = {'wellRow': readout.get_row(row_pattern=config['row_pattern']),
+                     'wellColumn': readout.get_column(column_pattern=config['column_pattern'])}
+    object_record.update(readout.get_mean_object_readouts())
+    name = Path(well['virus_image_name']).name
+    _write_json(wells_dir / f"{name}.json", {'well': readout.get_well_readouts(),
+                                             'object': object_record})
+    manifest.mark_well(plate, name)
+  return well_names
+
+
+def _crystal_violet_plate(exp, config, plate_id, manifest, wells_dir, skip):
+  """
+  **_crystal_violet_plate Function**
+  Counts and measures the plaques of the wells of a crystal violet plate that are not in `skip`,
+  writing each well to its own JSON file before recording it as completed. Masks
+  are read from the mask folder if 'read_mask' is set and generated from the images otherwise.
+  Returns the names of all wells of the plate.
+  """
+  from PIL import Image as pil_image
+
+  from PyPlaque.specimen import PlaquesMask
+
+  plate = exp.plate_indiv_dir[plate_id]
+  cv_params = exp.params['crystal_violet']
+  image_path = Path(exp.plate_folder) / plate
+  mask_path = Path(exp.plate_mask_folder) / plate
+  if config['additional_subfolders']:
+    image_path, mask_path = (image_path / config['additional_subfolders'],
+                             mask_path / config['additional_subfolders'])
+  image_files = sorted(f for f in image_path.glob(config['ext'])
+                       if not config['file_pattern'] or re.search(config['file_pattern'], f.stem))
+  for (i, image_file) in enumerate(image_files):
+    if image_file.name in skip:
+      continue
+    if config['read_mask']:
+      mask = np.asarray(pil_image.open(mask_path / image_file.name).convert('L'))
+    else:
+      # the image is only decoded if its mask is not cached yet
+      mask = exp.get_runtime_mask(f"{plate}-{i // cv_params['ncols']},{i % cv_params['ncols']}",
+                                  image_file)
+    plaques_mask = PlaquesMask(image_file.stem, (np.asarray(mask) > 0).astype(np.uint8))
+    plaques = plaques_mask.get_plaques(cv_params['min_area'], cv_params['max_area'])
+    with warnings.catch_warnings():
+      # wells without plaques have no mean eccentricity or roundness
+      warnings.simplefilter('ignore', RuntimeWarning)
+      measure = plaques_mask.get_measure(plaques)
+    _write_json(wells_dir / f"{image_file.name}.json", {'well': {
+      'ImageName': image_file.name,
+      'numberOfPlaques': len(plaques),
+      'meanPlaqueSize': measure['mean_plq_size'],
+      'medianPlaqueSize': measure['med_plq_size'],
+      'Centroid_1': measure['centroid'][0],
+      'Centroid_2': measure['centroid'][1],
+      'meanEccentricity': measure['mean_plq_ecc'],
+      'meanRoundness': measure['mean_roundness']
+    }})
+    manifest.mark_well(plate, image_file.name)
+  return [f.name for f in image_files]
+
+
+def _write_plate_tables(plate_dir, well_names):
+  """
+  **_write_plate_tables Function**
+  Combines the JSON files of the wells of a plate into one CSV table per readout level, in well
+  order.
+  """
+  import pandas as pd
+
+  records = {}
+  for name in sorted(well_names):
+    with open(plate_dir / "wells" / f"{name}.json") as f:
+      for (level, record) in json.load(f).items():
+        records.setdefault(level, []).append(record)
+  paths = []
+  for (level, level_records) in records.items():
+    paths.append(plate_dir / f"{level}_readouts.csv")
+    pd.DataFrame(level_records).to_csv(paths[-1], index=False)
+  return paths
+
+
+def _run_plates(config, plates, manifest_name, force=False):
+  """
+  **_run_plates Function**
+  Processes the given plates of a run configuration in this process and returns the numbers of
+  processed and skipped wells and plates. Defined at module level so that it can be sent to pool
+  processes.
+  """
+  exp = _make_experiment(config)
+  manifest = RunManifest(config['output'], manifest_name)
+  summary = {'plates': 0, 'skipped_plates': 0, 'wells': 0, 'skipped_wells': 0}
+  run_plate = (_fluorescence_plate if config['experiment'] == 'fluorescence'
+               else _crystal_violet_plate)
+  for plate in plates:
+    if plate in manifest.plates and not force:
+      summary['skipped_plates'] += 1
+      continue
+    plate_dir = Path(config['output']) / plate
+    (plate_dir / "wells").mkdir(parents=True, exist_ok=True)
+    done = set() if force else manifest.done_wells(plate)
+    well_names = run_plate(exp, config, exp.plate_indiv_dir.index(plate), manifest,
+                           plate_dir / "wells", done)
+    _write_plate_tables(plate_dir, well_names)
+    manifest.mark_plate(plate)
+    summary['plates'] += 1
+    summary['wells'] += len(set(well_names) - done)
+    summary['skipped_wells'] += len(set(well_names) & done)
+  return summary
+
+
+def run(config, shard=0, num_shards=1, processes=None, force=False):
+  """
+  **run Function**
+  This function runs a batch analysis of all plates of an experiment and writes, per plate, the
+  readouts of every well to `<output>/<plate>/wells/` and the combined tables to
+  `<output>/<plate>/<level>_readouts.csv`. Completed wells and plates are recorded in a manifest,
+  so a run that is interrupted, e.g. by a crash on one plate, resumes where it stopped. Plates
+  can be split into `num_shards` shards, e.g. for several machines, and the plates of a shard
+  can be processed by several local processes.
+
+  Args:
+    config (str or Path or dict, required): The run configuration, see `load_run_config`.
+    shard (int, optional): The index of the shard processed by this call. Defaults to 0.
+    num_shards (int, optional): The number of shards the sorted plates are split into, plate k
+                              belonging to shard k % num_shards. Defaults to 1.
+    processes (int, optional): The number of processes working on the plates of the shard. None
+                            or 1 processes them in this process. Defaults to None.
+    force (bool, optional): Whether to process all plates and wells again, including those
+                          recorded as completed. Defaults to False.
+
+  Returns:
+    dict: The number of processed and skipped plates and wells.
+
+  Raises:
+    ValueError: If the shard is not in range(num_shards).
+  """
+  config = load_run_config(config)
+  if not 0 <= shard < num_shards:
+    raise ValueError(f"Expected shard in range({num_shards}), got {shard}")
+  plates = sorted(_make_experiment(config).plate_indiv_dir)[shard::num_shards]
+  name = f"shard-{shard}-of-{num_shards}"
+  if not processes or processes == 1 or len(plates) <= 1:
+    return _run_plates(config, plates, name, force)
+
+  processes = min(processes, len(plates))
+  with ProcessPoolExecutor(max_workers=processes) as executor:
+    futures = [executor.submit(_run_plates, config, plates[p::processes], f"{name}-{p}", force)
+               for p in range(processes)]
+    summaries = [future.result() for future in futures]
+  return {key: sum(summary[key] for summary in summaries) for key in summaries[0]}
+
+
+def main(argv=None):
+  """
+  **main Function**
+  The `pyplaque` command. `pyplaque run config.json` runs or resumes the batch analysis
+  described by a JSON configuration, see `run`.
+  """
+  parser = argparse.ArgumentParser(prog='pyplaque', description="PyPlaque batch analysis.")
+  subparsers = parser.add_subparsers(dest='command', required=True)
+  run_parser = subparsers.add_parser('run', help="Run or resume the analysis of all plates of "
+                                                 "an experiment.")
+  run_parser.add_argument('config', help="The JSON configuration of the run.")
+  run_parser.add_argument('--output', default=None,
+                          help="The output directory, overriding the configuration.")
+  run_parser.add_argument('--shard', type=int, default=0,
+                          help="The shard of plates processed by this command.")
+  run_parser.add_argument('--num-shards', type=int, default=1,
+                          help="The number of shards the plates are split into.")
+  run_parser.add_argument('--processes', type=int, default=None,
+                          help="The number of local processes working on the plates.")
+  run_parser.add_argument('--force', action='store_true',
+                          help="Process all plates and wells again, including completed ones.")
+  args = parser.parse_args(argv)
+
+  with open(args.config) as f:
+    config = json.load(f)
+  if args.output is not None:
+    config['output'] = args.output
+  summary = run(config, shard=args.shard, num_shards=args.num_shards, processes=args.processes,
+                force=args.force)
+  print(f"Processed {summary['wells']} wells of {summary['plates']} plates, skipped "
+        f"{summary['skipped_wells']} completed wells and {summary['skipped_plates']} completed "
+        f"plates.")
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
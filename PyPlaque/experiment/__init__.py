@@ -1,2 +1,6 @@
-from PyPlaque.experiment.crystal_violet import *
-from PyPlaque.experiment.fluorescence_microscopy import *
+from PyPlaque.lazy_import import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+  'crystal_violet': ['CrystalViolet'],
+  'fluorescence_microscopy': ['FluorescenceMicroscopy']
+})
@@ -7,7 +7,9 @@ from skimage.exposure import adjust_gamma
 from tqdm.auto import tqdm
 import warnings
 
-from PyPlaque.specimen import PlaquesWell, PlaquesImageGray
+from PyPlaque.specimen import PlaquesMask, PlaquesWell, PlaquesImageGray
+from PyPlaque.utils import build_image_pyramid, stage_timer, StageCache
+from PyPlaque.utils import read_preview, scale_params
 try:
   from PIL import Image as pil_image
 except ImportError:
@@ -37,8 +39,20 @@ class CrystalViolet:
 
     params (dict, optional): A dictionary of parameters for crystal violet plaques, thresholding, 
                             etc. Default is an empty dictionary with default values set.
+
+    cache (StageCache or str, optional): A cache, or the directory of a new one, for the masks 
+                                        generated at runtime. Entries are keyed on the image file 
+                                        (its path, size and modification time), the decode 
+                                        parameters and the thresholding parameters. A file rewritten 
+                                        in place with the same size within one modification time 
+                                        tick is not detected; use a StageCache with 
+                                        `use_content_hash=True` for such folders. Default is None, 
+                                        which caches nothing.
+
+    preview_factor (int, optional): The factor by which images are reduced when they are loaded 
+                                  with `preview=True`, see `get_preview_params`. Default is 4.
   """
-  def __init__(self, plate_folder, plate_mask_folder, params=None):
+  def __init__(self, plate_folder, plate_mask_folder, params=None, cache=None, preview_factor=4):
     #check data types
     if not isinstance(plate_folder, str):
       raise TypeError("Expected plate_folder argument to be str")
@@ -47,6 +61,12 @@ class CrystalViolet:
     if params:
       if not isinstance(params, dict):
         raise TypeError("Expected params argument to be dict")
+    if isinstance(cache, (str, Path)):
+      cache = StageCache(cache)
+    elif cache is not None and not isinstance(cache, StageCache):
+      raise TypeError("Expected cache argument to be StageCache, str or Path")
+    if not isinstance(preview_factor, int) or preview_factor < 1:
+      raise TypeError("Expected preview_factor argument to be a positive int")
 
     self.plate_folder = plate_folder
     self.plate_mask_folder = plate_mask_folder
@@ -66,6 +86,8 @@ class CrystalViolet:
       }
 
     self.params = params
+    self.cache = cache
+    self.preview_factor = preview_factor
     self.plate_indiv_dir = []
     self.plate_mask_indiv_dir = []
     self.well_dict = {}
@@ -84,6 +106,21 @@ class CrystalViolet:
     """
     return self.params
 
+  def get_preview_params(self):
+    """
+    **get_preview_params Method** 
+    Returns the parameters used for images loaded with `preview=True`, i.e. the current parameters 
+    with the sigma and the plaque areas scaled to images reduced by `preview_factor`, see 
+    `scale_params`.
+    
+    Args:
+      self (required): The instance of the class containing the data.
+    
+    Returns:
+      dict: A dictionary containing the scaled parameters.
+    """
+    return scale_params(self.params, self.preview_factor)
+
   def get_individual_plates(self, whole_plate=False,folder_pattern=None):
     """
     **get_individual_wells Method** 
@@ -280,13 +317,58 @@ class CrystalViolet:
           img = img.resize(width_height_tuple, resample)
     return img
 
+  def get_runtime_mask(self, name, img, params=None, source=None, source_params=None):
+    """
+    **get_runtime_mask Method**
+    Generates the plaque mask of a single well image from the crystal violet parameters, or from 
+    `params` if given, reading it from the cache when one is set. Cached masks are keyed on the 
+    image file, by its path, size and modification time, so that a cached mask of a file is 
+    returned without decoding the file.
+
+    Args:
+      name (str, required): The name of the well, e.g. '<plate>-<row>,<column>'.
+      img (np.ndarray, str or Path, required): The grayscale image of the well, or its file, which 
+                                              is only decoded if the mask is not cached.
+      params (dict, optional): The parameters of the experiment. Defaults to None, which uses
+                              `params` of the experiment.
+      source (str or Path, optional): The file `img` was decoded from, which the cached mask is 
+                                    keyed on instead of the pixels of `img`. Defaults to None.
+      source_params (dict, optional): The parameters `img` was decoded from `source` with, e.g. 
+                                    its color mode and preview factor. Defaults to None.
+
+    Returns:
+      np.ndarray: The plaque mask of the well.
+    """
+    cv_params = (params or self.params)['crystal_violet']
+    if isinstance(img, (str, Path)):
+      source, source_params = img, {'color_mode': 'grayscale', 'preview_factor': None}
+
+    @stage_timer('crystal_violet_mask', well=name)
+    def compute_mask():
+      image = img
+      if isinstance(image, (str, Path)):
+        image = np.asarray(self.read_from_path(image, color_mode="grayscale"))
+      img_gadjusted = adjust_gamma(image, gamma=cv_params['gamma'], gain=cv_params['gain'])
+      return {'mask': PlaquesImageGray(name, img_gadjusted, threshold=cv_params['threshold'],
+                                        sigma=cv_params['sigma']).plaques_mask}
+
+    if self.cache is None:
+      return compute_mask()['mask']
+    key_params = {k: cv_params[k] for k in ('gamma', 'gain', 'threshold', 'sigma')}
+    if source is not None:
+      key_params['source'] = source_params or {}
+    return self.cache.cached(np.asarray(img) if source is None else source, 
+                              'crystal_violet_mask', key_params, compute_mask)['mask']
+
+  @stage_timer('load_well_images_and_masks_for_plate')
   def load_well_images_and_masks_for_plate(self, 
                                 plate_id=0, 
                                 additional_subfolders=None, 
                                 file_pattern=None, 
                                 read_mask = True,
                                 all_grayscale = False,
-                                ext = '*.png'):
+                                ext = '*.png',
+                                preview = False):
     """
     **load_well_images_and_masks_for_plate Method**
     This method loads images and masks for a specified plate. It supports loading from both image 
@@ -305,6 +387,10 @@ class CrystalViolet:
       all_grayscale (bool, optional): Whether to convert all images and masks to grayscale. 
                                       Defaults to False.
       ext (str, optional): The file extension pattern used to match files. Defaults to '*.png'.
+      preview (bool, optional): Whether to decode the images and masks reduced by 
+                              `preview_factor`, as numpy arrays, and to generate masks with the 
+                              parameters of `get_preview_params`, for a fast approximate plaque 
+                              count with `get_plaque_counts`. Defaults to False.
     
     Returns:
       dict: A dictionary containing the loaded images and masks for each well in the specified plate.
@@ -315,6 +401,9 @@ class CrystalViolet:
     self.well_dict[d]['img'] = {}
     self.well_dict[d]['mask'] = {}
     self.well_dict[d]['image_name'] = {}
+    self.well_dict[d]['preview_factor'] = self.preview_factor if preview else None
+    params = self.get_preview_params() if preview else self.params
+    color_mode = "grayscale" if all_grayscale else "rgb"
 
     if additional_subfolders:
       image_path = Path(self.plate_folder) / (d) / (additional_subfolders)
@@ -329,7 +418,9 @@ class CrystalViolet:
     else:
       image_files = list(tqdm(image_path.glob(ext)))
     image_files = sorted(image_files)
-    if all_grayscale:
+    if preview:
+      img_list = [read_preview(f, self.preview_factor, color_mode) for f in tqdm(image_files)]
+    elif all_grayscale:
       img_list = [np.asarray(self.read_from_path(f,color_mode="grayscale")) 
                                                     for f in tqdm(image_files)]
     else:
@@ -342,24 +433,22 @@ class CrystalViolet:
       else:
         mask_files = list(tqdm(mask_path.glob(ext)))
       mask_files = sorted(mask_files)
-      if all_grayscale:
+      if preview:
+        mask_list = [read_preview(f, self.preview_factor, "grayscale", "nearest") 
+                                                    for f in tqdm(mask_files)]
+      elif all_grayscale:
         mask_list = [np.asarray(self.read_from_path(f,color_mode="grayscale")) 
                                                     for f in tqdm(mask_files)]
       else:
         mask_list = [self.read_from_path(f,color_mode="grayscale") for f in tqdm(mask_files)]
     else:
       # generate masks at runtime from images using params
-      img_gadjusted_list = [adjust_gamma(img, 
-                                gamma=self.params['crystal_violet']['gamma'],
-                                gain=self.params['crystal_violet']['gain']) 
-                            for img in tqdm(img_list)]
-
-      mask_list = [PlaquesImageGray(self.plate_indiv_dir[plate_id]+"-"+
-                                    str(i//self.params['crystal_violet']['ncols'])+","+
-                                    str(i%self.params['crystal_violet']['ncols']),
-                                img_gadjusted_list[i],
-                                threshold=self.params['crystal_violet']['threshold'],
-                                sigma=self.params['crystal_violet']['sigma']).plaques_mask
+      mask_list = [self.get_runtime_mask(self.plate_indiv_dir[plate_id]+"-"+
+                                      str(i//self.params['crystal_violet']['ncols'])+","+
+                                      str(i%self.params['crystal_violet']['ncols']),
+                                      img_list[i], params, image_files[i], 
+                                      {'color_mode': color_mode, 
+                                       'preview_factor': self.preview_factor if preview else None})
                         for i in tqdm(range(len(img_list)))]
 
     self.well_dict[d]['img'] = img_list
@@ -368,6 +457,33 @@ class CrystalViolet:
 
     return self.well_dict
 
+  @stage_timer('crystal_violet_plaque_counts')
+  def get_plaque_counts(self, plate_id=0):
+    """
+    **get_plaque_counts Method**
+    Counts the plaques in the masks of the wells of a plate loaded with 
+    `load_well_images_and_masks_for_plate`, as `PlaquesMask.get_plaques` with the 'min_area' and 
+    'max_area' of the crystal violet parameters. For wells loaded with `preview=True` the areas 
+    are scaled to the reduced masks, which gives an approximate count in a fraction of the time.
+
+    Args:
+      plate_id (int, optional): The index of the plate. Defaults to 0.
+
+    Returns:
+      list: The number of plaques of every well, in the order of `well_dict[plate]['image_name']`.
+
+    Raises:
+      KeyError: If the wells of the plate have not been loaded.
+    """
+    d = self.plate_indiv_dir[plate_id]
+    preview_factor = self.well_dict[d].get('preview_factor')
+    params = scale_params(self.params, preview_factor) if preview_factor else self.params
+    cv_params = params['crystal_violet']
+    return [len(PlaquesMask(str(name), np.asarray(mask)).get_plaques(cv_params['min_area'],
+                                                                     cv_params['max_area']))
+            for (name, mask) in zip(self.well_dict[d]['image_name'], self.well_dict[d]['mask'])]
+
+  @stage_timer('load_plate_images_and_masks')
   def load_plate_images_and_masks(self,
                                   additional_subfolders=None,
                                   file_pattern=None,
@@ -448,6 +564,34 @@ class CrystalViolet:
 
     return self.full_plate_dict
 
+  @stage_timer('build_plate_pyramids')
+  def build_plate_pyramids(self, pyramid_folder, min_size=256, chunk_size=512):
+    """
+    **build_plate_pyramids Method**
+    Writes an image pyramid of every full plate image loaded by `load_plate_images_and_masks`, so 
+    that plate overviews, thumbnails and quick counts read a downsampled level instead of the full 
+    resolution image. The pyramid of each plate is also stored under 'pyramid' in 
+    `full_plate_dict`.
+
+    Args:
+      pyramid_folder (str or Path, required): The folder in which a pyramid folder is written per 
+                                            plate.
+      min_size (int, optional): The maximum length of the longer side of the coarsest level. 
+                              Defaults to 256.
+      chunk_size (int, optional): The side length of the stored chunks. Defaults to 512.
+
+    Returns:
+      dict: The ImagePyramid of every plate, indexed by `plate_id`.
+    """
+    pyramids = {}
+    for (plate_id, plate) in self.full_plate_dict.items():
+      if not isinstance(plate, dict) or not isinstance(plate.get('img'), np.ndarray):
+        continue
+      pyramids[plate_id] = build_image_pyramid(plate['img'], Path(pyramid_folder) / plate_id,
+                                               min_size=min_size, chunk_size=chunk_size)
+      plate['pyramid'] = pyramids[plate_id]
+    return pyramids
+
   def extract_masked_plates(self):
     """
     **extract_masked_plates Method**
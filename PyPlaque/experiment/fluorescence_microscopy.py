@@ -1,3 +1,5 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import io
 import functools
 import numpy as np
@@ -5,10 +7,17 @@ import os
 from pathlib import Path
 import re
 import tifffile as TIFF
+import time
 from tqdm.auto import tqdm
 import warnings
 
-from PyPlaque.utils import get_plaque_mask, remove_artifacts, remove_background
+from PyPlaque.utils import get_all_plaque_regions, get_plaque_mask, parallel_map
+from PyPlaque.utils import remove_artifacts, remove_background, StageCache
+from PyPlaque.utils import pack_plate_stack, PlateStack
+from PyPlaque.utils import increment_counter, stage_timer
+from PyPlaque.utils import qc_panel, render_qc_report
+from PyPlaque.utils import PlateManifest, WELL_FILE_PATTERN
+from PyPlaque.utils import read_preview, reduce_image, scale_params
 
 try:
   from PIL import Image as pil_image
@@ -26,6 +35,113 @@ if pil_image is not None:
   }
 
 
+# virus parameters that the plaque regions and the plaque mask depend on
+_PLAQUE_REGION_PARAMS = ('virus_threshold', 'plaque_connectivity')
+_PLAQUE_MASK_PARAMS = _PLAQUE_REGION_PARAMS + ('min_plaque_area', 'use_picks', 
+                      'fine_plaque_detection_flag', 'plaque_gaussian_filter_size', 
+                      'plaque_gaussian_filter_sigma', 'plaque_gaussian_filter_method', 
+                      'plaque_gaussian_filter_tolerance', 'peak_region_size')
+
+
+def _cache_source(img, source, source_params):
+  """
+  **_cache_source Function**
+  Returns the source and the extra parameters a cached stage of an image is keyed on: the image 
+  file it was decoded from, which identifies it by path, size and modification time without 
+  hashing the pixels, and the parameters of its decoding, or the image itself if no file is given.
+  """
+  if source is None:
+    return img, {}
+  return source, {'source': source_params or {}}
+
+
+def _with_source(item, func, **kwargs):
+  """
+  **_with_source Function**
+  Calls `func` on the image of an (image, source file) pair, passing the file as `source`. Defined 
+  at module level so that it can be sent to pool processes by `parallel_map`.
+  """
+  img, source = item
+  return func(img, source=source, **kwargs)
+
+
+def _virus_mask(img, virus_params, cache=None, source=None, source_params=None):
+  """
+  **_virus_mask Function**
+  Returns the plaque mask and the global peak coordinates of a single virus channel image. Defined 
+  at module level so that it can be sent to pool processes. With a StageCache, the label image of 
+  all plaque regions and the final mask are cached separately, so that a change of e.g. 
+  'min_plaque_area' reuses the cached label image. Entries are keyed on the image file `source` 
+  and the `source_params` it was decoded with if given, and on the image otherwise.
+  """
+  if cache is None:
+    return get_plaque_mask(img, virus_params)
+  key_source, key_params = _cache_source(img, source, source_params)
+
+  def compute_mask():
+    label_image = cache.cached(key_source, 'plaque_regions', 
+                              {**{k: virus_params[k] for k in _PLAQUE_REGION_PARAMS}, 
+                               **key_params},
+                              lambda: {'label_image': get_all_plaque_regions(img, 
+                                                      virus_params['virus_threshold'],
+                                                      virus_params['plaque_connectivity'],
+                                                      virus_params.get('plaque_tile_size'))})
+    mask, peaks = get_plaque_mask(img, virus_params, label_image=label_image['label_image'])
+    return {'mask': mask, 'peaks': peaks}
+
+  arrays = cache.cached(key_source, 'plaque_mask', 
+                        {**{k: virus_params.get(k) for k in _PLAQUE_MASK_PARAMS}, **key_params},
+                        compute_mask)
+  return arrays['mask'], arrays['peaks']
+
+
+def _load_virus_well(path, virus_params, cache=None, read=TIFF.imread, source_params=None):
+  """
+  **_load_virus_well Function**
+  Decodes a single virus channel image and returns it together with its plaque mask and global 
+  peak coordinates, cached on the file.
+  """
+  img = read(path)
+  return (img,) + _virus_mask(img, virus_params, cache, path, source_params)
+
+
+def _load_nuclei_well(path, nuclei_params, cache=None, read=TIFF.imread, source_params=None):
+  """
+  **_load_nuclei_well Function**
+  Decodes a single nuclei channel image, removes its artifacts and returns it together with its 
+  binary nuclei mask, cached on the file.
+  """
+  img = remove_artifacts(read(path), nuclei_params['artifact_threshold'])
+  return img, _nuclei_mask(img, nuclei_params['correction_ball_radius'],
+                          nuclei_params['manual_threshold'],
+                          nuclei_params.get('correction_method', 'opencv'), cache, path,
+                          dict(source_params or {}, 
+                               artifact_threshold=nuclei_params['artifact_threshold']))
+
+
+def _nuclei_mask(img, radius, thresh, method='opencv', cache=None, source=None, 
+                 source_params=None):
+  """
+  **_nuclei_mask Function**
+  Returns the binary nuclei mask of a single artifact-removed nuclei channel image. Defined at 
+  module level so that it can be sent to pool processes. With a StageCache, the background removed 
+  image is cached, so that a change of the threshold does not repeat the background removal. 
+  Entries are keyed on the image file `source` and the `source_params` it was decoded and cleaned 
+  with if given, and on the image otherwise.
+  """
+  if cache is None:
+    bg_removed_img = remove_background(img, radius=radius, method=method)[1]
+  else:
+    key_source, key_params = _cache_source(img, source, source_params)
+    bg_removed_img = cache.cached(key_source, 'remove_background', 
+                                  {'correction_ball_radius': radius, 'correction_method': method,
+                                   **key_params},
+                                  lambda: {'foreground': remove_background(img, radius=radius,
+                                                                          method=method)[1]}
+                                  )['foreground']
+  return np.where(bg_removed_img > thresh,1,0)
+
+
 class FluorescenceMicroscopy:
   """
 	**FluorescenceMicroscopy Class** 
@@ -41,10 +157,35 @@ class FluorescenceMicroscopy:
     params (dict, optional): A dictionary of parameters for nuclei and virus channels to be used 
                             for generating masks and readouts. Default is an empty dictionary.
 
+    cache (StageCache or str, optional): A cache, or the directory of a new one, for the background 
+                                        removed nuclei images, plaque regions and plaque masks. 
+                                        Entries are keyed on the image file (its path, size and 
+                                        modification time), the decode parameters and the 
+                                        parameters of each stage, so changed parameters only 
+                                        recompute the stages that depend on them. A file rewritten 
+                                        in place with the same size within one modification time 
+                                        tick is not detected; use a StageCache with 
+                                        `use_content_hash=True` for such folders. Default is None, 
+                                        which caches nothing.
+
+    stack_folder (str, optional): The directory holding the plate stacks written by `pack_plate`. 
+                                Images of a packed plate are read from its memory-mapped stack 
+                                instead of being decoded, unless their file changed after packing. 
+                                Default is None, which decodes every image.
+
+    manifest_folder (str, optional): The directory caching the file index of each plate built by 
+                                    `get_manifest`. A cached index is reused until a directory of 
+                                    its plate is modified. Default is None, which scans the plate 
+                                    folder once per session.
+
+    preview_factor (int, optional): The factor by which images are reduced when wells are loaded 
+                                  with `preview=True`, see `get_preview_params`. Default is 4.
+
   Raises:
     TypeError: If the provided arguments are not of the expected type.
   """
-  def __init__(self, plate_folder, plate_mask_folder, params=None):
+  def __init__(self, plate_folder, plate_mask_folder, params=None, cache=None, stack_folder=None,
+               manifest_folder=None, preview_factor=4):
 		#check data types
     if not isinstance(plate_folder, str):
       raise TypeError("Expected plate_folder argument to be str")
@@ -53,9 +194,9 @@ class FluorescenceMicroscopy:
     if params:
       if not isinstance(params, dict):
         raise TypeError("Expected params argument to be dict")
-      if not isinstance(params.values()[0], dict):
+      if not isinstance(list(params.values())[0], dict):
         raise TypeError("Expected first nested object of params argument to be dict")
-      if not isinstance(params.values()[1], dict):
+      if not isinstance(list(params.values())[1], dict):
         raise TypeError("Expected second nested object of params argument to be dict")
 
     self.plate_folder = plate_folder
@@ -71,6 +212,7 @@ class FluorescenceMicroscopy:
                 'max_cell_area': 90,
                 'illumination_correction_flag': False,
                 'correction_ball_radius': 120,
+                'correction_method': 'opencv',
                 'use_picks': False,
                 'image_bits': 16
         },
@@ -78,13 +220,17 @@ class FluorescenceMicroscopy:
                 'raw_virusThreshold': 0.032,
                 'min_plaque_area': 2000,
                 'plaque_connectivity': 6,
+                'plaque_tile_size': None,
                 'min_cell_area': 80,
                 'max_cell_area': 90,
                 'fine_plaque_detection_flag': True,
                 'plaque_gaussian_filter_size': 200,
                 'plaque_gaussian_filter_sigma': 100,
+                'plaque_gaussian_filter_method': 'exact',
+                'plaque_gaussian_filter_tolerance': 2,
                 'peak_region_size': 50,
                 'correction_ball_radius': 120,
+                'correction_method': 'opencv',
                 'use_picks': False,
                 'image_bits': 16
         }
@@ -95,7 +241,21 @@ class FluorescenceMicroscopy:
                                                             *(2**params['nuclei']['image_bits']-1)
     params['virus']['virus_threshold'] = params['virus']['raw_virusThreshold'] \
                                                             *(2**params['virus']['image_bits']-1)
+    if isinstance(cache, (str, Path)):
+      cache = StageCache(cache)
+    elif cache is not None and not isinstance(cache, StageCache):
+      raise TypeError("Expected cache argument to be StageCache, str or Path")
+    if not isinstance(preview_factor, int) or preview_factor < 1:
+      raise TypeError("Expected preview_factor argument to be a positive int")
+
     self.params = params
+    self.cache = cache
+    self.stack_folder = stack_folder
+    self.plate_stacks = {}
+    self.manifest_folder = manifest_folder
+    self.manifests = {}
+    self.processed_files = {}
+    self.preview_factor = preview_factor
     self.plate_indiv_dir = []
     self.plate_mask_indiv_dir = []
     self.plate_dict_w1 = {}
@@ -114,6 +274,21 @@ class FluorescenceMicroscopy:
     """
     return self.params
 
+  def get_preview_params(self):
+    """
+    **get_preview_params Method** 
+    Returns the parameters used for wells loaded with `preview=True`, i.e. the current parameters 
+    with their lengths and areas in pixels scaled to images reduced by `preview_factor`, see 
+    `scale_params`.
+    
+    Args:
+      self (required): The instance of the class containing the data.
+    
+    Returns:
+      dict: A dictionary containing the scaled parameters.
+    """
+    return scale_params(self.params, self.preview_factor)
+
   def get_individual_plates(self, folder_pattern=None):
     """
     **get_individual_plates Method** 
@@ -166,11 +341,468 @@ class FluorescenceMicroscopy:
     """
     return len(self.plate_indiv_dir)
 
+  def get_image_files(self, 
+                      plate_id=0, 
+                      additional_subfolders=None, 
+                      file_pattern=None, 
+                      ext='*.tif'):
+    """
+    **get_image_files Method**
+    Lists the sorted image files of a plate, optionally filtered by a regex pattern.
+    
+    Args:
+      self (required): The instance of the class containing the data.
+      plate_id (int, optional): The index of the plate to list. Default is 0.
+      additional_subfolders (str, optional): Additional subfolder path within the plate directory.
+      file_pattern (str, optional): A regex pattern to filter image files by their stem.
+      ext (str, optional): The file extension to match for images. Default is '*.tif'.
+  
+    Returns:
+      list: A sorted list of Path objects of the matching image files.
+    """
+    d = self.plate_indiv_dir[plate_id]
+
+    if additional_subfolders:
+      image_path = Path(self.plate_folder) / (d) / (additional_subfolders)
+    else:
+      image_path = Path(self.plate_folder) / (d)
+
+    if file_pattern:
+      image_files = [f for f in tqdm(image_path.glob(ext)) 
+                                                  if len(re.findall(file_pattern,f.stem))>=1]
+    else:
+      image_files = [f for f in tqdm(image_path.glob(ext))]
+    return sorted(image_files)
+
+  def get_manifest(self, 
+                   plate_id=0, 
+                   additional_subfolders=None, 
+                   ext='*.tif', 
+                   file_pattern=WELL_FILE_PATTERN):
+    """
+    **get_manifest Method**
+    Returns the file index of a plate, which parses the well row, column, site and channel of 
+    every image once. The index is kept for the session and, if `manifest_folder` is set, cached 
+    on disk as `<manifest_folder>/<plate>.json`.
+    
+    Args:
+      self (required): The instance of the class containing the data.
+      plate_id (int, optional): The index of the plate. Default is 0.
+      additional_subfolders (str, optional): Additional subfolder path within the plate directory.
+      ext (str, optional): The file extension to match for images. Default is '*.tif'.
+      file_pattern (str, optional): A regex pattern with the named groups 'row', 'column', 'site' 
+                                    and 'channel' searched in the file stems. Default is 
+                                    `WELL_FILE_PATTERN`.
+  
+    Returns:
+      PlateManifest: The file index of the plate.
+    """
+    d = self.plate_indiv_dir[plate_id]
+    image_path = Path(self.plate_folder) / d
+    if additional_subfolders:
+      image_path = image_path / additional_subfolders
+    key = (str(image_path), ext, file_pattern)
+    if key not in self.manifests:
+      cache_path = None
+      if self.manifest_folder is not None:
+        name = Path(d, additional_subfolders or '').as_posix().strip('/').replace('/', '__')
+        cache_path = Path(self.manifest_folder) / f"{name}.json"
+      self.manifests[key] = PlateManifest(image_path, ext=ext, file_pattern=file_pattern, 
+                                          cache_path=cache_path)
+    return self.manifests[key]
+
+  @stage_timer('pack_plate')
+  def pack_plate(self, 
+                plate_id=0, 
+                additional_subfolders=None, 
+                file_pattern=None, 
+                ext='*.tif',
+                workers=None):
+    """
+    **pack_plate Method**
+    Decodes the images of a plate once and writes them into a memory-mapped plate stack 
+    `<stack_folder>/<plate>.npy` with a `.json` index. Later loads of the plate, also in new 
+    sessions with the same `stack_folder`, read the images as zero-copy views of the stack instead 
+    of decoding them.
+    
+    Args:
+      self (required): The instance of the class containing the data.
+      plate_id (int, optional): The index of the plate to pack. Default is 0.
+      additional_subfolders (str, optional): Additional subfolder path within the plate directory.
+      file_pattern (str, optional): A regex pattern to filter image files by their stem.
+      ext (str, optional): The file extension to match for images. Default is '*.tif'.
+      workers (int, optional): The number of threads decoding images. None or 1 decodes serially 
+                              and -1 uses all cores. Default is None.
+  
+    Returns:
+      PlateStack: The packed stack of the plate.
+    
+    Raises:
+      ValueError: If `stack_folder` is not set or the images of the plate differ in shape or dtype.
+    """
+    if self.stack_folder is None:
+      raise ValueError("stack_folder must be set to pack plates")
+    d = self.plate_indiv_dir[plate_id]
+    image_files = self.get_image_files(plate_id, additional_subfolders, file_pattern, ext)
+    names = [f.relative_to(Path(self.plate_folder) / d).as_posix() for f in image_files]
+    self.plate_stacks[d] = pack_plate_stack(image_files, Path(self.stack_folder) / d, 
+                                            TIFF.imread, names=names, workers=workers)
+    return self.plate_stacks[d]
+
+  def _get_plate_stack(self, d):
+    """
+    **_get_plate_stack Method**
+    Returns the opened stack of a plate directory, or None if the plate has not been packed.
+    """
+    if d not in self.plate_stacks:
+      try:
+        self.plate_stacks[d] = PlateStack(Path(self.stack_folder) / d)
+      except FileNotFoundError:
+        return None
+    return self.plate_stacks[d]
+
+  def _source_params(self, preview=False):
+    """
+    **_source_params Method**
+    Returns the parameters with which `_read_image` decodes an image file, which cached stages 
+    are keyed on together with the file.
+    """
+    return {'preview_factor': self.preview_factor if preview else None}
+
+  def _read_image(self, path, writeable=False, preview=False):
+    """
+    **_read_image Method**
+    Reads an image from the stack of its plate if it was packed from the current file, and decodes 
+    it otherwise. Images from a stack are read-only views unless `writeable` is set, which copies 
+    them. With `preview`, the image is reduced by `preview_factor`, keeping the maximum of every 
+    block.
+    """
+    if self.stack_folder is not None:
+      try:
+        d, *name = Path(path).relative_to(self.plate_folder).parts
+      except ValueError:
+        name = None
+      if name:
+        stack = self._get_plate_stack(d)
+        name = Path(*name).as_posix()
+        if stack is not None and stack.is_current(name, path):
+          increment_counter('stack_reads')
+          if preview:
+            return np.array(reduce_image(stack[name], self.preview_factor, 'max'))
+          return np.array(stack[name]) if writeable else stack[name]
+    with stage_timer('decode', path=str(path)):
+      # the maximum keeps single infected nuclei above the virus threshold, averaging would 
+      # spread their intensity over the whole block
+      img = read_preview(path, self.preview_factor, method='max') if preview else TIFF.imread(path)
+    increment_counter('bytes_decoded', img.nbytes)
+    return img
+
+  def iter_wells(self, 
+                plate_id=0, 
+                additional_subfolders=None, 
+                nuclei_file_pattern=None, 
+                virus_file_pattern=None, 
+                ext='*.tif',
+                prefetch=2,
+                skip=None,
+                use_manifest=False,
+                preview=False):
+    """
+    **iter_wells Method**
+    Lazily loads the wells of a plate one at a time, pairing the nuclei and the virus channel 
+    images of each well. Unlike `load_wells_for_plate_nuclei` and `load_wells_for_plate_virus`, 
+    nothing is kept in `plate_dict_w1` or `plate_dict_w2`, so memory use depends on the number of 
+    wells in flight rather than on the size of the plate. The next `prefetch` wells are decoded 
+    and segmented in background threads while the current well is being consumed.
+    
+    Args:
+      self (required): The instance of the class containing the data.
+      plate_id (int, optional): The index of the plate to load. Default is 0.
+      additional_subfolders (str, optional): Additional subfolder path within the plate directory.
+      nuclei_file_pattern (str, optional): A regex pattern to select the nuclei channel files by 
+                                          their stem.
+      virus_file_pattern (str, optional): A regex pattern to select the virus channel files by 
+                                          their stem.
+      ext (str, optional): The file extension to match for images. Default is '*.tif'.
+      prefetch (int, optional): The number of wells loaded ahead of the one being consumed. 0 loads 
+                                each well only when it is requested. Default is 2.
+      skip (collection, optional): The virus channel file names (without directory) of wells that 
+                                  are not loaded, e.g. wells completed by an earlier run. 
+                                  Default is None.
+      use_manifest (bool, optional): If True, the nuclei and virus channel images are paired by 
+                                    well and site with the plate index of `get_manifest`, using 
+                                    the 'selected_channel' of the nuclei and virus params, instead 
+                                    of by their position in the sorted file lists. Wells missing 
+                                    a channel are skipped with a warning, the file patterns are 
+                                    ignored and the records also hold the 'row', 'column' and 
+                                    'site' of the well. Default is False.
+      preview (bool, optional): If True, the images are decoded reduced by `preview_factor` and 
+                              segmented with the parameters of `get_preview_params`, for a fast 
+                              approximate plaque count. The records also hold the 
+                              'preview_factor', and their masks, peaks and readouts are in pixels 
+                              of the reduced images. Default is False.
+  
+    Yields:
+      dict: A well record with the keys 'nuclei_image_name', 'nuclei_image', 'nuclei_mask', 
+      'virus_image_name', 'virus_image', 'virus_mask' and 'virus_peaks', in sorted well order.
+    
+    Raises:
+      ValueError: If the number of nuclei and virus channel images differs or `prefetch` is 
+      negative.
+    """
+    if prefetch < 0:
+      raise ValueError("prefetch must be a non-negative integer")
+    if use_manifest:
+      well_files = self._manifest_well_files(plate_id, additional_subfolders, ext)
+    else:
+      image_files_w1 = self.get_image_files(plate_id, additional_subfolders, nuclei_file_pattern, 
+                                            ext)
+      image_files_w2 = self.get_image_files(plate_id, additional_subfolders, virus_file_pattern, 
+                                            ext)
+      if len(image_files_w1) != len(image_files_w2):
+        raise ValueError("Expected equal number of images for both channels. Please check again.")
+      well_files = [(n, v, None) for (n, v) in zip(image_files_w1, image_files_w2)]
+
+    if skip:
+      well_files = [(n, v, w) for (n, v, w) in well_files if v.name not in skip]
+    yield from self._load_wells(well_files, prefetch, preview)
+
+  def _load_wells(self, well_files, prefetch, preview=False):
+    """
+    **_load_wells Method**
+    Loads (nuclei file, virus file, well fields) tuples in order, the next `prefetch` of them in 
+    background threads.
+    """
+    if prefetch == 0:
+      for nuclei_file, virus_file, well in well_files:
+        yield self._load_well(nuclei_file, virus_file, well, preview)
+      return
+
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+      pending = deque()
+      for nuclei_file, virus_file, well in well_files:
+        pending.append(executor.submit(self._load_well, nuclei_file, virus_file, well, preview))
+        if len(pending) > prefetch:
+          yield pending.popleft().result()
+      while pending:
+        yield pending.popleft().result()
+
+  def iter_new_wells(self, 
+                    plate_id=0, 
+                    additional_subfolders=None, 
+                    ext='*.tif',
+                    processed=None,
+                    settle=5.0,
+                    prefetch=2):
+    """
+    **iter_new_wells Method**
+    Loads only the wells of a plate that are new or changed since they were last loaded by this 
+    method, e.g. while the microscope is still writing the plate. Wells are found with the plate 
+    index of `get_manifest`, which is refreshed first, and paired by well and site as in 
+    `iter_wells(use_manifest=True)`. A well is loaded once both channel files exist and were not 
+    modified for `settle` seconds, and it is remembered by the (path, size, modification time) of 
+    both files, so a well is loaded again if one of its files is rewritten.
+    
+    Args:
+      self (required): The instance of the class containing the data.
+      plate_id (int, optional): The index of the plate to load. Default is 0.
+      additional_subfolders (str, optional): Additional subfolder path within the plate directory.
+      ext (str, optional): The file extension to match for images. Default is '*.tif'.
+      processed (dict, optional): The processed files, mapping their path relative to the plate 
+                                  index folder to [size, modification time in ns]. It is updated 
+                                  as wells are yielded and holds only JSON types, so it can be 
+                                  stored to resume in a later session. Default is None, which 
+                                  uses `processed_files` of the plate, kept for the session.
+      settle (float, optional): The number of seconds both files of a well must be unmodified 
+                                before it is loaded. Default is 5.0.
+      prefetch (int, optional): The number of wells loaded ahead of the one being consumed. 
+                                Default is 2.
+  
+    Yields:
+      dict: A well record as yielded by `iter_wells(use_manifest=True)`, in sorted well order.
+    
+    Raises:
+      ValueError: If `prefetch` is negative.
+    """
+    if prefetch < 0:
+      raise ValueError("prefetch must be a non-negative integer")
+    manifest = self.get_manifest(plate_id, additional_subfolders, ext)
+    manifest.refresh()
+    if processed is None:
+      processed = self.processed_files.setdefault(str(manifest.folder), {})
+
+    now = time.time_ns()
+    well_files = []
+    stamps = []
+    for (nuclei_file, virus_file, well) in self._manifest_well_files(plate_id, 
+                                                                     additional_subfolders, ext, 
+                                                                     warn=False):
+      files = {f.relative_to(manifest.folder).as_posix(): manifest.stat(f) 
+               for f in (nuclei_file, virus_file)}
+      if None in files.values() or now - max(m for (_, m) in files.values()) < settle*1e9:
+        continue
+      if all(processed.get(f) == list(stamp) for (f, stamp) in files.items()):
+        continue
+      well_files.append((nuclei_file, virus_file, well))
+      stamps.append(files)
+
+    for (record, files) in zip(self._load_wells(well_files, prefetch), stamps):
+      increment_counter('new_wells')
+      yield record
+      processed.update({f: list(stamp) for (f, stamp) in files.items()})
+
+  def watch_wells(self, 
+                  plate_id=0, 
+                  additional_subfolders=None, 
+                  ext='*.tif',
+                  interval=10.0,
+                  settle=5.0,
+                  idle_timeout=None,
+                  expected_wells=None,
+                  processed=None,
+                  prefetch=2):
+    """
+    **watch_wells Method**
+    Polls a plate that is being acquired and yields each well as soon as it is complete, see 
+    `iter_new_wells`. The generator can be passed as `wells` to 
+    `PlateReadout.generate_readouts_dataframe`, so wells are segmented and read out while the 
+    rest of the plate is still being written, e.g.
+    
+    ```
+    wells = exp.watch_wells(plate_id, expected_wells=96, idle_timeout=600)
+    abs_df_well, abs_df_object = PlateReadout(exp).generate_readouts_dataframe(wells=wells)
+    ```
+    
+    Args:
+      self (required): The instance of the class containing the data.
+      plate_id (int, optional): The index of the plate to watch. Default is 0.
+      additional_subfolders (str, optional): Additional subfolder path within the plate directory.
+      ext (str, optional): The file extension to match for images. Default is '*.tif'.
+      interval (float, optional): The number of seconds between polls. Default is 10.0.
+      settle (float, optional): The number of seconds both files of a well must be unmodified 
+                                before it is loaded. Default is 5.0.
+      idle_timeout (float, optional): Stop after this many seconds without a new well. Default is 
+                                      None, which waits indefinitely.
+      expected_wells (int, optional): Stop once this many wells were loaded. Default is None.
+      processed (dict, optional): The processed files, see `iter_new_wells`. Default is None.
+      prefetch (int, optional): The number of wells loaded ahead of the one being consumed. 
+                                Default is 2.
+  
+    Yields:
+      dict: A well record as yielded by `iter_wells(use_manifest=True)`.
+    """
+    n_wells = 0
+    last_well = time.monotonic()
+    while True:
+      for record in self.iter_new_wells(plate_id, additional_subfolders, ext, processed, settle, 
+                                        prefetch):
+        n_wells += 1
+        yield record
+        last_well = time.monotonic()
+      if expected_wells is not None and n_wells >= expected_wells:
+        return
+      if idle_timeout is not None and time.monotonic() - last_well >= idle_timeout:
+        return
+      time.sleep(interval)
+
+  def _manifest_well_files(self, plate_id, additional_subfolders, ext, warn=True):
+    """
+    **_manifest_well_files Method**
+    Pairs the nuclei and virus channel files of a plate by well and site with its file index.
+    """
+    channels = (self.params['nuclei']['selected_channel'], 
+                self.params['virus']['selected_channel'])
+    manifest = self.get_manifest(plate_id, additional_subfolders, ext)
+    incomplete = manifest.incomplete(channels)
+    if incomplete and warn:
+      warnings.warn(f"Skipping {len(incomplete)} wells missing one of the channels {channels}: "
+                    f"{[row + column for (row, column, _) in incomplete]}")
+    return [(pair[channels[0]], pair[channels[1]], 
+             {'row': pair['row'], 'column': pair['column'], 'site': pair['site']}) 
+            for pair in manifest.pairs(channels)]
+
+  def _load_well(self, nuclei_file, virus_file, well=None, preview=False):
+    """
+    **_load_well Method**
+    Loads the nuclei and virus channel images and masks of a single well into a well record, 
+    adding the fields of `well` if given. With `preview`, the images are reduced and the record 
+    holds the 'preview_factor'.
+    """
+    params = self.get_preview_params() if preview else self.params
+    with stage_timer('load_well', well=Path(virus_file).name):
+      nuclei_image, nuclei_mask = _load_nuclei_well(nuclei_file, params['nuclei'], self.cache, 
+                                                    functools.partial(self._read_image, 
+                                                                      writeable=True, 
+                                                                      preview=preview),
+                                                    self._source_params(preview))
+      virus_image, virus_mask, virus_peaks = _load_virus_well(virus_file, params['virus'],
+                                                              self.cache, 
+                                                              functools.partial(self._read_image,
+                                                                                preview=preview),
+                                                              self._source_params(preview))
+    if preview:
+      well = dict(well or {}, preview_factor=self.preview_factor)
+    return {
+      'nuclei_image_name': nuclei_file,
+      'nuclei_image': nuclei_image,
+      'nuclei_mask': nuclei_mask,
+      'virus_image_name': virus_file,
+      'virus_image': virus_image,
+      'virus_mask': virus_mask,
+      'virus_peaks': virus_peaks,
+      **(well or {})
+    }
+
+  def qc_report(self, 
+                output, 
+                plate_id=0, 
+                additional_subfolders=None, 
+                virus_file_pattern=None, 
+                nuclei_file_pattern=None, 
+                ext='*.tif',
+                downsample=4,
+                workers=None,
+                **kwargs):
+    """
+    **qc_report Method**
+    Writes a QC report of a plate with one panel per well, showing the virus channel image with 
+    the contours of its plaque mask and its peaks. Wells are loaded one at a time with 
+    `iter_wells` and downsampled before rendering, and the panels are rendered headless in a pool 
+    of processes into a multi-page PDF or a tiled image montage, see `render_qc_report`.
+    
+    Args:
+      self (required): The instance of the class containing the data.
+      output (str or Path, required): The PDF or image file to write.
+      plate_id (int, optional): The index of the plate. Default is 0.
+      additional_subfolders (str, optional): Additional subfolder path within the plate directory.
+      virus_file_pattern (str, optional): A regex pattern to select the virus channel files by 
+                                          their stem.
+      nuclei_file_pattern (str, optional): A regex pattern to select the nuclei channel files by 
+                                          their stem.
+      ext (str, optional): The file extension to match for images. Default is '*.tif'.
+      downsample (int, optional): The factor by which the images are reduced. Default is 4.
+      workers (int, optional): The number of processes rendering panels. None or 1 renders 
+                              serially and -1 uses all cores. Default is None.
+      **kwargs: Keyword arguments of `render_qc_report`, e.g. `ncols` or `panel_size`.
+  
+    Returns:
+      Path: The written file.
+    """
+    panels = [qc_panel(well['virus_image'], title=Path(well['virus_image_name']).stem, 
+                      mask=well['virus_mask'], peaks=well['virus_peaks'], 
+                      downsample=downsample) 
+              for well in self.iter_wells(plate_id, additional_subfolders, nuclei_file_pattern, 
+                                          virus_file_pattern, ext)]
+    return render_qc_report(panels, output, workers=workers, **kwargs)
+
+  @stage_timer('load_wells_for_plate_virus')
   def load_wells_for_plate_virus(self, 
                                 plate_id=0, 
                                 additional_subfolders=None, 
                                 file_pattern=None, 
-                                ext = '*.tif'):
+                                ext = '*.tif',
+                                workers = None,
+                                preview = False):
     """
     **load_wells_for_plate_virus Method**
     Loads the images and masks for the virus channel from specified wells in a fluorescence plaque 
@@ -182,6 +814,13 @@ class FluorescenceMicroscopy:
       additional_subfolders (str, optional): Additional subfolder path within the plate directory.
       file_pattern (str, optional): A regex pattern to filter image files by their stem.
       ext (str, optional): The file extension to match for images. Default is '*.tif'.
+      workers (int, optional): The number of workers used to load the wells. Images are decoded in 
+                              a thread pool and masks are generated in a process pool, keeping the 
+                              sorted well order. None or 1 loads wells serially and -1 uses all 
+                              cores. Default is None.
+      preview (bool, optional): If True, the images are decoded reduced by `preview_factor` and 
+                              segmented with the parameters of `get_preview_params`, see 
+                              `iter_wells`. Default is False.
   
     Returns:
       self: The instance of the class with loaded data stored in plate_dict_w2.
@@ -195,33 +834,35 @@ class FluorescenceMicroscopy:
     self.plate_dict_w2[d]['img'] = {}
     self.plate_dict_w2[d]['mask'] = {}
     self.plate_dict_w2[d]['image_name'] = {}
+    self.plate_dict_w2[d]['peaks'] = {}
+    self.plate_dict_w2[d]['preview_factor'] = self.preview_factor if preview else None
+    params = self.get_preview_params() if preview else self.params
 
-    if additional_subfolders:
-      image_path = Path(self.plate_folder) / (d) / (additional_subfolders)
-    else:
-      image_path = Path(self.plate_folder) / (d)
+    image_files_w2 = self.get_image_files(plate_id, additional_subfolders, file_pattern, ext)
 
-    if file_pattern:
-      image_files_w2 = [f for f in tqdm(image_path.glob(ext)) 
-                                                  if len(re.findall(file_pattern,f.stem))>=1]
-    else:
-      image_files_w2 = [f for f in tqdm(image_path.glob(ext))]
-    image_files_w2 = sorted(image_files_w2)
-
-    img_list_w2 = [TIFF.imread(f) for f in tqdm(image_files_w2)]
-    mask_list_w2 = [get_plaque_mask(img,self.params['virus'])[0] for img in tqdm(img_list_w2)]
+    img_list_w2 = parallel_map(functools.partial(self._read_image, preview=preview), 
+                               image_files_w2, workers=workers)
+    mask_peaks_list_w2 = parallel_map(functools.partial(_with_source, func=_virus_mask, 
+                                      virus_params=params['virus'], cache=self.cache,
+                                      source_params=self._source_params(preview)),
+                                      zip(img_list_w2, image_files_w2), workers=workers, 
+                                      use_processes=True)
 
     self.plate_dict_w2[d]['img'] = img_list_w2
     self.plate_dict_w2[d]['image_name'] = image_files_w2
-    self.plate_dict_w2[d]['mask'] = mask_list_w2
+    self.plate_dict_w2[d]['mask'] = [m[0] for m in mask_peaks_list_w2]
+    self.plate_dict_w2[d]['peaks'] = [m[1] for m in mask_peaks_list_w2]
 
     return self.plate_dict_w2
 
+  @stage_timer('load_wells_for_plate_nuclei')
   def load_wells_for_plate_nuclei(self, 
                                   plate_id=0, 
                                   additional_subfolders=None, 
                                   file_pattern=None,
-                                  ext='*.tif'):
+                                  ext='*.tif',
+                                  workers=None,
+                                  preview=False):
     """
     **load_wells_for_plate_nuclei Method**
     Loads the images and masks for the nuclei channel from specified wells in a fluorescence 
@@ -233,6 +874,13 @@ class FluorescenceMicroscopy:
       additional_subfolders (str, optional): Additional subfolder path within the plate directory.
       file_pattern (str, optional): A regex pattern to filter image files by their stem.
       ext (str, optional): The file extension to match for images. Default is '*.tif'.
+      workers (int, optional): The number of workers used to load the wells. Images are decoded and 
+                              cleaned of artifacts in a thread pool and masks are generated in a 
+                              process pool, keeping the sorted well order. None or 1 loads wells 
+                              serially and -1 uses all cores. Default is None.
+      preview (bool, optional): If True, the images are decoded reduced by `preview_factor` and 
+                              their masks generated with the parameters of `get_preview_params`, 
+                              see `iter_wells`. Default is False.
   
     Returns:
       self: The instance of the class with loaded data stored in plate_dict_w1.
@@ -246,38 +894,32 @@ class FluorescenceMicroscopy:
     self.plate_dict_w1[d]['img'] = {}
     self.plate_dict_w1[d]['mask'] = {}
     self.plate_dict_w1[d]['image_name'] = {}
+    self.plate_dict_w1[d]['preview_factor'] = self.preview_factor if preview else None
+    params = self.get_preview_params() if preview else self.params
 
-    if additional_subfolders:
-      image_path = Path(self.plate_folder) / (d) / (additional_subfolders)
-    else:
-      image_path = Path(self.plate_folder) / (d)
-
-    if file_pattern:
-      image_files_w1 = [f for f in tqdm(image_path.glob(ext)) 
-                                                      if len(re.findall(file_pattern,f.stem))>=1]
-    else:
-      image_files_w1 = [f for f in tqdm(image_path.glob(ext))]
-    image_files_w1 = sorted(image_files_w1)
-
-    img_list_w1 = [TIFF.imread(f) for f in tqdm(image_files_w1)]    
-
-    artifact_removed_img_list_w1 = map(functools.partial(remove_artifacts,artifact_threshold=
-                                    self.params['nuclei']['artifact_threshold']), tqdm(img_list_w1))
-    bg_removed_img_list_w1 = map(functools.partial(remove_background,
-                            radius=self.params['nuclei']['correction_ball_radius']), 
-                            tqdm(artifact_removed_img_list_w1))   
-    bg_removed_img_list_w1 = [b[1] for b in tqdm(bg_removed_img_list_w1)]
+    image_files_w1 = self.get_image_files(plate_id, additional_subfolders, file_pattern, ext)
 
-    def create_binary_img(bg_removed_img,thresh):
-        return np.where(bg_removed_img > thresh,1,0)
+    img_list_w1 = parallel_map(functools.partial(self._read_image, writeable=True, 
+                                                 preview=preview), 
+                               image_files_w1, workers=workers)
 
-    binary_img_list_w1 = map(functools.partial(create_binary_img, 
-                                              thresh= self.params['nuclei']['manual_threshold']), 
-                                              bg_removed_img_list_w1)
+    # artifacts are removed in place so that the stored images stay artifact free
+    artifact_removed_img_list_w1 = parallel_map(functools.partial(remove_artifacts,
+                                    artifact_threshold=self.params['nuclei']['artifact_threshold']),
+                                    img_list_w1, workers=workers)
+    source_params = dict(self._source_params(preview), 
+                         artifact_threshold=self.params['nuclei']['artifact_threshold'])
+    binary_img_list_w1 = parallel_map(functools.partial(_with_source, func=_nuclei_mask,
+                                    radius=params['nuclei']['correction_ball_radius'],
+                                    thresh=params['nuclei']['manual_threshold'],
+                                    method=params['nuclei'].get('correction_method', 'opencv'),
+                                    cache=self.cache, source_params=source_params),
+                                    zip(artifact_removed_img_list_w1, image_files_w1), 
+                                    workers=workers, use_processes=True)
 
     self.plate_dict_w1[d]['img'] = img_list_w1
     self.plate_dict_w1[d]['image_name'] = image_files_w1
-    self.plate_dict_w1[d]['mask'] = list(binary_img_list_w1)
+    self.plate_dict_w1[d]['mask'] = binary_img_list_w1
 
     return self.plate_dict_w1
 
@@ -0,0 +1,54 @@
+import importlib
+
+
+def lazy_exports(package, exports):
+  """
+  **lazy_exports Function**
+  This function implements lazy loading of the submodules of a package with a module level
+  `__getattr__` (PEP 562). A submodule is imported the first time one of its names is accessed on
+  the package, e.g. `from PyPlaque.utils import get_plaque_mask` imports `segment_plaque` but not
+  the plotting functions of `visualise` and their matplotlib, seaborn and scikit-learn
+  dependencies. `from package import *` still imports all submodules. A name that is also the name
+  of its submodule, e.g. the function `gaussian_blur` of `gaussian_blur`, is hidden by the
+  submodule once that is imported directly and has to be imported eagerly in the `__init__.py`.
+  It is used at the end of the `__init__.py` of a package as
+
+  ```
+  __getattr__, __dir__, __all__ = lazy_exports(__name__, {'centroid': ['centroid'], ...})
+  ```
+
+  Args:
+    package (str, required): The name of the package, i.e. `__name__` in its `__init__.py`.
+    exports (dict, required): The public names of each submodule by submodule name.
+
+  Returns:
+    tuple: A tuple containing three elements:
+        - __getattr__ (callable): The module level `__getattr__` of the package.
+        - __dir__ (callable): The module level `__dir__` of the package.
+        - __all__ (list): The public names of all submodules.
+
+  Raises:
+    ValueError: If two submodules export the same name.
+  """
+  modules = {}
+  for (submodule, names) in exports.items():
+    for name in names:
+      if name in modules:
+        raise ValueError(f"{name} is exported by both {modules[name]} and {submodule}")
+      modules[name] = submodule
+  package_globals = vars(importlib.import_module(package))
+
+  def __getattr__(name):
+    if name not in modules:
+      raise AttributeError(f"module '{package}' has no attribute '{name}'")
+    module = importlib.import_module(f"{package}.{modules[name]}")
+    # importing a submodule binds it on the package, which would hide exports of the same name,
+    # e.g. the function gaussian_blur of the module gaussian_blur
+    for exported in exports[modules[name]]:
+      package_globals[exported] = getattr(module, exported)
+    return package_globals[name]
+
+  def __dir__():
+    return sorted(set(package_globals) | set(modules))
+
+  return __getattr__, __dir__, list(modules)
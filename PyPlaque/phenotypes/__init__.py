@@ -1,4 +1,8 @@
-from PyPlaque.phenotypes.plaque import *
-from PyPlaque.phenotypes.crystal_violet_plaque import *
-from PyPlaque.phenotypes.fluorescence_plaque import *
+from PyPlaque.lazy_import import lazy_exports
 
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+  'plaque': ['Plaque'],
+  'plaque_collection': ['PlaqueCollection'],
+  'crystal_violet_plaque': ['CrystalVioletPlaque'],
+  'fluorescence_plaque': ['FluorescencePlaque']
+})
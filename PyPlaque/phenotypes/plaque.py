@@ -43,8 +43,9 @@ class Plaque:
       self.area = picks_area(mask)
       self.perimeter = picks_perimeter(mask)
     else:
-      self.area = regionprops(label(mask))[0].area
-      self.perimeter = regionprops(label(mask))[0].perimeter
+      props = regionprops(label(mask))[0]
+      self.area = props.area
+      self.perimeter = props.perimeter
 
     if centroid:
       if (not isinstance(centroid, tuple)) or check_numbers(centroid):
@@ -97,36 +98,7 @@ class Plaque:
     Returns:
       float: The calculated eccentricity value of the plaque.
     """
-    # find the contours
-    contours,_ = cv2.findContours(self.mask, cv2.RETR_TREE,cv2.CHAIN_APPROX_SIMPLE)
-
-    ecc = 0
-    # select the first contour that has more than 5 points and fit an ellipse based on that
-    if len(contours) != 0:
-        for i in range(len(contours)):
-            if len(contours[i]) >= 5:
-                # fit the ellipse
-                ellipse=cv2.fitEllipse(contours[i])
-                if ellipse[2] == 0: #if rotation angle is zero results are not reliable
-                    ecc = 0
-                else:
-                    semi_major_axis = ellipse[1][0]/2
-                    semi_minor_axis = ellipse[1][1]/2
-
-                    if semi_minor_axis > semi_major_axis:
-                        temp = semi_minor_axis
-                        semi_minor_axis = semi_major_axis
-                        semi_major_axis = temp
-
-                    if semi_minor_axis == 0:
-                        semi_minor_axis = 0.1
-                    if semi_major_axis == 0:
-                        semi_major_axis = 0.1
-                    ecc = np.sqrt(1-(semi_minor_axis**2/semi_major_axis**2))
-                    break
-    else:
-        ecc = 0
-    return ecc
+    return contour_eccentricity(self.mask)
 
   def roundness(self):
     """
@@ -160,3 +132,50 @@ class Plaque:
       else:
         roundness = 0
     return roundness
+
+
+def contour_eccentricity(mask):
+  """
+  **contour_eccentricity Function**
+  Calculates the eccentricity of a plaque mask from an ellipse fitted to the first of its contours 
+  with at least 5 points, as sqrt(1 - (b^2 / a^2)) with the semi-minor axis b and the semi-major 
+  axis a. Used by `Plaque.eccentricity` and `PlaqueCollection.eccentricities`, and by the object 
+  readouts of `PyPlaque.view`, so that all eccentricities share one definition.
+
+  Args:
+    mask (np.ndarray, required): A 2D binary mask of the plaque.
+
+  Returns:
+    float: The eccentricity, or 0 if no ellipse can be fitted reliably.
+  """
+  # find the contours
+  contours,_ = cv2.findContours(np.asarray(mask).astype(np.uint8), 
+                                cv2.RETR_TREE,cv2.CHAIN_APPROX_SIMPLE)
+
+  ecc = 0
+  # select the first contour that has more than 5 points and fit an ellipse based on that
+  if len(contours) != 0:
+    for i in range(len(contours)):
+      if len(contours[i]) >= 5:
+        # fit the ellipse
+        ellipse=cv2.fitEllipse(contours[i])
+        if ellipse[2] == 0: #if rotation angle is zero results are not reliable
+          ecc = 0
+        else:
+          semi_major_axis = ellipse[1][0]/2
+          semi_minor_axis = ellipse[1][1]/2
+
+          if semi_minor_axis > semi_major_axis:
+            temp = semi_minor_axis
+            semi_minor_axis = semi_major_axis
+            semi_major_axis = temp
+
+          if semi_minor_axis == 0:
+            semi_minor_axis = 0.1
+          if semi_major_axis == 0:
+            semi_major_axis = 0.1
+          ecc = np.sqrt(1-(semi_minor_axis**2/semi_major_axis**2))
+          break
+  else:
+    ecc = 0
+  return ecc
@@ -0,0 +1,187 @@
+from collections.abc import Sequence
+
+import numpy as np
+from skimage.measure import label, regionprops_table
+from skimage.segmentation import clear_border
+
+from PyPlaque.phenotypes import Plaque
+from PyPlaque.phenotypes.plaque import contour_eccentricity
+from PyPlaque.utils import picks_area, picks_area_labels, picks_perimeter, picks_perimeter_labels
+
+
+class PlaqueCollection(Sequence):
+  """
+  **PlaqueCollection Class**
+  The PlaqueCollection class holds the plaques of a plaque mask as arrays, one row per plaque,
+  instead of one `Plaque` object per plaque. Labels, bounding boxes, centroids, areas and
+  perimeters are measured for all plaques in a single labelled pass, the eccentricities are
+  computed on first access. Indexing or iterating the collection returns `Plaque` views, which
+  are created on demand from the bounding box of the plaque in `mask`, so code written for lists
+  of `Plaque` objects keeps working.
+
+  Attributes:
+    mask (np.ndarray, required): The 2D plaque mask the plaques were found in.
+
+    labels (np.ndarray, required): The labels of the plaques in the labelled mask.
+
+    bboxes (np.ndarray, required): An (n, 4) integer array of the (minr, minc, maxr, maxc)
+                                  bounding box of every plaque.
+
+    centroids (np.ndarray, required): An (n, 2) array of the (row, column) centroid of every
+                                    plaque.
+
+    areas (np.ndarray, required): The area of every plaque in pixels, or of Pick's if
+                                `use_picks` is set.
+
+    perimeters (np.ndarray, required): The perimeter of every plaque, or of Pick's if `use_picks`
+                                      is set.
+
+    use_picks (bool, optional): Whether the areas and perimeters are of Pick's, passed on to the
+                              `Plaque` views. Defaults to False.
+
+    pixel_counts (np.ndarray, optional): The number of pixels of every plaque. Defaults to None,
+                                        which takes `areas` unless `use_picks` is set.
+
+  Raises:
+    TypeError: If `mask` is not a 2D numpy array.
+    ValueError: If the arrays do not have one row per plaque.
+  """
+  def __init__(self, mask, labels, bboxes, centroids, areas, perimeters, use_picks=False,
+               pixel_counts=None):
+    if (not isinstance(mask, np.ndarray)) or (not mask.ndim == 2):
+      raise TypeError('mask atribute must be a 2D numpy array')
+    self.mask = mask
+    self.labels = np.asarray(labels, dtype=np.intp)
+    self.bboxes = np.asarray(bboxes, dtype=np.intp).reshape(-1, 4)
+    self.centroids = np.asarray(centroids, dtype=np.float64).reshape(-1, 2)
+    self.areas = np.asarray(areas)
+    self.perimeters = np.asarray(perimeters, dtype=np.float64)
+    self.use_picks = use_picks
+    if pixel_counts is None and not use_picks:
+      pixel_counts = self.areas
+    self.pixel_counts = None if pixel_counts is None else np.asarray(pixel_counts)
+    if not (len(self.labels) == len(self.bboxes) == len(self.centroids) == len(self.areas)
+            == len(self.perimeters)):
+      raise ValueError('Expected one label, bounding box, centroid, area and perimeter per plaque')
+    self._eccentricities = None
+    self._bbox_pixel_counts = None
+    self._measured = None
+
+  @classmethod
+  def from_mask(cls, mask, min_area=None, max_area=None, use_picks=False):
+    """
+    **from_mask Method**
+    Labels a plaque mask once, without the plaques touching its border, and measures all plaques
+    whose area is within the given limits.
+
+    Args:
+      mask (np.ndarray, required): A 2D binary mask of plaques.
+      min_area (int, optional): The minimum plaque area in pixels. Defaults to None.
+      max_area (int, optional): The maximum plaque area in pixels. Defaults to None.
+      use_picks (bool, optional): Whether to measure areas and perimeters with Pick's method.
+                                Defaults to False.
+
+    Returns:
+      PlaqueCollection: The plaques in the order of their labels.
+    """
+    label_image = label(clear_border(mask))
+    props = regionprops_table(label_image, properties=('label', 'bbox', 'centroid', 'area') +
+                              (() if use_picks else ('perimeter',)))
+    labels = props['label']
+    if use_picks:
+      areas = picks_area_labels(label_image, labels)
+      perimeters = picks_perimeter_labels(label_image, labels)
+    else:
+      areas = props['area']
+      perimeters = props['perimeter']
+
+    keep = np.ones(len(labels), dtype=bool)
+    if min_area is not None:
+      keep &= areas >= min_area
+    if max_area is not None:
+      keep &= areas <= max_area
+    bboxes = np.stack([props[f'bbox-{i}'] for i in range(4)], axis=-1)
+    centroids = np.stack([props['centroid-0'], props['centroid-1']], axis=-1)
+    return cls(mask, labels[keep], bboxes[keep], centroids[keep], areas[keep], perimeters[keep],
+               use_picks, props['area'][keep])
+
+  def __len__(self):
+    return len(self.labels)
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return [self[j] for j in range(*i.indices(len(self)))]
+    minr, minc, maxr, maxc = (int(v) for v in self.bboxes[i])
+    return Plaque(self.mask[minr:maxr, minc:maxc], tuple(float(v) for v in self.centroids[i]),
+                  (minr, minc, maxr, maxc), self.use_picks)
+
+  @property
+  def eccentricities(self):
+    """
+    **eccentricities Property**
+    The eccentricity of every plaque, the same as `Plaque.eccentricity` of its view, computed on
+    first access.
+    """
+    if self._eccentricities is None:
+      self._eccentricities = np.array([contour_eccentricity(self.mask[minr:maxr, minc:maxc])
+                                       for (minr, minc, maxr, maxc) in self.bboxes],
+                                      dtype=np.float64)
+    return self._eccentricities
+
+  @property
+  def bbox_pixel_counts(self):
+    """
+    **bbox_pixel_counts Property**
+    The number of mask pixels within the bounding box of every plaque, which includes pixels of
+    other plaques reaching into it, counted for all plaques at once from a summed-area table.
+    """
+    if self._bbox_pixel_counts is None:
+      summed = np.zeros((self.mask.shape[0] + 1, self.mask.shape[1] + 1), dtype=np.int64)
+      summed[1:, 1:] = (self.mask > 0).cumsum(axis=0, dtype=np.int64).cumsum(axis=1)
+      minr, minc, maxr, maxc = self.bboxes.T
+      self._bbox_pixel_counts = (summed[maxr, maxc] - summed[minr, maxc] - summed[maxr, minc]
+                                 + summed[minr, minc])
+    return self._bbox_pixel_counts
+
+  def _measure_views(self):
+    """
+    **_measure_views Method**
+    Returns the areas and perimeters that the `Plaque` views measure on their bounding box crop.
+    Without Pick's only the areas are needed, which are the pixel counts of the crops. With Pick's
+    the values of the labelled pass are used for crops that hold the plaque alone in a 0/1 mask,
+    and the crops of the other plaques are measured one by one.
+    """
+    if self._measured is None:
+      if not self.use_picks:
+        self._measured = (self.bbox_pixel_counts, None)
+      else:
+        areas = np.array(self.areas, dtype=np.float64)
+        perimeters = np.array(self.perimeters, dtype=np.float64)
+        alone = self.bbox_pixel_counts == self.pixel_counts
+        if self.mask.size and not ((self.mask == 0) | (self.mask == 1)).all():
+          alone[:] = False
+        for i in np.flatnonzero(~alone):
+          minr, minc, maxr, maxc = self.bboxes[i]
+          areas[i] = picks_area(self.mask[minr:maxr, minc:maxc])
+          perimeters[i] = picks_perimeter(self.mask[minr:maxr, minc:maxc])
+        self._measured = (areas, perimeters)
+    return self._measured
+
+  @property
+  def measured_areas(self):
+    """
+    **measured_areas Property**
+    The area of every plaque as returned by `Plaque.measure` of its view: the number of mask
+    pixels in its bounding box, or their area of Pick's if `use_picks` is set. It differs from
+    `areas` only where other plaques reach into the bounding box.
+    """
+    return self._measure_views()[0]
+
+  @property
+  def measured_perimeters(self):
+    """
+    **measured_perimeters Property**
+    The perimeter of Pick's of every plaque as used by `Plaque.roundness` of its view, or None if
+    `use_picks` is not set.
+    """
+    return self._measure_views()[1]
@@ -1,5 +1,8 @@
-from PyPlaque.specimen.plaques_mask import *
-from PyPlaque.specimen.plaques_image_gray import *
-from PyPlaque.specimen.plaques_image_rgb import *
-from PyPlaque.specimen.plaques_well import *
+from PyPlaque.lazy_import import lazy_exports
 
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+  'plaques_mask': ['PlaquesMask', 'measure_plaques'],
+  'plaques_image_gray': ['PlaquesImageGray'],
+  'plaques_image_rgb': ['PlaquesImageRGB'],
+  'plaques_well': ['PlaquesWell']
+})
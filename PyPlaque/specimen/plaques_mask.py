@@ -1,11 +1,7 @@
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.patches import Circle
-from skimage.measure import label, regionprops
-from skimage.segmentation import clear_border
 
-from PyPlaque.phenotypes import Plaque
-from PyPlaque.utils import centroid, picks_area
+from PyPlaque.phenotypes import PlaqueCollection
+from PyPlaque.utils import centroid
 
 
 class PlaquesMask:
@@ -43,15 +39,18 @@ class PlaquesMask:
   def get_plaques(self, min_area = 100, max_area = 200):
     """
     **get_plaques Method** 
-    This method returns a list of individual plaques stored as binary numpy arrays. This function 
-    filters and processes the plaque masks based on specified area criteria.
+    This method returns the individual plaques of the mask whose area is within the specified 
+    limits, excluding plaques touching the border. All plaques are measured in a single labelled 
+    pass into a PlaqueCollection, which holds their bounding boxes, centroids, areas and 
+    perimeters as arrays and behaves like a list of Plaque objects, creating each Plaque only when 
+    it is accessed.
     
     Args:
       min_area (int, optional): A cut-off value for plaque area in pixels. Defaults to 100.
       max_area (int, optional): A cut-off value for plaque area in pixels. Defaults to 200.
       
     Returns:
-      list: A list of Plaque objects each represented as a binary numpy array.
+      PlaqueCollection: A sequence of Plaque objects each represented as a binary numpy array.
     
     Raises:
       TypeError: If `min_area` or `max_area` is not an integer.
@@ -62,22 +61,7 @@ class PlaquesMask:
     if not isinstance(max_area, int):
       raise TypeError('minimum area parameter must be int')
 
-    plaques_list = []
-    for _, plaque in enumerate(regionprops(
-                                label(
-                                clear_border(self.plaques_mask)))):
-
-      if self.use_picks:
-        plaque_area = picks_area(plaque.image)
-      else:
-        plaque_area = plaque.area
-
-      if plaque_area >= min_area and plaque_area <= max_area:
-        minr, minc, maxr, maxc = plaque.bbox
-        plq = Plaque(self.plaques_mask[minr:maxr, minc:maxc], plaque.centroid,
-                            (minr, minc, maxr, maxc),self.use_picks)
-        plaques_list.append(plq)
-    return plaques_list
+    return PlaqueCollection.from_mask(self.plaques_mask, min_area, max_area, self.use_picks)
 
 
   def get_measure(self, plaques_list):
@@ -87,11 +71,13 @@ class PlaquesMask:
     PyPlaque.phenotypes.Plaque objects. These measurements include cumulative statistics such as 
     mean and median plaque sizes, along with individual properties like eccentricity and roundness 
     for each plaque in the list. Additionally, it calculates the centroid of all plaques in the 
-    list.
+    list. For a PlaqueCollection, as returned by `get_plaques`, the measures are taken from its 
+    arrays without creating the Plaque objects, see `measure_plaques`.
     
     Args:
-      plaques_list (list, required): A list of PyPlaque.phenotypes.Plaque objects from which 
-                                      several measures can be calculated.
+      plaques_list (list, required): A list of PyPlaque.phenotypes.Plaque objects or a 
+                                    PlaqueCollection from which several measures can be 
+                                    calculated.
         
     Returns:
       dict: A dictionary containing the following measurements:
@@ -104,47 +90,25 @@ class PlaquesMask:
     Raises:
       AttributeError: If `plaques_list` is not provided or improperly formatted.
     """
-    plq_area_ls = []
-    plq_ecc_ls = []
-    plq_round_ls = []
-    measure_dict = {}
-    centre_ls = []
-
-    cent0 = 0
-    cent1 = 0
-
-    mean_plq_size = 0
-    med_plq_size = 0
-
-    for plq in plaques_list:
-      _, plq_area = plq.measure()
-      plq_area_ls.append(plq_area)
-      plq_ecc_ls.append(plq.eccentricity())
-      plq_round_ls.append(plq.roundness())
-
-      mean_plq_size = np.mean(plq_area_ls)
-      med_plq_size = np.median(plq_area_ls)
-
-      centre_ls.append([(plq.bbox[3]+plq.bbox[1])/2,
-      (plq.bbox[2]+plq.bbox[0])/2])
-
-    if len(centre_ls) != 0:
-      cent0, cent1 = centroid(np.array(centre_ls))
+    if isinstance(plaques_list, PlaqueCollection):
+      measure_dict = measure_plaques(plaques_list.measured_areas, plaques_list.bboxes,
+                                     plaques_list.eccentricities,
+                                     plaques_list.measured_perimeters)
     else:
-      cent0, cent1 = None, None
-
-    measure_dict['mean_plq_size'] = mean_plq_size
-    measure_dict['med_plq_size'] = med_plq_size
-    measure_dict['centroid'] = [cent0,cent1]
-    measure_dict['mean_plq_ecc'] = np.mean(plq_ecc_ls)
-    measure_dict['mean_roundness'] = np.mean(plq_round_ls)
+      use_picks = [plq.use_picks for plq in plaques_list]
+      measure_dict = measure_plaques([plq.measure()[1] for plq in plaques_list],
+                                     [plq.bbox for plq in plaques_list],
+                                     [plq.eccentricity() for plq in plaques_list],
+                                     [plq.perimeter if picks else None
+                                      for (plq, picks) in zip(plaques_list, use_picks)]
+                                     if any(use_picks) else None)
 
     self.plaques_list = plaques_list
     self.measure_dict = measure_dict
 
     return measure_dict
 
-  def plot_centroid(self,i,j,save_path=None):
+  def plot_centroid(self,i,j,save_path=None,show=True):
     """
     **plot_centroid Method** 
     This method plots a dotted ring around all the plaques that are found in the mask. 
@@ -156,6 +120,8 @@ class PlaquesMask:
       save_path (str, optional): The file path to save the plotted image. 
                               If provided, the plot will be saved to this location with high-quality 
                               settings.
+      show (bool, optional): Whether to display the plot. If False, the figure is closed after 
+                            saving, e.g. for batch jobs without a display. Defaults to True.
   
     Returns:
       None
@@ -164,9 +130,12 @@ class PlaquesMask:
       AttributeError: If `self.plaques_mask` or `self.measure_dict['centroid']` 
       is not properly defined in the instance.
     """
+    from matplotlib.patches import Circle
+    import matplotlib.pyplot as plt
+
 
     # Create a figure. Equal aspect so circles look circular
-    _, ax = plt.subplots(1, figsize = (40,8))
+    fig, ax = plt.subplots(1, figsize = (40,8))
     ax.set_aspect('equal')
 
     # Show the image
@@ -207,6 +176,63 @@ class PlaquesMask:
     if save_path:
         plt.savefig(save_path, bbox_inches='tight', dpi=300)
     # Show the image
-    plt.show()
+    if show:
+      plt.show()
+    else:
+      plt.close(fig)
 
     return
+
+
+def measure_plaques(areas, bboxes, eccentricities, perimeters=None):
+  """
+  **measure_plaques Function**
+  This function computes the measures of `PlaquesMask.get_measure` from arrays with one entry per 
+  plaque. Every aggregate is computed once over the arrays, so its cost grows linearly with the 
+  number of plaques. The results are the same as those computed from the individual Plaque 
+  objects.
+
+  Args:
+    areas (array-like, required): The area of every plaque, as returned by `Plaque.measure`.
+    bboxes (array-like, required): The (minr, minc, maxr, maxc) bounding box of every plaque.
+    eccentricities (array-like, required): The eccentricity of every plaque.
+    perimeters (array-like, optional): The perimeter of Pick's of every plaque, for plaques 
+                                      measured with Pick's method. The roundness of plaques 
+                                      without a perimeter (None or NaN) is estimated from their 
+                                      bounding box. Defaults to None, which estimates it for all.
+
+  Returns:
+    dict: A dictionary with the 'mean_plq_size', 'med_plq_size', 'centroid', 'mean_plq_ecc' and 
+    'mean_roundness' of the plaques.
+  """
+  areas = np.asarray(areas)
+  bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+  measure_dict = {}
+
+  if len(areas) != 0:
+    mean_plq_size = np.mean(areas)
+    med_plq_size = np.median(areas)
+    # assuming bbox = (minr, minc, maxr, maxc), plaque centres as (x, y)
+    cent0, cent1 = centroid(np.stack([(bboxes[:, 3] + bboxes[:, 1])/2,
+                                      (bboxes[:, 2] + bboxes[:, 0])/2], axis=-1))
+  else:
+    mean_plq_size = 0
+    med_plq_size = 0
+    cent0, cent1 = None, None
+
+  # radius of the circle through the corners of the bounding box
+  half_width = bboxes[:, 3] - (bboxes[:, 3] + bboxes[:, 1])/2
+  half_height = bboxes[:, 2] - (bboxes[:, 2] + bboxes[:, 0])/2
+  perimeter = 2 * np.pi * np.sqrt(half_width*half_width + half_height*half_height)
+  if perimeters is not None:
+    perimeters = np.array([np.nan if p is None else p for p in perimeters], dtype=np.float64)
+    perimeter = np.where(np.isnan(perimeters), perimeter, perimeters)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    roundness = np.where(perimeter != 0, 4 * np.pi * areas / (perimeter ** 2), 0)
+
+  measure_dict['mean_plq_size'] = mean_plq_size
+  measure_dict['med_plq_size'] = med_plq_size
+  measure_dict['centroid'] = [cent0,cent1]
+  measure_dict['mean_plq_ecc'] = np.mean(eccentricities)
+  measure_dict['mean_roundness'] = np.mean(roundness)
+  return measure_dict
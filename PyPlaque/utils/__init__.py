@@ -1,9 +1,41 @@
-from PyPlaque.utils.centroid import *
-from PyPlaque.utils.check_numbers import *
-from PyPlaque.utils.fixed_threshold import *
-from PyPlaque.utils.picks import *
-from PyPlaque.utils.remove_artifacts import *
-from PyPlaque.utils.remove_background import *
-from PyPlaque.utils.segment_plaque import *
-from PyPlaque.utils.stitch_wells import *
-from PyPlaque.utils.visualise import *
+from PyPlaque.lazy_import import lazy_exports
+
+# submodules are imported on first access of one of their names, so that e.g. batch workers using
+# get_plaque_mask do not import the plotting dependencies of visualise
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+  'centroid': ['centroid'],
+  'check_numbers': ['check_numbers'],
+  'fixed_threshold': ['fixed_threshold'],
+  'gaussian_blur': ['GAUSSIAN_BLUR_METHODS', 'gaussian_blur'],
+  'image_pyramid': ['IMAGE_PYRAMID_VERSION', 'build_image_pyramid', 'ImagePyramid'],
+  'instrumentation': ['instrumentation_enabled', 'add_sink', 'remove_sink', 'instrument',
+                      'StageTimer', 'stage_timer', 'increment_counter', 'MemorySink',
+                      'JSONLinesSink', 'CallbackSink'],
+  'parallel_map': ['parallel_map'],
+  'picks': ['PERIMETER_KERNEL', 'get_strel', 'picks_area', 'picks_perimeter', 'picks_area_labels',
+            'picks_perimeter_labels'],
+  'plate_grid': ['PLATE_FORMATS', 'fit_plate_grid'],
+  'plate_manifest': ['WELL_FILE_PATTERN', 'PlateManifest'],
+  'plate_stack': ['PLATE_STACK_VERSION', 'pack_plate_stack', 'PlateStack'],
+  'preview': ['PREVIEW_LENGTH_PARAMS', 'PREVIEW_AREA_PARAMS', 'PREVIEW_REDUCE_METHODS',
+              'scale_params', 'reduce_image', 'read_preview', 'count_agreement'],
+  'qc_report': ['qc_panel', 'render_qc_report'],
+  'remove_artifacts': ['remove_artifacts'],
+  'remove_background': ['REMOVE_BACKGROUND_METHODS', 'remove_background'],
+  'segment_plaque': ['get_all_plaque_regions', 'get_plaque_mask', 'plot_virus_contours'],
+  'stage_cache': ['StageCache'],
+  'stitch_wells': ['stitch_wells', 'combine_img_blocks'],
+  'visualise': ['barplot_quants', 'boxplot_quants', 'create_grouped_bar_from_df',
+                'compare_plaque_detection_from_image', 'plot_bbox_plaques_mask']
+})
+
+# importing a submodule binds it on the package, hiding a lazily exported function of the same
+# name once the submodule was imported directly, so these functions are bound eagerly instead
+from PyPlaque.utils.centroid import centroid
+from PyPlaque.utils.check_numbers import check_numbers
+from PyPlaque.utils.fixed_threshold import fixed_threshold
+from PyPlaque.utils.gaussian_blur import gaussian_blur
+from PyPlaque.utils.parallel_map import parallel_map
+from PyPlaque.utils.remove_artifacts import remove_artifacts
+from PyPlaque.utils.remove_background import remove_background
+from PyPlaque.utils.stitch_wells import stitch_wells
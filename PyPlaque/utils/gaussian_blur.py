@@ -0,0 +1,165 @@
+import math
+import warnings
+
+import cv2
+import numpy as np
+from scipy import ndimage as ndi
+from scipy import signal
+from skimage.filters import gaussian
+from skimage.util import img_as_float
+
+from PyPlaque.utils import increment_counter
+
+GAUSSIAN_BLUR_METHODS = ('exact', 'fft', 'pyramid', 'iir')
+
+
+def _gaussian_kernel1d(sigma, truncate):
+  """
+  **_gaussian_kernel1d Function**
+  Returns the normalised 1D Gaussian kernel that scipy.ndimage.gaussian_filter uses for the given
+  sigma and truncate.
+  """
+  radius = int(truncate * sigma + 0.5)
+  x = np.arange(-radius, radius + 1)
+  kernel = np.exp(-0.5 / sigma ** 2 * x ** 2)
+  return kernel / kernel.sum()
+
+
+def _fft_blur(image, sigma, truncate):
+  """
+  **_fft_blur Function**
+  Separable FFT convolution with the truncated kernel. The image is edge padded first so that the
+  border handling matches the 'nearest' mode of the exact blur.
+  """
+  kernel = _gaussian_kernel1d(sigma, truncate)
+  radius = len(kernel) // 2
+  padded = np.pad(image, radius, mode='edge')
+  blurred = signal.fftconvolve(padded, kernel[:, None], mode='valid')
+  return signal.fftconvolve(blurred, kernel[None, :], mode='valid')
+
+
+def _pyramid_factor(sigma, tolerance):
+  """
+  **_pyramid_factor Function**
+  Returns the downsampling factor of the pyramid blur. Bilinear upsampling moves a peak by at most
+  about half a factor, and the blur at the reduced size keeps a sigma of at least 4 pixels.
+  """
+  return int(max(1, min(2 * tolerance, sigma // 4)))
+
+
+def _pyramid_blur(image, sigma, truncate, tolerance):
+  """
+  **_pyramid_blur Function**
+  Blurs a downsampled copy of the image with a proportionally smaller sigma and upsamples the
+  result back to the original size.
+  """
+  factor = _pyramid_factor(sigma, tolerance)
+  if factor == 1:
+    return ndi.gaussian_filter(image, sigma, mode='nearest', truncate=truncate)
+  height, width = image.shape
+  small = cv2.resize(image, (-(-width // factor), -(-height // factor)),
+                     interpolation=cv2.INTER_AREA)
+  small = ndi.gaussian_filter(small, sigma / factor, mode='nearest', truncate=truncate)
+  return cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def _iir_coefficients(sigma):
+  """
+  **_iir_coefficients Function**
+  Returns the numerator and denominator of the third order recursive Gaussian of Young and van
+  Vliet (Signal Processing 44, 1995).
+  """
+  if sigma >= 2.5:
+    q = 0.98711 * sigma - 0.96330
+  else:
+    q = 3.97156 - 4.14554 * np.sqrt(1 - 0.26891 * sigma)
+  b0 = 1.57825 + 2.44413 * q + 1.4281 * q ** 2 + 0.422205 * q ** 3
+  b1 = 2.44413 * q + 2.85619 * q ** 2 + 1.26661 * q ** 3
+  b2 = -(1.4281 * q ** 2 + 1.26661 * q ** 3)
+  b3 = 0.422205 * q ** 3
+  gain = 1 - (b1 + b2 + b3) / b0
+  return np.array([gain]), np.array([1, -b1 / b0, -b2 / b0, -b3 / b0])
+
+
+def _iir_displacement(sigma, truncate):
+  """
+  **_iir_displacement Function**
+  Returns an estimate of how far the recursive Gaussian can move a local maximum of the truncated
+  exact blur, in pixels. Measured on synthetic plaque regions, the approximation moves peaks by
+  up to about 5% of sigma, and the signal beyond the truncation radius, which the recursive
+  Gaussian does not cut off, by about three times its share of the kernel, plus a pixel of
+  rounding.
+  """
+  return 1 + sigma * (0.05 + 3 * math.erfc(truncate / math.sqrt(2)))
+
+
+def _iir_blur(image, sigma):
+  """
+  **_iir_blur Function**
+  Applies the recursive Gaussian forwards and backwards along both axes. The image is edge padded
+  by three sigma and the filter state starts at the edge value, so that start-up transients decay
+  before the image and the borders behave like the 'nearest' mode of the exact blur.
+  """
+  b, a = _iir_coefficients(sigma)
+  zi = signal.lfilter_zi(b, a)
+  pad = int(3 * sigma + 0.5)
+  blurred = np.pad(image, pad, mode='edge')
+  for _ in range(2):
+    for _ in range(2):
+      blurred, _ = signal.lfilter(b, a, blurred, axis=-1, zi=zi[None, :] * blurred[:, :1])
+      blurred = blurred[:, ::-1]
+    blurred = blurred.T
+  return np.ascontiguousarray(blurred[pad:-pad, pad:-pad]) if pad else blurred
+
+
+def gaussian_blur(image, sigma, truncate=4.0, method='exact', tolerance=2):
+  """
+  **gaussian_blur Function**
+  This function blurs an image with a Gaussian filter using one of several backends. The 'exact'
+  method is `skimage.filters.gaussian` with 'nearest' borders. For the large sigmas used in fine
+  plaque detection it can be replaced by a faster approximation:
+    - 'fft': FFT convolution with the same truncated kernel, equal to the exact result up to
+      floating point rounding.
+    - 'pyramid': blurs a copy downsampled by up to `2*tolerance` and upsamples it back, so that
+      local maxima move by about `tolerance` pixels at most.
+    - 'iir': a recursive Gaussian whose cost does not depend on sigma. It approximates the
+      untruncated Gaussian, so signal beyond the truncation radius can move its local maxima by
+      a few percent of sigma. If the estimated displacement, about 0.2 sigma for a truncate of
+      2, exceeds `tolerance`, the 'fft' method is used instead with a RuntimeWarning and the
+      'iir_fallbacks' counter is incremented. With the default tolerance this happens above a
+      sigma of about 20, so larger sigmas need a tolerance in proportion, e.g. a fraction of
+      the peak region size.
+  Like `skimage.filters.gaussian`, integer images are first scaled to floats in [0, 1].
+
+  Args:
+    image (np.ndarray, required): A 2D numpy array representing the image to blur.
+    sigma (float, required): The standard deviation of the Gaussian in pixels.
+    truncate (float, optional): The kernel radius in units of sigma. Defaults to 4.0.
+    method (str, optional): One of 'exact', 'fft', 'pyramid' or 'iir'. Defaults to 'exact'.
+    tolerance (float, optional): The accepted displacement of local maxima in pixels, used by the
+                              'pyramid' method to choose its downsampling factor and by the 'iir'
+                              method to decide whether it is accurate enough. Defaults to 2.
+
+  Returns:
+    np.ndarray: The blurred image as a 2D float64 numpy array of the same shape as `image`.
+
+  Raises:
+    ValueError: If `method` is not one of the supported methods.
+  """
+  if method not in GAUSSIAN_BLUR_METHODS:
+    raise ValueError(f"method must be one of {GAUSSIAN_BLUR_METHODS}, got {method!r}")
+  if method == 'exact':
+    return gaussian(image, sigma=sigma, truncate=truncate)
+
+  image = img_as_float(np.asarray(image)).astype(np.float64, copy=False)
+  if method == 'iir' and _iir_displacement(sigma, truncate) > tolerance:
+    increment_counter('iir_fallbacks')
+    warnings.warn(f"The recursive Gaussian blur can move peaks by up to "
+                  f"{_iir_displacement(sigma, truncate):.1f} pixels at sigma {sigma}, more than the "
+                  f"tolerance of {tolerance}; using the 'fft' method instead", RuntimeWarning)
+    method = 'fft'
+  if method == 'fft':
+    return _fft_blur(image, sigma, truncate)
+  if method == 'pyramid':
+    return _pyramid_blur(image, sigma, truncate, tolerance)
+  return _iir_blur(image, sigma)
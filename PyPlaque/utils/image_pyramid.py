@@ -0,0 +1,295 @@
+import json
+import math
+import os
+from pathlib import Path
+import tempfile
+
+import cv2
+import numpy as np
+from skimage.measure import label
+
+from PyPlaque.utils import fixed_threshold
+
+IMAGE_PYRAMID_VERSION = 1
+
+
+def _downsample(image):
+  """
+  **_downsample Function**
+  Halves an image by averaging blocks of 2x2 pixels, repeating the last row or column of images
+  with an odd size. Integer images are rounded and binary images thresholded at one half, so the
+  level keeps the data type of the image.
+  """
+  pad = [(0, image.shape[0] % 2), (0, image.shape[1] % 2)] + [(0, 0)]*(image.ndim - 2)
+  if any(p[1] for p in pad):
+    image = np.pad(image, pad, mode='edge')
+  blocks = image.reshape((image.shape[0]//2, 2, image.shape[1]//2, 2) + image.shape[2:])
+  mean = blocks.mean(axis=(1, 3), dtype=np.float64)
+  if image.dtype == bool:
+    return mean >= 0.5
+  if np.issubdtype(image.dtype, np.integer):
+    return np.rint(mean).astype(image.dtype)
+  return mean.astype(image.dtype)
+
+
+def _resize(image, shape):
+  """
+  **_resize Function**
+  Resizes an image to a (height, width) shape by area averaging, keeping its data type.
+  """
+  if image.shape[:2] == tuple(shape):
+    return image
+  small = cv2.resize(image.astype(np.float32), (shape[1], shape[0]), interpolation=cv2.INTER_AREA)
+  if image.dtype == bool:
+    return small >= 0.5
+  if np.issubdtype(image.dtype, np.integer):
+    return np.rint(small).astype(image.dtype)
+  return small.astype(image.dtype)
+
+
+def _pyramid_folder(image, path):
+  """
+  **_pyramid_folder Function**
+  Returns the folder of a pyramid, by default next to a mosaic `.npy` file with the suffix
+  `.pyramid`.
+  """
+  if path is not None:
+    return Path(path)
+  if not isinstance(image, (str, Path)):
+    raise ValueError('path is required unless the image is a .npy file')
+  return Path(image).with_suffix('.pyramid')
+
+
+def build_image_pyramid(image, path=None, min_size=256, chunk_size=512):
+  """
+  **build_image_pyramid Function**
+  This function writes a multi-resolution pyramid of a large image, e.g. a plate mosaic from
+  `stitch_wells` or a full plate image of `CrystalViolet`, so that overviews, thumbnails and quick
+  counts read a small level instead of the full resolution image. Level k is the image halved k
+  times by averaging 2x2 pixel blocks, in the data type of the image. Levels are halved until the
+  longer side is at most `min_size`, and every level is stored as a compressed `.npz` file of
+  `chunk_size` squared chunks, so a region of a level only decompresses the chunks it overlaps.
+  Level 0 is not copied: if `image` is a `.npy` file, e.g. the memmap written by `stitch_wells`,
+  it is read from there, and it is only decoded in bands of rows while the pyramid is built.
+
+  Args:
+    image (np.ndarray, str or Path, required): The 2D image, or a 3D image with channels last, or
+                                            the `.npy` file of one.
+    path (str or Path, optional): The folder of the pyramid. Defaults to None, which uses the
+                                `.npy` file of the image with the suffix `.pyramid`.
+    min_size (int, optional): The maximum length of the longer side of the coarsest level.
+                            Defaults to 256.
+    chunk_size (int, optional): The side length of the stored chunks. Defaults to 512.
+
+  Returns:
+    ImagePyramid: The written pyramid.
+
+  Raises:
+    ValueError: If the image is not 2D or 3D, `min_size` or `chunk_size` is not positive, or no
+    `path` is given for an array.
+  """
+  folder = _pyramid_folder(image, path)
+  source = None
+  if isinstance(image, (str, Path)):
+    source = Path(image).resolve()
+    image = np.load(source, mmap_mode='r')
+  if image.ndim not in (2, 3):
+    raise ValueError(f'Expected a 2D or 3D image, got shape {image.shape}')
+  if min_size < 1 or chunk_size < 1:
+    raise ValueError('min_size and chunk_size must be positive')
+
+  folder.mkdir(parents=True, exist_ok=True)
+  levels = []
+  previous = image
+  while max(previous.shape[:2]) > min_size:
+    shape = ((previous.shape[0] + 1)//2, (previous.shape[1] + 1)//2) + previous.shape[2:]
+    level = np.empty(shape, dtype=image.dtype)
+    # bands of an even number of rows are halved independently of each other
+    for top in range(0, shape[0], chunk_size):
+      level[top:top + chunk_size] = _downsample(np.asarray(previous[2*top:2*(top + chunk_size)]))
+    chunks = {f'{r}_{c}': level[r*chunk_size:(r + 1)*chunk_size, c*chunk_size:(c + 1)*chunk_size]
+              for r in range(math.ceil(shape[0]/chunk_size))
+              for c in range(math.ceil(shape[1]/chunk_size))}
+    file_name = f'level_{len(levels) + 1}.npz'
+    with tempfile.NamedTemporaryFile(dir=folder, suffix='.npz.tmp', delete=False) as f:
+      np.savez_compressed(f, **chunks)
+    os.replace(f.name, folder / file_name)
+    levels.append({'level': len(levels) + 1, 'shape': list(shape), 'file': file_name})
+    previous = level
+
+  metadata = {
+    'version': IMAGE_PYRAMID_VERSION,
+    'shape': list(image.shape),
+    'dtype': image.dtype.str,
+    'chunk_size': chunk_size,
+    'source': None if source is None else str(source),
+    'levels': levels
+  }
+  with tempfile.NamedTemporaryFile('w', dir=folder, suffix='.json.tmp', delete=False) as f:
+    json.dump(metadata, f)
+  os.replace(f.name, folder / 'pyramid.json')
+  return ImagePyramid(folder, image=None if source is not None else image)
+
+
+class ImagePyramid:
+  """
+  **ImagePyramid Class**
+  This class reads the levels of an image pyramid written by `build_image_pyramid`. Its methods
+  choose the coarsest level that still has the resolution they need, so that overviews of a
+  plate mosaic only decompress a few small chunks.
+
+  Attributes:
+    path (str or Path, required): The folder of the pyramid.
+    image (np.ndarray, optional): The full resolution image, used as level 0. Defaults to None,
+                                which memory maps the `.npy` source of the pyramid if it has one.
+                                Without either, level 0 is not available.
+
+  Raises:
+    ValueError: If `path` is not a pyramid of a supported version, `image` has another shape, or
+    no level is available.
+  """
+  def __init__(self, path, image=None):
+    self.path = Path(path)
+    try:
+      with open(self.path / 'pyramid.json') as f:
+        metadata = json.load(f)
+    except (OSError, ValueError) as e:
+      raise ValueError(f"{path} is not an image pyramid") from e
+    if metadata.get('version') != IMAGE_PYRAMID_VERSION:
+      raise ValueError(f"Unsupported image pyramid version {metadata.get('version')}")
+    self.shape = tuple(metadata['shape'])
+    self.dtype = np.dtype(metadata['dtype'])
+    self.chunk_size = metadata['chunk_size']
+    self._files = {lvl['level']: self.path / lvl['file'] for lvl in metadata['levels']}
+    self._shapes = {lvl['level']: tuple(lvl['shape']) for lvl in metadata['levels']}
+
+    if image is None and metadata.get('source') and os.path.exists(metadata['source']):
+      image = np.load(metadata['source'], mmap_mode='r')
+    if image is not None:
+      if tuple(image.shape) != self.shape:
+        raise ValueError(f'image has the shape {image.shape}, expected {self.shape}')
+      self._shapes[0] = self.shape
+    self.image = image
+    self.levels = sorted(self._shapes)
+    if not self.levels:
+      raise ValueError(f"{path} has no levels, the full resolution image is required")
+
+  def __len__(self):
+    return len(self.levels)
+
+  def level_shape(self, level):
+    """
+    **level_shape Method**
+    Returns the shape of a level.
+
+    Args:
+      level (int, required): The level, 0 for the full resolution.
+
+    Returns:
+      tuple: The shape of the level.
+
+    Raises:
+      KeyError: If the level is not available.
+    """
+    return self._shapes[level]
+
+  def select_level(self, target):
+    """
+    **select_level Method**
+    Returns the coarsest level that has at least the target resolution, or the finest available
+    level if none has.
+
+    Args:
+      target (int or tuple, required): The length of the longer side, or the (height, width), that
+                                      the level must at least have.
+
+    Returns:
+      int: The level.
+    """
+    for level in reversed(self.levels):
+      shape = self._shapes[level]
+      if isinstance(target, (tuple, list)):
+        if shape[0] >= target[0] and shape[1] >= target[1]:
+          return level
+      elif max(shape[:2]) >= target:
+        return level
+    return self.levels[0]
+
+  def read(self, level, region=None):
+    """
+    **read Method**
+    Reads a level, or a region of it, decompressing only the chunks that overlap the region.
+
+    Args:
+      level (int, required): The level, 0 for the full resolution.
+      region (tuple, optional): The (min_row, min_col, max_row, max_col) of the region in pixels
+                              of the level. Defaults to None, which reads the whole level.
+
+    Returns:
+      np.ndarray: The pixels of the region.
+
+    Raises:
+      KeyError: If the level is not available.
+    """
+    shape = self._shapes[level]
+    minr, minc, maxr, maxc = (0, 0) + shape[:2] if region is None else region
+    minr, minc = max(minr, 0), max(minc, 0)
+    maxr, maxc = min(maxr, shape[0]), min(maxc, shape[1])
+    if level == 0:
+      return np.asarray(self.image[minr:maxr, minc:maxc])
+
+    out = np.empty((max(maxr - minr, 0), max(maxc - minc, 0)) + shape[2:], dtype=self.dtype)
+    size = self.chunk_size
+    with np.load(self._files[level]) as chunks:
+      for r in range(minr//size, math.ceil(maxr/size)):
+        for c in range(minc//size, math.ceil(maxc/size)):
+          chunk = chunks[f'{r}_{c}']
+          top, left = max(minr, r*size), max(minc, c*size)
+          bottom, right = min(maxr, (r + 1)*size), min(maxc, (c + 1)*size)
+          out[top - minr:bottom - minr, left - minc:right - minc] = \
+            chunk[top - r*size:bottom - r*size, left - c*size:right - c*size]
+    return out
+
+  def thumbnail(self, max_size=256):
+    """
+    **thumbnail Method**
+    Returns the image reduced so that its longer side is at most `max_size`, read from the
+    coarsest level that fits and resized by area averaging from there.
+
+    Args:
+      max_size (int, optional): The maximum length of the longer side. Defaults to 256.
+
+    Returns:
+      np.ndarray: The thumbnail in the data type of the image.
+    """
+    image = self.read(self.select_level(max_size))
+    scale = min(1.0, max_size/max(image.shape[:2]))
+    return _resize(image, (max(1, round(image.shape[0]*scale)),
+                           max(1, round(image.shape[1]*scale))))
+
+  def quick_count(self, threshold, sigma, min_area, min_pixels=9):
+    """
+    **quick_count Method**
+    Counts the bright regions of the image, e.g. plaques of a mosaic, with `fixed_threshold` on
+    the coarsest level on which a region of `min_area` still covers `min_pixels` pixels. The
+    smoothing and the area are scaled to that level, so the count approximates the count at full
+    resolution without reading it.
+
+    Args:
+      threshold (float, required): The threshold of `fixed_threshold`.
+      sigma (float, required): The sigma of the Gaussian smoothing at full resolution.
+      min_area (float, required): The minimum area of a counted region in full resolution pixels.
+      min_pixels (int, optional): The minimum number of pixels of a region of `min_area` on the
+                                level used. Defaults to 9.
+
+    Returns:
+      tuple: The number of regions and the level they were counted on.
+    """
+    level = self.levels[0]
+    for candidate in self.levels:
+      if min_area/4**candidate >= min_pixels:
+        level = candidate
+    scale = 2**level
+    mask = fixed_threshold(self.read(level), threshold, sigma/scale)
+    areas = np.bincount(label(mask > 0).ravel())[1:]
+    return int(np.count_nonzero(areas >= min_area/scale**2)), level
@@ -0,0 +1,283 @@
+from collections import defaultdict
+from contextlib import contextmanager
+import functools
+import json
+import threading
+import time
+
+# sinks receiving events, instrumentation is disabled while this list is empty
+_SINKS = []
+_SINKS_LOCK = threading.Lock()
+
+
+def instrumentation_enabled():
+  """
+  **instrumentation_enabled Function**
+  Returns whether any sink is registered. Stage timers and counters do nothing otherwise.
+  """
+  return bool(_SINKS)
+
+
+def add_sink(sink):
+  """
+  **add_sink Function**
+  Registers a sink that receives every instrumentation event. A sink is any callable taking the
+  event dictionary, such as `MemorySink`, `JSONLinesSink` or `CallbackSink`.
+
+  Args:
+    sink (callable, required): The sink to register.
+
+  Returns:
+    callable: The registered sink.
+  """
+  with _SINKS_LOCK:
+    _SINKS.append(sink)
+  return sink
+
+
+def remove_sink(sink):
+  """
+  **remove_sink Function**
+  Unregisters a sink registered with `add_sink`. Unknown sinks are ignored.
+
+  Args:
+    sink (callable, required): The sink to unregister.
+
+  Returns:
+    None
+  """
+  with _SINKS_LOCK:
+    if sink in _SINKS:
+      _SINKS.remove(sink)
+
+
+@contextmanager
+def instrument(*sinks):
+  """
+  **instrument Function**
+  Context manager registering sinks for the duration of a block, e.g.
+
+  ```
+  summary = MemorySink()
+  with instrument(summary):
+    exp.load_wells_for_plate_virus(plate_id=0)
+  print(summary.summary())
+  ```
+
+  Args:
+    *sinks (callable): The sinks to register.
+
+  Yields:
+    tuple: The registered sinks.
+  """
+  for sink in sinks:
+    add_sink(sink)
+  try:
+    yield sinks
+  finally:
+    for sink in sinks:
+      remove_sink(sink)
+
+
+def _emit(event):
+  """
+  **_emit Function**
+  Sends an event to all registered sinks.
+  """
+  event['time'] = time.time()
+  event['thread'] = threading.current_thread().name
+  for sink in list(_SINKS):
+    sink(event)
+
+
+class StageTimer:
+  """
+  **StageTimer Class**
+  Context manager and decorator timing a processing stage, usually created with `stage_timer`.
+  When a sink is registered, leaving the block emits a 'stage' event with the stage name, the
+  elapsed wall time in seconds, whether the stage raised and any additional fields. Without sinks
+  it only checks the sink list, so instrumented code runs at full speed when instrumentation is
+  disabled. Events of code running in pool processes are not sent to the sinks of the parent
+  process.
+
+  Attributes:
+    name (str, required): The name of the stage.
+    **fields: Additional values reported with the event, e.g. the image name.
+  """
+  __slots__ = ('name', 'fields', 'start')
+
+  def __init__(self, name, **fields):
+    self.name = name
+    self.fields = fields
+    self.start = None
+
+  def __enter__(self):
+    if _SINKS:
+      self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if self.start is not None and _SINKS:
+      event = {'event': 'stage', 'name': self.name,
+               'seconds': time.perf_counter() - self.start, 'failed': exc_type is not None}
+      event.update(self.fields)
+      _emit(event)
+    self.start = None
+    return False
+
+  def __call__(self, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      with StageTimer(self.name, **self.fields):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def stage_timer(name, **fields):
+  """
+  **stage_timer Function**
+  Returns a `StageTimer` for a processing stage, to be used as a context manager or decorator,
+  e.g.
+
+  ```
+  with stage_timer('decode', path=str(path)):
+    img = TIFF.imread(path)
+
+  @stage_timer('remove_background')
+  def remove_background(img, radius):
+    ...
+  ```
+
+  Args:
+    name (str, required): The name of the stage.
+    **fields: Additional values reported with the event.
+
+  Returns:
+    StageTimer: The stage timer.
+  """
+  return StageTimer(name, **fields)
+
+
+def increment_counter(name, value=1, **fields):
+  """
+  **increment_counter Function**
+  Emits a 'counter' event adding `value` to the counter `name`, e.g. the bytes decoded, objects
+  labelled or peaks found. Does nothing when no sink is registered.
+
+  Args:
+    name (str, required): The name of the counter.
+    value (int or float, optional): The increment. Defaults to 1.
+    **fields: Additional values reported with the event.
+
+  Returns:
+    None
+  """
+  if _SINKS:
+    event = {'event': 'counter', 'name': name, 'value': value}
+    event.update(fields)
+    _emit(event)
+
+
+class MemorySink:
+  """
+  **MemorySink Class**
+  Sink keeping all events in memory and summarising them per stage and counter.
+
+  Attributes:
+    keep_events (bool, optional): Whether to keep the individual events in `events` in addition
+                                to the summary. Defaults to True.
+  """
+  def __init__(self, keep_events=True):
+    self.keep_events = keep_events
+    self.events = []
+    self.stages = defaultdict(list)
+    self.counters = defaultdict(int)
+    self._lock = threading.Lock()
+
+  def __call__(self, event):
+    with self._lock:
+      if self.keep_events:
+        self.events.append(event)
+      if event['event'] == 'stage':
+        self.stages[event['name']].append(event['seconds'])
+      elif event['event'] == 'counter':
+        self.counters[event['name']] += event['value']
+
+  def summary(self):
+    """
+    **summary Method**
+    Returns the number of calls and the total, mean and maximum time of every stage and the total
+    of every counter.
+
+    Args:
+
+    Returns:
+      dict: A dictionary with the keys 'stages' and 'counters'.
+    """
+    with self._lock:
+      stages = {name: {'calls': len(times), 'total': sum(times), 'mean': sum(times) / len(times),
+                       'max': max(times)} for name, times in self.stages.items()}
+      return {'stages': stages, 'counters': dict(self.counters)}
+
+  def clear(self):
+    """
+    **clear Method**
+    Forgets all events.
+    """
+    with self._lock:
+      self.events.clear()
+      self.stages.clear()
+      self.counters.clear()
+
+
+class JSONLinesSink:
+  """
+  **JSONLinesSink Class**
+  Sink appending every event as one JSON object per line to a file.
+
+  Attributes:
+    path (str or Path, required): The file the events are appended to.
+  """
+  def __init__(self, path):
+    self.path = path
+    self._file = open(path, 'a')
+    self._lock = threading.Lock()
+
+  def __call__(self, event):
+    line = json.dumps(event, default=str)
+    with self._lock:
+      self._file.write(line + '\n')
+
+  def close(self):
+    """
+    **close Method**
+    Flushes and closes the file.
+    """
+    with self._lock:
+      self._file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+    return False
+
+
+class CallbackSink:
+  """
+  **CallbackSink Class**
+  Sink forwarding events to a callback, optionally only events of some stages or counters.
+
+  Attributes:
+    callback (callable, required): A function taking the event dictionary.
+    names (iterable, optional): The stage and counter names to forward. Defaults to None, which
+                              forwards all events.
+  """
+  def __init__(self, callback, names=None):
+    self.callback = callback
+    self.names = None if names is None else set(names)
+
+  def __call__(self, event):
+    if self.names is None or event['name'] in self.names:
+      self.callback(event)
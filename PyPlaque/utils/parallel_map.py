@@ -0,0 +1,61 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+from tqdm.auto import tqdm
+
+
+def _single_threaded_worker():
+  """
+  **_single_threaded_worker Function**
+  Initialiser for pool processes. OpenCV runs its own thread pool inside every call, so with one
+  process per core it is limited to a single thread to avoid oversubscribing the machine.
+  """
+  cv2.setNumThreads(1)
+
+
+def parallel_map(func, items, workers=None, use_processes=False, chunksize=1, progress=True) -> list:
+  """
+  **parallel_map Function**
+  This function applies `func` to every element of `items` and returns the results in the same
+  order as the input, optionally spreading the work over a pool of threads or processes. Threads
+  suit I/O-bound work such as decoding image files, while processes suit CPU-bound work such as
+  mask generation. With `workers` set to None or 1 the items are processed one after another in the
+  calling process. A progress bar is shown unless `progress` is False, which library-internal
+  callers processing parts of a single image use to stay silent.
+
+  Args:
+    func (callable, required): The function applied to each item. When `use_processes` is True it
+                              must be picklable, i.e. a module-level function or a
+                              `functools.partial` of one.
+    items (iterable, required): The items to process.
+    workers (int, optional): The number of threads or processes to use. None or 1 runs serially
+                            and -1 uses all available cores. Defaults to None.
+    use_processes (bool, optional): Whether to use a process pool instead of a thread pool.
+                                  Defaults to False.
+    chunksize (int, optional): The number of items sent to a pool process at once. Ignored for
+                              threads. Defaults to 1.
+    progress (bool, optional): Whether to show a progress bar over the items. Defaults to True.
+
+  Returns:
+    list: The results of `func` for every item, in the order of `items`.
+
+  Raises:
+    ValueError: If `workers` is smaller than -1 or equal to 0.
+  """
+  items = list(items)
+  if workers == -1:
+    workers = os.cpu_count()
+  if workers is not None and workers < 1:
+    raise ValueError("workers must be None, -1 or a positive integer")
+
+  if not workers or workers == 1 or len(items) <= 1:
+    return [func(item) for item in tqdm(items, disable=not progress)]
+
+  if use_processes:
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_single_threaded_worker)
+  else:
+    executor = ThreadPoolExecutor(max_workers=workers)
+  with executor:
+    return list(tqdm(executor.map(func, items, chunksize=chunksize), total=len(items),
+                     disable=not progress))
@@ -0,0 +1,139 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+# (rows, columns) of the standard plate formats
+PLATE_FORMATS = {
+  6: (2, 3),
+  12: (3, 4),
+  24: (4, 6),
+  48: (6, 8),
+  96: (8, 12),
+  384: (16, 24),
+  1536: (32, 48)
+}
+
+
+def _initial_lattice(points):
+  """
+  **_initial_lattice Function**
+  Estimates the column and row steps of a lattice from the vectors between neighbouring points. A
+  coarse rotation and pitch from the nearest neighbours classify the vectors to the next few
+  neighbours into row and column steps, whose medians give the steps.
+  """
+  if len(points) < 2:
+    return np.array([0.0, 1.0]), np.array([1.0, 0.0])
+  k = min(len(points), 5)
+  distances, neighbours = cKDTree(points).query(points, k=k)
+  pitch = np.median(distances[:, 1])
+  # angles of the nearest steps folded onto a quarter turn, averaged on the circle
+  nearest = points[neighbours[:, 1]] - points
+  rotation = np.angle(np.mean(np.exp(4j*np.arctan2(nearest[:, 0], nearest[:, 1]))))/4
+  cos, sin = np.cos(rotation), np.sin(rotation)
+  column_step = np.array([sin, cos])*pitch
+  row_step = np.array([cos, -sin])*pitch
+
+  steps = (points[neighbours[:, 1:]] - points[:, None]).reshape(-1, 2)
+  along = (steps @ column_step)/pitch**2
+  across = (steps @ row_step)/pitch**2
+  is_column = (np.abs(np.abs(along) - 1) < 0.3) & (np.abs(across) < 0.3)
+  is_row = (np.abs(np.abs(across) - 1) < 0.3) & (np.abs(along) < 0.3)
+  if is_column.any():
+    column_step = np.median(steps[is_column]*np.sign(along[is_column])[:, None], axis=0)
+  if is_row.any():
+    row_step = np.median(steps[is_row]*np.sign(across[is_row])[:, None], axis=0)
+  elif is_column.any():
+    row_step = np.array([column_step[1], -column_step[0]])
+  if not is_column.any() and is_row.any():
+    column_step = np.array([-row_step[1], row_step[0]])
+  return column_step, row_step
+
+
+def fit_plate_grid(centroids, n_rows, n_columns, max_iter=10):
+  """
+  **fit_plate_grid Function**
+  This function assigns the row and column of a plate to each detected well by fitting a lattice
+  to all well centroids at once. An initial rotation and pitch are estimated from the vectors
+  between nearest neighbours, and the lattice is then refined by alternately snapping every
+  detection to its nearest lattice cell and fitting the origin and the row and column steps
+  (pitch, rotation and shear) by least squares. Missing or merged wells only affect their own
+  cells, unlike ordering wells by their coordinates. The lowest row and column with a detection
+  are taken as row and column 0, so an empty first row or column cannot be told apart from an
+  empty last one.
+
+  Args:
+    centroids (array-like, required): An (n, 2) array of the (row, column) pixel coordinates of
+                                    the detected wells, e.g. regionprops centroids.
+    n_rows (int, required): The number of rows of the plate.
+    n_columns (int, required): The number of columns of the plate, along the x axis of the image.
+    max_iter (int, optional): The maximum number of snap and fit steps. Defaults to 10.
+
+  Returns:
+    dict: A dictionary containing:
+        - 'nrow', 'ncol' (np.ndarray): The row and column of every detection, -1 for detections
+          outside of the plate.
+        - 'origin' (np.ndarray): The (row, column) pixel position of the cell (0, 0).
+        - 'row_step', 'column_step' (np.ndarray): The pixel offsets between neighbouring rows and
+          neighbouring columns.
+        - 'rotation' (float): The rotation of the columns against the x axis in degrees.
+        - 'residuals' (np.ndarray): The distance of every detection to its cell in pixels.
+        - 'empty_cells' (list): The (row, column) cells without a detection.
+        - 'duplicate_cells' (list): The (row, column) cells with several detections, e.g. wells
+          split by the segmentation.
+        - 'outside' (np.ndarray): The indices of the detections outside of the plate.
+
+  Raises:
+    ValueError: If `centroids` is not an (n, 2) array or the plate size is not positive.
+  """
+  points = np.asarray(centroids, dtype=np.float64)
+  if points.ndim != 2 or points.shape[1] != 2:
+    raise ValueError('centroids must be an (n, 2) array of (row, column) coordinates')
+  if n_rows < 1 or n_columns < 1:
+    raise ValueError('n_rows and n_columns must be positive')
+
+  column_step, row_step = _initial_lattice(points)
+  # a detection near the top left corner keeps the snapping in phase with the wells
+  origin = points[np.argmin(points.sum(axis=1))] if len(points) else np.zeros(2)
+
+  cells = None
+  design = np.empty((len(points), 3))
+  design[:, 0] = 1
+  for _ in range(max_iter if len(points) else 0):
+    basis = np.stack([row_step, column_step], axis=-1)
+    snapped = np.rint(np.linalg.solve(basis, (points - origin).T).T).astype(int)
+    if len(points):
+      snapped -= snapped.min(axis=0)
+    if cells is not None and np.array_equal(snapped, cells):
+      break
+    cells = snapped
+    if len(points) < 3:
+      origin = (points - cells @ np.stack([row_step, column_step])).mean(axis=0)
+      continue
+    design[:, 1:] = cells
+    params = np.linalg.lstsq(design, points, rcond=None)[0]
+    origin = params[0]
+    # keep the initial step along a direction without two distinct cells
+    if len(np.unique(cells[:, 0])) > 1:
+      row_step = params[1]
+    if len(np.unique(cells[:, 1])) > 1:
+      column_step = params[2]
+
+  cells = np.zeros((0, 2), dtype=int) if cells is None else cells
+  residuals = np.linalg.norm(points - origin - cells @ np.stack([row_step, column_step]), axis=-1)
+  inside = (cells[:, 0] < n_rows) & (cells[:, 1] < n_columns)
+  nrow = np.where(inside, cells[:, 0], -1)
+  ncol = np.where(inside, cells[:, 1], -1)
+
+  counts = np.zeros((n_rows, n_columns), dtype=int)
+  np.add.at(counts, (nrow[inside], ncol[inside]), 1)
+  return {
+    'nrow': nrow,
+    'ncol': ncol,
+    'origin': origin,
+    'row_step': row_step,
+    'column_step': column_step,
+    'rotation': float(np.degrees(np.arctan2(column_step[0], column_step[1]))),
+    'residuals': residuals,
+    'empty_cells': [tuple(cell) for cell in np.argwhere(counts == 0).tolist()],
+    'duplicate_cells': [tuple(cell) for cell in np.argwhere(counts > 1).tolist()],
+    'outside': np.flatnonzero(~inside)
+  }
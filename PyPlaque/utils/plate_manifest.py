@@ -0,0 +1,330 @@
+import fnmatch
+import json
+import os
+from pathlib import Path
+import re
+import tempfile
+
+import numpy as np
+
+PLATE_MANIFEST_VERSION = 1
+
+# e.g. 200601-zplate-g2_A01_s1_w1.tif or P1_B12_s2_w2F3A9.tif
+WELL_FILE_PATTERN = r'_(?P<row>[A-Z]{1,2})(?P<column>[0-9]{2,3})_s(?P<site>[0-9]+)_(?P<channel>w[0-9]+)'
+
+
+class PlateManifest:
+  """
+  **PlateManifest Class**
+  This class indexes the image files of a plate folder, including its subfolders, in a single
+  `os.scandir` pass. The well row, column, site and channel of every file are parsed once with a
+  precompiled pattern and kept as typed numpy columns together with the size and modification
+  time of the file, so that files are looked up by well and channel in constant time and channels
+  are paired by well and site instead of by the position in separately sorted lists. With a
+  `cache_path` the index is stored as JSON, and later sessions only rescan the directories that
+  were modified since, see `refresh`.
+
+  Attributes:
+    folder (str or Path, required): The plate folder.
+    ext (str, optional): The glob pattern of the image files. Defaults to '*.tif'.
+    file_pattern (str, optional): The regular expression searched in the file stems, with the
+                                named groups 'row', 'column', 'site' and 'channel'. Defaults to
+                                `WELL_FILE_PATTERN`.
+    cache_path (str or Path, optional): The JSON file caching the index. Defaults to None, which
+                                        scans the folder every time.
+
+  Raises:
+    ValueError: If `folder` is not a directory.
+  """
+  def __init__(self, folder, ext='*.tif', file_pattern=WELL_FILE_PATTERN, cache_path=None):
+    self.folder = Path(folder)
+    if not self.folder.is_dir():
+      raise ValueError(f"{folder} is not a directory")
+    self.ext = ext
+    self.file_pattern = file_pattern
+    self.cache_path = None if cache_path is None else Path(cache_path)
+    self._ext_regex = re.compile(fnmatch.translate(ext))
+    self._file_regex = re.compile(file_pattern)
+
+    index = self._load_cache()
+    if index is None:
+      index = self._scan()
+      self._save_cache(index)
+      self._set_index(index)
+    else:
+      self._set_index(index)
+      self.refresh()
+
+  def _set_index(self, index):
+    """
+    **_set_index Method**
+    Sets the typed columns and lookup tables of an index.
+    """
+    self._index = index
+    self.dirs = index['dirs']
+    self.paths = np.array(index['paths'], dtype=object)
+    self.rows = np.array(index['rows'], dtype=str)
+    self.columns = np.array(index['columns'], dtype=str)
+    self.sites = np.array(index['sites'], dtype=np.int32)
+    self.channels = np.array(index['channels'], dtype=str)
+    self.sizes = np.array(index['sizes'], dtype=np.int64)
+    self.mtimes = np.array(index['mtimes'], dtype=np.int64)
+    self._by_name = {Path(p).name: i for (i, p) in enumerate(index['paths'])}
+    self._by_well = {(r, c, s, ch): i for (i, (r, c, s, ch)) in
+                     enumerate(zip(index['rows'], index['columns'], index['sites'],
+                                   index['channels'])) if r}
+
+  def _scan(self, folders=None, known=()):
+    """
+    **_scan Method**
+    Scans folders of the plate, by default the plate folder, once and parses the names of the 
+    matching files. Subfolders are scanned as well unless they are in `known`.
+    """
+    index = {'dirs': {}, 'paths': [], 'rows': [], 'columns': [], 'sites': [], 'channels': [],
+             'sizes': [], 'mtimes': []}
+    folders = [self.folder] if folders is None else [self.folder / f for f in folders]
+    known = set(known) | {f.relative_to(self.folder).as_posix() for f in folders}
+    while folders:
+      folder = folders.pop()
+      try:
+        mtime = os.stat(folder).st_mtime_ns
+        entries = list(os.scandir(folder))
+      except FileNotFoundError:
+        continue
+      index['dirs'][folder.relative_to(self.folder).as_posix()] = mtime
+      for entry in entries:
+        if entry.is_dir():
+          subfolder = Path(entry.path).relative_to(self.folder).as_posix()
+          if subfolder not in known:
+            known.add(subfolder)
+            folders.append(Path(entry.path))
+        elif self._ext_regex.match(entry.name):
+          match = self._file_regex.search(os.path.splitext(entry.name)[0])
+          try:
+            stat = entry.stat()
+          except FileNotFoundError:
+            continue
+          index['paths'].append(Path(entry.path).relative_to(self.folder).as_posix())
+          index['rows'].append(match['row'] if match else '')
+          index['columns'].append(match['column'] if match else '')
+          index['sites'].append(int(match['site']) if match else -1)
+          index['channels'].append(match['channel'] if match else '')
+          index['sizes'].append(stat.st_size)
+          index['mtimes'].append(stat.st_mtime_ns)
+    return _sorted_index(index)
+
+  def _changed_dirs(self, dirs):
+    """
+    **_changed_dirs Method**
+    Returns the directories whose modification time differs from `dirs` or that were removed.
+    """
+    changed = []
+    for (folder, mtime) in dirs.items():
+      try:
+        if os.stat(self.folder / folder).st_mtime_ns != mtime:
+          changed.append(folder)
+      except FileNotFoundError:
+        changed.append(folder)
+    return changed
+
+  def refresh(self):
+    """
+    **refresh Method**
+    Updates the index of a folder that is still being written. Only the directories that were 
+    modified since the last scan, which is where files were added, removed or renamed, are 
+    scanned again, together with new subfolders. Files written in place keep the size and 
+    modification time they had when they were indexed, use `stat` for their current values.
+
+    Returns:
+      bool: True if the index changed.
+    """
+    changed = set(self._changed_dirs(self.dirs))
+    if not changed:
+      return False
+    known = {folder for folder in self.dirs if folder not in changed}
+    index = self._scan(sorted(changed), known)
+    keep = [i for (i, p) in enumerate(self._index['paths'])
+            if Path(p).parent.as_posix() in known]
+    for key in index:
+      if key == 'dirs':
+        index['dirs'].update({folder: self.dirs[folder] for folder in known})
+      else:
+        index[key] += [self._index[key][i] for i in keep]
+    index = _sorted_index(index)
+    self._save_cache(index)
+    self._set_index(index)
+    return True
+
+  def stat(self, path):
+    """
+    **stat Method**
+    Returns the current size and modification time of a file, e.g. to check whether a file that 
+    is still being written has changed since it was processed.
+
+    Args:
+      path (str or Path, required): The file, absolute or relative to the plate folder.
+
+    Returns:
+      tuple: The size in bytes and the modification time in nanoseconds, or None if the file does 
+      not exist.
+    """
+    try:
+      stat = os.stat(self.folder / path)
+    except FileNotFoundError:
+      return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+  def _load_cache(self):
+    """
+    **_load_cache Method**
+    Returns the cached index, or None if there is none or it was built with other settings.
+    """
+    if self.cache_path is None or not self.cache_path.exists():
+      return None
+    try:
+      with open(self.cache_path) as f:
+        index = json.load(f)
+    except (OSError, ValueError):
+      return None
+    if (index.get('version') != PLATE_MANIFEST_VERSION or
+        index.get('folder') != str(self.folder.resolve()) or index.get('ext') != self.ext or
+        index.get('file_pattern') != self.file_pattern):
+      return None
+    return index
+
+  def _save_cache(self, index):
+    """
+    **_save_cache Method**
+    Writes the index to the cache file atomically.
+    """
+    if self.cache_path is None:
+      return
+    self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cached = dict(index, version=PLATE_MANIFEST_VERSION, folder=str(self.folder.resolve()),
+                  ext=self.ext, file_pattern=self.file_pattern)
+    with tempfile.NamedTemporaryFile('w', dir=self.cache_path.parent, suffix=".json.tmp",
+                                     delete=False) as f:
+      json.dump(cached, f)
+    os.replace(f.name, self.cache_path)
+
+  def __len__(self):
+    return len(self.paths)
+
+  def files(self, channel=None):
+    """
+    **files Method**
+    Returns the indexed files, optionally of a single channel, sorted by path.
+
+    Args:
+      channel (str, optional): The channel, e.g. 'w1'. Defaults to None, which returns all files.
+
+    Returns:
+      list: The Path objects of the files.
+    """
+    selected = self.paths if channel is None else self.paths[self.channels == channel]
+    return [self.folder / p for p in selected]
+
+  def get(self, row, column, channel, site=1):
+    """
+    **get Method**
+    Returns the file of a well, site and channel.
+
+    Args:
+      row (str, required): The well row, e.g. 'A'.
+      column (str, required): The well column as in the file name, e.g. '01'.
+      channel (str, required): The channel, e.g. 'w1'.
+      site (int, optional): The site. Defaults to 1.
+
+    Returns:
+      Path: The file, or None if it is not in the index.
+    """
+    i = self._by_well.get((row, column, site, channel))
+    return None if i is None else self.folder / self.paths[i]
+
+  def lookup(self, name):
+    """
+    **lookup Method**
+    Returns the parsed fields of an indexed file by its name.
+
+    Args:
+      name (str or Path, required): The file name or path. Only the name is used.
+
+    Returns:
+      dict: The 'path', 'row', 'column', 'site', 'channel', 'size' and 'mtime_ns' of the file,
+      or None if it is not in the index. Files whose name does not match the file pattern have
+      empty 'row', 'column' and 'channel' and a 'site' of -1.
+    """
+    i = self._by_name.get(Path(name).name)
+    if i is None:
+      return None
+    return {'path': self.folder / self.paths[i], 'row': str(self.rows[i]),
+            'column': str(self.columns[i]), 'site': int(self.sites[i]),
+            'channel': str(self.channels[i]), 'size': int(self.sizes[i]),
+            'mtime_ns': int(self.mtimes[i])}
+
+  def pairs(self, channels=('w1', 'w2')):
+    """
+    **pairs Method**
+    Pairs the files of several channels by well and site. Wells or sites missing one of the
+    channels are left out, see `incomplete`.
+
+    Args:
+      channels (tuple, optional): The channels to pair. Defaults to ('w1', 'w2').
+
+    Returns:
+      list: One dictionary per well and site, in row, column and site order, with the keys 'row',
+      'column' and 'site' and the file Path of every channel under the channel name.
+    """
+    result = []
+    for (row, column, site) in self._wells(channels[0]):
+      indices = [self._by_well.get((row, column, site, channel)) for channel in channels]
+      if None in indices:
+        continue
+      pair = {'row': row, 'column': column, 'site': site}
+      pair.update({channel: self.folder / self.paths[i] for (channel, i) in zip(channels,
+                                                                                indices)})
+      result.append(pair)
+    return result
+
+  def incomplete(self, channels=('w1', 'w2')):
+    """
+    **incomplete Method**
+    Returns the wells and sites that have files of some but not all of the given channels, e.g.
+    wells of a plate that is still being acquired.
+
+    Args:
+      channels (tuple, optional): The channels expected for every well. Defaults to ('w1', 'w2').
+
+    Returns:
+      list: The (row, column, site) tuples of the incomplete wells, in order.
+    """
+    wells = sorted(set().union(*[self._wells(channel) for channel in channels]),
+                   key=_well_order)
+    return [well for well in wells
+            if any((well + (channel,)) not in self._by_well for channel in channels)]
+
+  def _wells(self, channel):
+    """
+    **_wells Method**
+    Returns the (row, column, site) tuples of the files of a channel, in order.
+    """
+    return sorted({key[:3] for key in self._by_well if key[3] == channel}, key=_well_order)
+
+
+def _well_order(well):
+  """
+  **_well_order Function**
+  Sort key of (row, column, site) tuples, ordering 'B' before 'AA' and columns numerically.
+  """
+  row, column, site = well
+  return (len(row), row, int(column), site)
+
+
+def _sorted_index(index):
+  """
+  **_sorted_index Function**
+  Sorts the file columns of an index by path.
+  """
+  order = sorted(range(len(index['paths'])), key=index['paths'].__getitem__)
+  return {key: (value if key == 'dirs' else [value[i] for i in order])
+          for (key, value) in index.items()}
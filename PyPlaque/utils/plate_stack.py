@@ -0,0 +1,171 @@
+import json
+import os
+from pathlib import Path
+import tempfile
+
+import numpy as np
+
+from PyPlaque.utils import parallel_map
+
+PLATE_STACK_VERSION = 1
+
+
+def _stack_paths(stack_path):
+  """
+  **_stack_paths Function**
+  Returns the paths of the array and the index file of a plate stack.
+  """
+  stack_path = Path(stack_path)
+  if stack_path.suffix in ('.npy', '.json'):
+    stack_path = stack_path.with_suffix('')
+  return stack_path.with_suffix('.npy'), stack_path.with_suffix('.json')
+
+
+def _source_stat(path):
+  """
+  **_source_stat Function**
+  Returns the size and modification time of a source image file.
+  """
+  stat = os.stat(path)
+  return [stat.st_size, stat.st_mtime_ns]
+
+
+def pack_plate_stack(files, stack_path, reader, names=None, workers=None):
+  """
+  **pack_plate_stack Function**
+  This function decodes the images of a plate once and writes them into a single contiguous `.npy`
+  array of shape (number of images, height, width) next to a `.json` index of the image names
+  and the size and modification time of each source file. The stack is opened again with
+  `PlateStack`, which memory-maps the array so that images are read as views without decoding.
+  Images are written one at a time, so packing needs memory for a single image only.
+
+  Args:
+    files (list, required): The paths of the image files to pack.
+    stack_path (str or Path, required): The path of the stack without extension. The `.npy` and
+                                        `.json` suffixes are added to it.
+    reader (callable, required): A function decoding an image file into a numpy array, such as
+                                `tifffile.imread`.
+    names (list, optional): The names under which the images are indexed. Defaults to None, which
+                            uses the file names.
+    workers (int, optional): The number of threads decoding images. None or 1 decodes serially
+                            and -1 uses all cores. Defaults to None.
+
+  Returns:
+    PlateStack: The packed stack opened for reading.
+
+  Raises:
+    ValueError: If there are no files, the number of names differs from the number of files or the
+    images differ in shape or dtype.
+  """
+  files = list(files)
+  if not files:
+    raise ValueError("Expected at least one image file to pack")
+  names = [Path(f).name for f in files] if names is None else [str(n) for n in names]
+  if len(names) != len(files):
+    raise ValueError("Expected one name per image file")
+
+  array_path, index_path = _stack_paths(stack_path)
+  array_path.parent.mkdir(parents=True, exist_ok=True)
+  # the sources are recorded before decoding, so that a file changed while it is packed is stale
+  sources = [_source_stat(f) for f in files]
+  first = np.asarray(reader(files[0]))
+
+  fd, tmp_array_path = tempfile.mkstemp(dir=array_path.parent, suffix=".npy.tmp")
+  os.close(fd)
+  try:
+    stack = np.lib.format.open_memmap(tmp_array_path, mode='w+', dtype=first.dtype,
+                                      shape=(len(files),) + first.shape)
+    stack[0] = first
+
+    def write(i):
+      img = np.asarray(reader(files[i]))
+      if img.shape != first.shape or img.dtype != first.dtype:
+        raise ValueError(f"Expected all images to have shape {first.shape} and dtype "
+                         f"{first.dtype}, got {img.shape} and {img.dtype} for {files[i]}")
+      stack[i] = img
+
+    parallel_map(write, range(1, len(files)), workers=workers, progress=False)
+    stack.flush()
+    # release the memmap, which the write closure refers to, before the file is renamed
+    stack = None
+
+    index = {
+      'version': PLATE_STACK_VERSION,
+      'names': names,
+      'sources': sources,
+      'shape': list(first.shape),
+      'dtype': first.dtype.str
+    }
+    # the index is replaced last, so that a stack is never indexed before its array is complete
+    os.replace(tmp_array_path, array_path)
+    with tempfile.NamedTemporaryFile('w', dir=index_path.parent, suffix=".json.tmp",
+                                     delete=False) as f:
+      json.dump(index, f)
+    os.replace(f.name, index_path)
+  finally:
+    if os.path.exists(tmp_array_path):
+      os.remove(tmp_array_path)
+
+  return PlateStack(stack_path)
+
+
+class PlateStack:
+  """
+  **PlateStack Class**
+  This class opens a plate stack written by `pack_plate_stack`. The array is memory-mapped
+  read-only, so each image is a zero-copy view into the page cache. Images that are modified in
+  place, e.g. by `remove_artifacts`, have to be copied first.
+
+  Attributes:
+    stack_path (str or Path, required): The path of the stack, with or without the `.npy` or
+                                        `.json` suffix.
+
+  Raises:
+    FileNotFoundError: If the array or the index of the stack does not exist.
+    ValueError: If the index does not match the array.
+  """
+  def __init__(self, stack_path):
+    self.array_path, self.index_path = _stack_paths(stack_path)
+    with open(self.index_path) as f:
+      index = json.load(f)
+    self.images = np.load(self.array_path, mmap_mode='r')
+    self.names = index['names']
+    self.sources = index['sources']
+    if len(self.names) != len(self.images) or list(self.images.shape[1:]) != index['shape']:
+      raise ValueError(f"Index {self.index_path} does not match {self.array_path}")
+    self._positions = {name: i for (i, name) in enumerate(self.names)}
+
+  def __len__(self):
+    return len(self.names)
+
+  def __contains__(self, name):
+    return name in self._positions
+
+  def __getitem__(self, key):
+    """
+    **__getitem__ Method**
+    Returns the image at an integer position or with the given name as a view into the stack.
+    """
+    if isinstance(key, str):
+      key = self._positions[key]
+    return self.images[key].view(np.ndarray)
+
+  def is_current(self, name, path):
+    """
+    **is_current Method**
+    Checks whether the image with the given name was packed from the current version of a file,
+    by comparing the size and modification time of the file with the ones in the index.
+
+    Args:
+      name (str, required): The name of the image in the stack.
+      path (str or Path, required): The source image file.
+
+    Returns:
+      bool: True if the image is in the stack and the file has not changed since packing.
+    """
+    if name not in self._positions:
+      return False
+    try:
+      return _source_stat(path) == self.sources[self._positions[name]]
+    except FileNotFoundError:
+      return False
@@ -0,0 +1,231 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+import tifffile as TIFF
+
+try:
+  from PIL import Image as pil_image
+except ImportError:
+  pil_image = None
+
+# parameters in pixels, divided by the preview factor
+PREVIEW_LENGTH_PARAMS = ('correction_ball_radius', 'plaque_connectivity', 'plaque_tile_size',
+                         'plaque_gaussian_filter_size', 'plaque_gaussian_filter_sigma',
+                         'peak_region_size', 'sigma')
+# parameters in square pixels, divided by the square of the preview factor
+PREVIEW_AREA_PARAMS = ('min_plaque_area', 'min_cell_area', 'max_cell_area', 'min_area', 'max_area')
+PREVIEW_REDUCE_METHODS = ('mean', 'max', 'nearest')
+
+
+def _check_factor(factor):
+  """
+  **_check_factor Function**
+  Raises a ValueError unless the preview factor is a positive integer.
+  """
+  if not isinstance(factor, (int, np.integer)) or factor < 1:
+    raise ValueError(f"The preview factor must be a positive integer, got {factor}")
+
+
+def _scale(value, scale):
+  """
+  **_scale Function**
+  Scales a parameter value, keeping integers integer and at least 1.
+  """
+  if value is None or isinstance(value, bool):
+    return value
+  if isinstance(value, (int, np.integer)):
+    return max(1, int(round(value * scale)))
+  return value * scale
+
+
+def scale_params(params, factor):
+  """
+  **scale_params Function**
+  This function returns a copy of the parameters of an experiment for images reduced by `factor`,
+  e.g. by `read_preview`. Lengths in pixels, such as radii, sigmas and filter and peak region
+  sizes (`PREVIEW_LENGTH_PARAMS`), are divided by the factor and areas (`PREVIEW_AREA_PARAMS`) by
+  its square. Integer parameters stay integers of at least 1, and intensity thresholds are kept.
+  Nested dictionaries, e.g. the 'nuclei' and 'virus' parameters, are scaled as well.
+
+  Args:
+    params (dict, required): The parameters, e.g. `FluorescenceMicroscopy.params`.
+    factor (int, required): The factor by which the images are reduced.
+
+  Returns:
+    dict: The scaled parameters.
+
+  Raises:
+    ValueError: If `factor` is not a positive integer.
+  """
+  _check_factor(factor)
+  scaled = {}
+  for (key, value) in params.items():
+    if isinstance(value, dict):
+      scaled[key] = scale_params(value, factor)
+    elif key in PREVIEW_LENGTH_PARAMS:
+      scaled[key] = _scale(value, 1 / factor)
+    elif key in PREVIEW_AREA_PARAMS:
+      scaled[key] = _scale(value, 1 / factor**2)
+    else:
+      scaled[key] = value
+  return scaled
+
+
+def reduce_image(image, factor, method='mean'):
+  """
+  **reduce_image Function**
+  This function reduces an image by an integer factor. Every block of `factor` squared pixels
+  becomes one pixel, with the mean of the block, its maximum, e.g. to keep sparse bright cells of
+  fluorescence images above an intensity threshold, or its first pixel, e.g. for masks. The
+  result keeps the data type of the image and has the shape of the image divided by the factor,
+  rounded up.
+
+  Args:
+    image (np.ndarray, required): A 2D image, or a 3D image with channels last.
+    factor (int, required): The factor by which the image is reduced.
+    method (str, optional): One of `PREVIEW_REDUCE_METHODS`: 'mean', 'max' or 'nearest'.
+                          Defaults to 'mean'.
+
+  Returns:
+    np.ndarray: The reduced image.
+
+  Raises:
+    ValueError: If `factor` is not a positive integer or `method` is unknown.
+  """
+  _check_factor(factor)
+  if method not in PREVIEW_REDUCE_METHODS:
+    raise ValueError(f"Unknown reduce method {method}, expected one of {PREVIEW_REDUCE_METHODS}")
+  image = np.asarray(image)
+  if factor == 1:
+    return image
+  if method == 'nearest':
+    return image[::factor, ::factor]
+  height, width = image.shape[:2]
+  # repeat the last rows and columns so that every block has factor squared pixels
+  pad = [(0, -height % factor), (0, -width % factor)] + [(0, 0)]*(image.ndim - 2)
+  if any(p[1] for p in pad):
+    image = np.pad(image, pad, mode='edge')
+  shape = (image.shape[0]//factor, image.shape[1]//factor)
+  if method == 'max':
+    return image.reshape((shape[0], factor, shape[1], factor) + image.shape[2:]).max(axis=(1, 3))
+  if image.dtype in (np.uint8, np.uint16, np.int16, np.float32, np.float64):
+    return cv2.resize(image, shape[::-1], interpolation=cv2.INTER_AREA)
+  small = cv2.resize(image.astype(np.float32), shape[::-1], interpolation=cv2.INTER_AREA)
+  if image.dtype == bool:
+    return small >= 0.5
+  if np.issubdtype(image.dtype, np.integer):
+    return np.rint(small).astype(image.dtype)
+  return small.astype(image.dtype)
+
+
+def read_preview(path, factor, color_mode=None, method='mean'):
+  """
+  **read_preview Function**
+  This function decodes an image at a resolution reduced by `factor`. For TIFF files the finest
+  pyramid level that is not smaller than the preview is decoded, so that files written with
+  reduced resolution levels, e.g. by the microscope, skip most of the full resolution data. Other
+  formats are opened with PIL, which decodes JPEG files directly at a reduced size with `draft`,
+  and are reduced with `Image.reduce`. The remaining factor is applied with `reduce_image`.
+
+  Args:
+    path (str or Path, required): The image file.
+    factor (int, required): The factor by which the image is reduced.
+    color_mode (str, optional): One of 'grayscale', 'rgb' or 'rgba' for images read with PIL, as
+                              in `CrystalViolet.read_from_path`. Defaults to None, which keeps the
+                              mode of the file.
+    method (str, optional): The reduce method of `reduce_image`. Pyramid levels of TIFF files and
+                          JPEG drafts are only used with 'mean'. Defaults to 'mean'.
+
+  Returns:
+    np.ndarray: The reduced image.
+
+  Raises:
+    ValueError: If `factor` is not a positive integer, or `color_mode` or `method` is not
+    supported.
+    ImportError: If a non TIFF image is read and PIL is not available.
+  """
+  _check_factor(factor)
+  if method not in PREVIEW_REDUCE_METHODS:
+    raise ValueError(f"Unknown reduce method {method}, expected one of {PREVIEW_REDUCE_METHODS}")
+  if Path(path).suffix.lower() in ('.tif', '.tiff'):
+    with TIFF.TiffFile(path) as tif:
+      levels = tif.series[0].levels if method == 'mean' else tif.series[0].levels[:1]
+      level, step = levels[0], 1
+      for candidate in levels[1:]:
+        # only levels reduced by a divisor of the factor
+        candidate_step = round(levels[0].shape[0] / candidate.shape[0])
+        if factor % candidate_step == 0 and candidate_step > step:
+          level, step = candidate, candidate_step
+      image = level.asarray()
+    return reduce_image(image, factor // step, method)
+
+  if pil_image is None:
+    raise ImportError("Could not import PIL.Image. Reading previews of non TIFF images requires "
+                      "PIL.")
+  modes = {'grayscale': 'L', 'rgb': 'RGB', 'rgba': 'RGBA', None: None}
+  if color_mode not in modes:
+    raise ValueError('color_mode must be "grayscale", "rgb", or "rgba"')
+  with pil_image.open(path) as img:
+    width = img.size[0]
+    if method == 'mean' and img.format == 'JPEG':
+      img.draft(img.mode, (-(-img.size[0] // factor), -(-img.size[1] // factor)))
+    remaining = max(1, factor * img.size[0] // width)
+    if color_mode == 'grayscale' and img.mode in ('L', 'I;16', 'I'):
+      mode = None
+    else:
+      mode = modes[color_mode]
+    if mode is not None and img.mode != mode:
+      img = img.convert(mode)
+    if method != 'mean' or img.mode not in ('L', 'RGB', 'RGBA', 'I', 'F'):
+      return reduce_image(np.asarray(img), remaining, method)
+    return np.asarray(img.reduce(remaining) if remaining > 1 else img)
+
+
+def count_agreement(reference, preview):
+  """
+  **count_agreement Function**
+  This function measures how well per-well counts of a preview agree with the counts at full
+  resolution, e.g. plaque counts, to decide whether a preview is good enough for triage. It
+  compares any two count series, e.g. also counts with the ground truth of a synthetic plate.
+
+  Args:
+    reference (array-like, required): The counts at full resolution, one per well.
+    preview (array-like, required): The counts of the preview, in the same well order.
+
+  Returns:
+    dict: A dictionary containing:
+        - 'n_wells' (int): The number of wells.
+        - 'exact' (float): The fraction of wells with equal counts.
+        - 'mean_absolute_error' (float): The mean absolute difference of the counts.
+        - 'relative_error' (float): The summed absolute difference relative to the summed
+          reference counts, 0 if all counts are 0 and None if only the reference counts are.
+        - 'correlation' (float): The Pearson correlation of the counts, None if either is
+          constant.
+      Undefined values are None rather than NaN or infinity, so that the result can be written
+      as standard JSON.
+
+  Raises:
+    ValueError: If the number of counts differs.
+  """
+  reference = np.asarray(reference, dtype=np.float64).ravel()
+  preview = np.asarray(preview, dtype=np.float64).ravel()
+  if len(reference) != len(preview):
+    raise ValueError(f"Expected the same number of counts, got {len(reference)} and "
+                     f"{len(preview)}")
+  difference = np.abs(reference - preview)
+  correlation = None
+  if len(reference) > 1 and reference.std() > 0 and preview.std() > 0:
+    correlation = float(np.corrcoef(reference, preview)[0, 1])
+  relative_error = None
+  if reference.sum():
+    relative_error = float(difference.sum() / reference.sum())
+  elif not difference.sum():
+    relative_error = 0.0
+  return {
+    'n_wells': len(reference),
+    'exact': float(np.mean(difference == 0)) if len(reference) else None,
+    'mean_absolute_error': float(difference.mean()) if len(reference) else None,
+    'relative_error': relative_error,
+    'correlation': correlation
+  }
@@ -0,0 +1,167 @@
+import functools
+import math
+from pathlib import Path
+
+import cv2
+import numpy as np
+from skimage import measure
+
+from PyPlaque.utils import ImagePyramid, parallel_map, stage_timer
+
+
+def qc_panel(image, title='', mask=None, peaks=None, boxes=None, downsample=4, vmin=None,
+             vmax=None):
+  """
+  **qc_panel Function**
+  This function prepares one panel of a QC report, e.g. the virus channel image of a well with the
+  contours of its plaque mask and its peaks. The image and the mask are downsampled here, so that
+  only small arrays are kept in memory and sent to the processes rendering the report. The image
+  may be an `ImagePyramid`, e.g. of a plate mosaic, whose coarsest level with at least the reduced
+  resolution is read instead of the full resolution image.
+
+  Args:
+    image (np.ndarray or ImagePyramid, required): The 2D grayscale image shown in the background.
+    title (str, optional): The title of the panel, e.g. the well name. Defaults to ''.
+    mask (np.ndarray, optional): A 2D mask whose contours are drawn in yellow. Defaults to None.
+    peaks (np.ndarray, optional): An array of (row, column) coordinates drawn as red dots.
+                                Defaults to None.
+    boxes (list, optional): Bounding boxes (min_row, min_col, max_row, max_col), e.g. the `bbox`
+                          of plaque objects, drawn as red rectangles. Defaults to None.
+    downsample (int, optional): The factor by which the image and mask are reduced. Defaults to 4.
+    vmin (float, optional): The intensity shown black. Defaults to None, which uses the 1st
+                          percentile of the image.
+    vmax (float, optional): The intensity shown white. Defaults to None, which uses the 99.5th
+                          percentile of the image.
+
+  Returns:
+    dict: The panel, to be passed to `render_qc_report`.
+
+  Raises:
+    ValueError: If `image` is not 2D or `downsample` is smaller than 1.
+  """
+  full_shape = image.shape if isinstance(image, ImagePyramid) else np.shape(image)
+  if len(full_shape) != 2:
+    raise ValueError(f"Expected a 2D image, got shape {full_shape}")
+  if downsample < 1:
+    raise ValueError("downsample must be a positive integer")
+  shape = (max(1, full_shape[1] // downsample), max(1, full_shape[0] // downsample))
+  step = downsample
+  if isinstance(image, ImagePyramid):
+    level = image.select_level((shape[1], shape[0]))
+    image = image.read(level)
+    step = max(1, downsample // 2**level)
+  image = np.asarray(image)
+  if vmin is None or vmax is None:
+    low, high = np.percentile(image[::step, ::step], (1, 99.5))
+    vmin = low if vmin is None else vmin
+    vmax = high if vmax is None else vmax
+
+  small = cv2.resize(image.astype(np.float32), shape, interpolation=cv2.INTER_AREA)
+  return {
+    'title': str(title),
+    'image': small,
+    'mask': None if mask is None else np.asarray(mask)[::downsample, ::downsample] > 0,
+    'peaks': None if peaks is None else np.asarray(peaks, dtype=float).reshape(-1, 2) / downsample,
+    'boxes': None if boxes is None else np.asarray(boxes, dtype=float).reshape(-1, 4) / downsample,
+    'vmin': float(vmin),
+    'vmax': float(vmax)
+  }
+
+
+def _render_panel(panel, panel_size=256, dpi=100):
+  """
+  **_render_panel Function**
+  Renders a panel of `qc_panel` into an RGB array of `panel_size` pixels squared. It draws on an
+  Agg canvas directly instead of through pyplot, so it needs no display and never shows a window.
+  Defined at module level so that it can be sent to pool processes.
+  """
+  from matplotlib.backends.backend_agg import FigureCanvasAgg
+  from matplotlib.figure import Figure
+  from matplotlib.patches import Rectangle
+
+  fig = Figure(figsize=(panel_size / dpi, panel_size / dpi), dpi=dpi)
+  canvas = FigureCanvasAgg(fig)
+  ax = fig.add_axes((0, 0, 1, 0.9 if panel['title'] else 1))
+  ax.imshow(panel['image'], cmap='gray', vmin=panel['vmin'], vmax=panel['vmax'],
+            interpolation='nearest')
+  if panel['mask'] is not None and panel['mask'].any():
+    for contour in measure.find_contours(panel['mask'].astype(np.uint8), 0.5):
+      ax.plot(contour[:, 1], contour[:, 0], linewidth=1, color='yellow')
+  if panel['peaks'] is not None and len(panel['peaks']):
+    ax.plot(panel['peaks'][:, 1], panel['peaks'][:, 0], 'r.', markersize=4)
+  if panel['boxes'] is not None:
+    for (minr, minc, maxr, maxc) in panel['boxes']:
+      ax.add_patch(Rectangle((minc, minr), maxc - minc, maxr - minr, fill=False,
+                             edgecolor='red', linewidth=1))
+  ax.set_xlim(-0.5, panel['image'].shape[1] - 0.5)
+  ax.set_ylim(panel['image'].shape[0] - 0.5, -0.5)
+  ax.set_axis_off()
+  if panel['title']:
+    fig.text(0.5, 0.95, panel['title'], ha='center', va='center', fontsize=8)
+  canvas.draw()
+  return np.asarray(canvas.buffer_rgba())[..., :3].copy()
+
+
+def _montage(rendered, ncols):
+  """
+  **_montage Function**
+  Tiles rendered panels of equal size into a grid with `ncols` columns, padding with white.
+  """
+  height, width = rendered[0].shape[:2]
+  nrows = math.ceil(len(rendered) / ncols)
+  montage = np.full((nrows * height, min(ncols, len(rendered)) * width, 3), 255, dtype=np.uint8)
+  for (i, panel) in enumerate(rendered):
+    r, c = divmod(i, ncols)
+    montage[r*height:(r+1)*height, c*width:(c+1)*width] = panel
+  return montage
+
+
+@stage_timer('qc_report')
+def render_qc_report(panels, output, ncols=8, per_page=None, panel_size=256, dpi=100,
+                     workers=None):
+  """
+  **render_qc_report Function**
+  This function renders the panels of a plate, prepared with `qc_panel`, in a pool of processes
+  and writes them to a single file: a multi-page PDF if `output` ends with '.pdf', and a tiled
+  image montage (e.g. PNG) otherwise. Panels are rendered headless at a small size and never
+  shown, so QC images of a whole plate can be made on a machine without a display.
+
+  Args:
+    panels (iterable, required): The panels returned by `qc_panel`, e.g. one per well.
+    output (str or Path, required): The PDF or image file to write.
+    ncols (int, optional): The number of panels per row. Defaults to 8.
+    per_page (int, optional): The number of panels per PDF page. Defaults to None, which uses
+                            `ncols` rows of `ncols` panels. Ignored for image montages.
+    panel_size (int, optional): The side length of each panel in pixels. Defaults to 256.
+    dpi (int, optional): The resolution of the rendered panels and the PDF pages. Defaults to 100.
+    workers (int, optional): The number of processes rendering panels. None or 1 renders serially
+                            and -1 uses all cores. Defaults to None.
+
+  Returns:
+    Path: The written file.
+
+  Raises:
+    ValueError: If there are no panels or the montage could not be written.
+  """
+  panels = list(panels)
+  if not panels:
+    raise ValueError("Expected at least one panel to render")
+  output = Path(output)
+  output.parent.mkdir(parents=True, exist_ok=True)
+  rendered = parallel_map(functools.partial(_render_panel, panel_size=panel_size, dpi=dpi),
+                          panels, workers=workers, use_processes=True)
+
+  if output.suffix.lower() == '.pdf':
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    per_page = per_page or ncols * ncols
+    with PdfPages(output) as pdf:
+      for start in range(0, len(rendered), per_page):
+        page = _montage(rendered[start:start + per_page], ncols)
+        fig = Figure(figsize=(page.shape[1] / dpi, page.shape[0] / dpi), dpi=dpi)
+        fig.figimage(page, resize=False)
+        pdf.savefig(fig, dpi=dpi)
+  elif not cv2.imwrite(str(output), _montage(rendered, ncols)[..., ::-1]):
+    raise ValueError(f"Could not write the montage to {output}")
+  return output
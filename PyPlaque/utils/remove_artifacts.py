@@ -1,6 +1,9 @@
 import numpy as np
 
+from PyPlaque.utils import stage_timer
 
+
+@stage_timer('remove_artifacts')
 def remove_artifacts(img: np.ndarray,artifact_threshold: float) -> np.ndarray:
   """
   **remove_artifacts Function**
@@ -1,13 +1,80 @@
 
 import cv2
 import numpy as np
-from skimage import io, restoration
-from skimage.morphology import disk, opening
 
+from PyPlaque.utils import stage_timer
 
+REMOVE_BACKGROUND_METHODS = ('opencv', 'decomposed', 'downsampled')
 
-def remove_background(img: np.ndarray, radius: float) -> tuple[np.ndarray,
-np.ndarray]:
+
+def _line_step(line_image, op, fill):
+  """
+  **_line_step Function**
+  Grows a horizontal erosion or dilation by one pixel on each side. A result over [x-w, x+w] is
+  turned into one over [x-w-1, x+w+1] by combining its left and right neighbours, for w >= 1.
+  Pixels outside the image take the identity value `fill`.
+  """
+  if line_image.shape[1] == 1:
+    return line_image
+  grown = np.empty_like(line_image)
+  grown[:, 1:] = line_image[:, :-1]
+  grown[:, 0] = fill
+  op(grown[:, :-1], line_image[:, 1:], out=grown[:, :-1])
+  return grown
+
+
+def _decomposed_morphology(img, selem, op, fill):
+  """
+  **_decomposed_morphology Function**
+  Erodes (op=np.minimum) or dilates (op=np.maximum) an image with a symmetric structuring element
+  whose rows are centred line segments, such as an OpenCV ellipse. Horizontal results of growing
+  width are built incrementally and each one is combined, shifted vertically, into the output for
+  the rows of the element that have that width. Pixels outside the image are ignored, like the
+  default border of OpenCV.
+  """
+  radius = selem.shape[0] // 2
+  half_widths = (np.count_nonzero(selem, axis=1) - 1) // 2
+  height = img.shape[0]
+  out = np.full_like(img, fill)
+  line_image = img
+  for half_width in range(half_widths.max() + 1):
+    if half_width == 1:
+      line_image = op(img, _line_step(img, op, fill))
+    elif half_width > 1:
+      line_image = _line_step(line_image, op, fill)
+    for row in np.nonzero(half_widths == half_width)[0]:
+      dy = row - radius
+      if dy >= 0 and dy < height:
+        op(out[:height - dy], line_image[dy:], out=out[:height - dy])
+      elif dy < 0 and -dy < height:
+        op(out[-dy:], line_image[:height + dy], out=out[-dy:])
+  return out
+
+
+def _downsampled_opening(img, radius, factor):
+  """
+  **_downsampled_opening Function**
+  Opens a copy of the image shrunk by block minima with a proportionally smaller ellipse, upsamples
+  the result bilinearly and clips it to the image, so that the background never exceeds the
+  image as with an exact opening.
+  """
+  height, width = img.shape
+  small_height, small_width = -(-height // factor), -(-width // factor)
+  padded = np.pad(img, ((0, small_height*factor - height), (0, small_width*factor - width)),
+                  mode='edge')
+  small = padded.reshape(small_height, factor, small_width, factor).min(axis=(1, 3))
+
+  small_radius = max(1, int(round(radius / factor)))
+  selem = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2*small_radius + 1, 2*small_radius + 1))
+  small_background = cv2.morphologyEx(small, cv2.MORPH_OPEN, selem)
+
+  background = cv2.resize(small_background, (width, height), interpolation=cv2.INTER_LINEAR)
+  return np.minimum(background, img)
+
+
+@stage_timer('remove_background')
+def remove_background(img: np.ndarray, radius: float, method: str = 'opencv',
+                      downsample_factor: int = None) -> tuple[np.ndarray, np.ndarray]:
   """
   **remove_background Function**
   This function removes the background from an image by performing a morphological opening 
@@ -15,6 +82,13 @@ np.ndarray]:
   with a disk-shaped structuring element of specified radius to suppress the background noise. 
   The resulting background is subtracted from the original image to obtain a foreground mask that 
   represents the main objects in the image.
+
+  For large radii the opening can be computed in one of three ways:
+    - 'opencv': `cv2.morphologyEx` with the full elliptical element.
+    - 'decomposed': the same opening computed from 1D line erosions and dilations, one per row of
+      the element. The output is identical to 'opencv' and the cost grows linearly with the radius.
+    - 'downsampled': an approximation that opens a block-minimum downsampled image with a scaled
+      element and upsamples the background, clipped so that it never exceeds `img`.
   
   Args:
     img (np.ndarray, required): A 2D numpy array representing the grayscale or colored image from 
@@ -22,6 +96,10 @@ np.ndarray]:
     radius (float, required): The radius of the disk-shaped structuring element used for 
                             morphological opening, controlling the size of the neighborhood over 
                             which the operation is applied.
+    method (str, optional): One of 'opencv', 'decomposed' or 'downsampled'. Defaults to 'opencv'.
+    downsample_factor (int, optional): The downsampling factor of the 'downsampled' method. 
+                                    Defaults to None, which keeps the scaled radius at 15 pixels or 
+                                    more.
   
   Returns:
     tuple[np.ndarray, np.ndarray]: A tuple containing two elements:
@@ -33,15 +111,26 @@ np.ndarray]:
       
   Raises:
     TypeError: If `img` is not a 2D numpy array or `radius` is not a float.
-    ValueError: If `radius` is less than or equal to zero.
+    ValueError: If `radius` is less than or equal to zero or `method` is not supported.
   """
+  if method not in REMOVE_BACKGROUND_METHODS:
+    raise ValueError(f"method must be one of {REMOVE_BACKGROUND_METHODS}, got {method!r}")
+
   img = np.array(img).astype(np.uint16)
 
-  selem = disk(radius)
+  if method == 'downsampled':
+    if downsample_factor is None:
+      downsample_factor = max(1, int(radius // 15))
+    background = _downsampled_opening(img, radius, downsample_factor)
+    return background, img-background
 
   selem = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2*radius + 1, 2*radius + 1))
 
   # Perform morphological opening
-  background =  cv2.morphologyEx(img, cv2.MORPH_OPEN, selem)
+  if method == 'decomposed':
+    background = _decomposed_morphology(_decomposed_morphology(img, selem, np.minimum, 65535),
+                                        selem, np.maximum, 0)
+  else:
+    background =  cv2.morphologyEx(img, cv2.MORPH_OPEN, selem)
 
   return background, img-background
\ No newline at end of file
@@ -1,13 +1,113 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import skimage
 from scipy import ndimage as ndi
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 from skimage import measure
 
-from PyPlaque.utils import remove_background, picks_area
+from PyPlaque.utils import gaussian_blur, parallel_map, remove_background, picks_area_labels
+from PyPlaque.utils import increment_counter, instrumentation_enabled, stage_timer
 
 
-def get_all_plaque_regions(image,threshold,plq_connect):
+def _tile_slices(shape, tile_size):
+    """
+    **_tile_slices Function**
+    Splits an image shape into a raster ordered list of (row slice, column slice) tiles.
+    """
+    return [(slice(r, min(r + tile_size, shape[0])), slice(c, min(c + tile_size, shape[1])))
+            for r in range(0, shape[0], tile_size) for c in range(0, shape[1], tile_size)]
+
+
+def _label_tile(image, threshold, plq_connect, tile, halo, out):
+    """
+    **_label_tile Function**
+    Labels the connected regions of one tile of the thresholded and dilated image. The distance 
+    transform is computed on the tile extended by a halo, so that it is exact for every distance up 
+    to `plq_connect`. The local labels are written into `out` and the number of labels and the 
+    position of the first pixel of each label are returned.
+    """
+    rows, cols = tile
+    r0, c0 = max(rows.start - halo, 0), max(cols.start - halo, 0)
+    padded_bw = image[r0:rows.stop + halo, c0:cols.stop + halo] > threshold
+    core = (slice(rows.start - r0, rows.stop - r0), slice(cols.start - c0, cols.stop - c0))
+    if not padded_bw.any():
+        # no foreground within reach of the tile
+        return 0, np.zeros(0, dtype=np.intp)
+    bw2 = ndi.distance_transform_edt(~padded_bw)[core] <= plq_connect
+    labels, count = measure.label(bw2, return_num=True)
+    out[tile] = labels
+    # labels are numbered in raster order, so the running maximum grows at the first pixel of each
+    first = np.flatnonzero(np.diff(np.maximum.accumulate(labels.ravel()), prepend=0))
+    first_rows, first_cols = np.unravel_index(first, labels.shape)
+    return count, (first_rows + rows.start) * image.shape[1] + first_cols + cols.start
+
+
+def _seam_pairs(a, b):
+    """
+    **_seam_pairs Function**
+    Returns the pairs of labels that touch across a seam between two adjacent lines of pixels, 
+    including diagonal neighbours.
+    """
+    pairs = [np.stack([a, b])]
+    pairs.append(np.stack([a[1:], b[:-1]]))
+    pairs.append(np.stack([a[:-1], b[1:]]))
+    pairs = np.concatenate(pairs, axis=1)
+    return pairs[:, (pairs[0] > 0) & (pairs[1] > 0)]
+
+
+def _get_all_plaque_regions_tiled(image, threshold, plq_connect, tile_size, workers):
+    """
+    **_get_all_plaque_regions_tiled Function**
+    Tiled version of `get_all_plaque_regions`. Tiles are labelled independently, labels touching 
+    across tile seams are merged as connected components of a graph and the merged regions are 
+    renumbered by their first pixel in raster order, which is how `measure.label` numbers them.
+    """
+    halo = int(np.ceil(plq_connect)) + 1
+    tiles = _tile_slices(image.shape, tile_size)
+    # same label dtype as measure.label on the whole image
+    label_image = np.zeros(image.shape, dtype=measure.label(np.zeros((1, 1), bool)).dtype)
+    results = parallel_map(lambda tile: _label_tile(image, threshold, plq_connect, tile, halo, 
+                                                    label_image), tiles, workers=workers, 
+                           progress=False)
+
+    counts = np.array([count for count, _ in results], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    for tile, offset in zip(tiles, offsets[:-1]):
+        tile_labels = label_image[tile]
+        tile_labels[tile_labels > 0] += offset
+
+    seams = [(label_image[r - 1], label_image[r]) for r in range(tile_size, image.shape[0], 
+                                                                tile_size)]
+    seams += [(label_image[:, c - 1], label_image[:, c]) for c in range(tile_size, 
+                                                                image.shape[1], tile_size)]
+    pairs = np.concatenate([_seam_pairs(a, b) for a, b in seams] + [np.zeros((2, 0), int)], 
+                           axis=1)
+    n_labels = int(offsets[-1])
+    if n_labels == 0:
+        return label_image
+    graph = coo_matrix((np.ones(pairs.shape[1]), (pairs[0] - 1, pairs[1] - 1)), 
+                       shape=(n_labels, n_labels))
+    n_regions, regions = connected_components(graph, directed=False)
+
+    # number the merged regions in the raster order of their first pixel
+    first = np.concatenate([first for _, first in results])
+    region_first = np.full(n_regions, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(region_first, regions, first)
+    rank = np.empty(n_regions, dtype=np.int64)
+    rank[np.argsort(region_first)] = np.arange(1, n_regions + 1)
+    lut = np.concatenate([[0], rank[regions]]).astype(label_image.dtype)
+
+    def relabel(tile):
+        label_image[tile] = lut[label_image[tile]]
+        # Remove elements from the label matrix which were not present in the original binary image
+        label_image[tile][~(image[tile] > threshold)] = 0
+
+    parallel_map(relabel, tiles, workers=workers, progress=False)
+    return label_image
+
+
+@stage_timer('plaque_regions')
+def get_all_plaque_regions(image,threshold,plq_connect,tile_size=None,workers=None):
     """
     **get_all_plaque_regions Function**
     This function identifies and labels all connected regions in a binary image that are likely to 
@@ -25,6 +125,15 @@ def get_all_plaque_regions(image,threshold,plq_connect):
         plq_connect (int, required): An integer specifying the maximum distance within which 
                                     connected components are grouped to be considered as potential 
                                     virus plaques.
+        tile_size (int, optional): The side length of the square tiles in which a large image is 
+                                    processed. Each tile is extended by a halo of 
+                                    `ceil(plq_connect) + 1` pixels and labels are merged across tile 
+                                    seams, so the result is identical to the untiled one while the 
+                                    distance transform only needs memory for a single tile. 
+                                    Defaults to None, which processes the whole image at once.
+        workers (int, optional): The number of threads processing tiles when `tile_size` is set. 
+                                    None or 1 processes tiles serially and -1 uses all cores. 
+                                    Defaults to None.
     
     Returns:
         np.ndarray: A 2D numpy array of integers where each unique value represents a different 
@@ -37,6 +146,10 @@ def get_all_plaque_regions(image,threshold,plq_connect):
         ValueError: If `threshold` is outside the valid range for pixel intensities in `image` or 
         if `plq_connect` is less than or equal to zero.
     """
+    if tile_size is not None and max(image.shape) > tile_size:
+        return _get_all_plaque_regions_tiled(np.asarray(image), threshold, plq_connect, tile_size,
+                                             workers)
+
     bw =  image > threshold
     distance = ndi.distance_transform_edt(~bw)
     bw2 = distance <= plq_connect
@@ -48,7 +161,8 @@ def get_all_plaque_regions(image,threshold,plq_connect):
     return label_image
 
 
-def get_plaque_mask(input_image,virus_params):
+@stage_timer('get_plaque_mask')
+def get_plaque_mask(input_image,virus_params,label_image=None):
     """
     **get_plaque_mask Function**
     This function generates a mask of virus plaques in an input image based on specified parameters.
@@ -63,6 +177,10 @@ def get_plaque_mask(input_image,virus_params):
         virus_params (dict, required): A dictionary containing parameters for virus plaque 
                                     detection, including threshold value, connectivity, and other
                                      morphological operations settings.
+        label_image (np.ndarray, optional): A precomputed label image of all plaque regions, as 
+                                    returned by `get_all_plaque_regions` with the same threshold 
+                                    and connectivity, e.g. from a cache. Defaults to None, which 
+                                    computes it.
     
     Returns:
         tuple: A tuple containing two elements:
@@ -76,9 +194,11 @@ def get_plaque_mask(input_image,virus_params):
         ValueError: If any parameter within `virus_params` does not match its expected type or value 
         range as specified in the method signature.
     """
-    label_image =  get_all_plaque_regions(input_image,
-                              virus_params['virus_threshold'],
-                              virus_params['plaque_connectivity'])
+    if label_image is None:
+        label_image =  get_all_plaque_regions(input_image,
+                                  virus_params['virus_threshold'],
+                                  virus_params['plaque_connectivity'],
+                                  tile_size=virus_params.get('plaque_tile_size'))
 
 
     # Calculate various region properties of the image
@@ -86,13 +206,16 @@ def get_plaque_mask(input_image,virus_params):
 
     # Filter out objects with area smaller than min_plaque_area or larger than max_plaque_area
     plaque_region_properties = []
-    for prop in props:
-        if virus_params['use_picks']:
-            temp_area = picks_area(prop.image)
-        else:
-            temp_area = prop.area
+    if virus_params['use_picks']:
+        areas = picks_area_labels(label_image, [prop.label for prop in props])
+    else:
+        areas = [prop.area for prop in props]
+    for prop, temp_area in zip(props, areas):
         if  virus_params['min_plaque_area'] < temp_area:
             plaque_region_properties.append(prop)
+    if instrumentation_enabled():
+        increment_counter('objects_labelled', len(props))
+        increment_counter('plaques_kept', len(plaque_region_properties))
 
     bboxes = []
     bw_plq_regions = []
@@ -119,11 +242,15 @@ def get_plaque_mask(input_image,virus_params):
             for coord in region.coords:
                 final_plq_reg_image[coord[0], coord[1]] = 1
 
-            blurred_image = skimage.filters.gaussian(
+            blurred_image = gaussian_blur(
                                             cur_plq_region,
                                             sigma=virus_params['plaque_gaussian_filter_sigma'],
                                             truncate = virus_params['plaque_gaussian_filter_size']/
-                                                    virus_params['plaque_gaussian_filter_sigma'])
+                                                    virus_params['plaque_gaussian_filter_sigma'],
+                                            method = virus_params.get(
+                                                    'plaque_gaussian_filter_method', 'exact'),
+                                            tolerance = virus_params.get(
+                                                    'plaque_gaussian_filter_tolerance', 2))
 
             coordinates = skimage.feature.peak_local_max(blurred_image,
                                                     min_distance=virus_params['peak_region_size'],
@@ -135,12 +262,13 @@ def get_plaque_mask(input_image,virus_params):
                 global_peak_coords = np.vstack((global_peak_coords, np.array([coordinates[:, 0] + 
                                                                 x1, coordinates[:, 1] + y1]).T))
 
+        increment_counter('peaks_found', len(global_peak_coords))
         return final_plq_reg_image, global_peak_coords
     else:
         return final_plq_reg_image, None
 
 
-def plot_virus_contours(input_image,virus_params,save_path=None):
+def plot_virus_contours(input_image,virus_params,save_path=None,show=True):
     """
     **plot_virus_contours Function**
     This function plots contours of virus plaques on a modified grayscale image. It processes an 
@@ -155,6 +283,8 @@ def plot_virus_contours(input_image,virus_params,save_path=None):
                                         and correction, including 'correction_ball_radius'.    
         save_path (str or None, optional): The file path where the plot will be saved if provided; 
                                         otherwise, it is displayed interactively. Defaults to None.
+        show (bool, optional): Whether to display the plot. If False, the figure is closed after 
+                            saving, e.g. for batch jobs without a display. Defaults to True.
     
     Returns:
         None: The function generates a matplotlib plot based on the arguments provided and 
@@ -164,10 +294,13 @@ def plot_virus_contours(input_image,virus_params,save_path=None):
         TypeError: If any of the input arguments do not match their expected types as specified 
         in the method signature.
     """
+    import matplotlib.pyplot as plt
+
     _, bg_removed_img = remove_background(input_image,
-                                  radius=virus_params['correction_ball_radius'])
+                                  radius=virus_params['correction_ball_radius'],
+                                  method=virus_params.get('correction_method', 'opencv'))
     final_plq_reg_image, global_peak_coords = get_plaque_mask(input_image,virus_params)
-    _, ax = plt.subplots(figsize=(8, 8))
+    fig, ax = plt.subplots(figsize=(8, 8))
 
     # Display input_image with custom colormap and intensity range
     ax.imshow(bg_removed_img, cmap=plt.get_cmap('gray'), vmin=500, vmax=6000, alpha=1, 
@@ -186,5 +319,8 @@ def plot_virus_contours(input_image,virus_params,save_path=None):
     ax.set_title('Peak local max with contours')
     if save_path:
         plt.savefig(save_path,bbox_inches='tight', dpi=300)
-    plt.show()
+    if show:
+        plt.show()
+    else:
+        plt.close(fig)
     return
\ No newline at end of file
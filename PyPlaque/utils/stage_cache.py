@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+
+import numpy as np
+
+
+def _json_default(value):
+  """
+  **_json_default Function**
+  Serialises numpy scalars and any other non-JSON values of a parameter dictionary.
+  """
+  if isinstance(value, np.generic):
+    return value.item()
+  return str(value)
+
+
+class StageCache:
+  """
+  **StageCache Class**
+  This class is an on-disk cache for the intermediate arrays of expensive processing stages, such as
+  background removal, plaque region labelling and plaque masks. Each entry is keyed by its source
+  (an image file or an array), the stage name and the subset of parameters that the stage depends
+  on, and is stored as a compressed `.npz` file under `cache_dir/<stage>/`. When the total size of
+  the cache exceeds `max_bytes`, the least recently used entries are deleted. The total is kept as
+  a running sum of the entries written, so the cache directory is only scanned on the first write
+  and when the sum crosses `max_bytes`. Entries written by other processes are therefore counted
+  from the next scan on.
+
+  Attributes:
+    cache_dir (str or Path, required): The directory holding the cached arrays. It is created if it
+                                      does not exist.
+
+    max_bytes (int, optional): The maximum total size of the cache in bytes. Default is 2 GiB.
+
+    use_content_hash (bool, optional): Whether image files are identified by a hash of their
+                                      content instead of their path, size and modification time.
+                                      Hashing survives copying and touching files but reads every
+                                      file once. Default is False.
+
+  Raises:
+    TypeError: If `cache_dir` is not a str or Path or `max_bytes` is not an int.
+    ValueError: If `max_bytes` is not positive.
+  """
+  def __init__(self, cache_dir, max_bytes=2*1024**3, use_content_hash=False):
+    if not isinstance(cache_dir, (str, Path)):
+      raise TypeError("Expected cache_dir argument to be str or Path")
+    if not isinstance(max_bytes, int):
+      raise TypeError("Expected max_bytes argument to be int")
+    if max_bytes <= 0:
+      raise ValueError("max_bytes must be positive")
+
+    self.cache_dir = Path(cache_dir)
+    self.max_bytes = max_bytes
+    self.use_content_hash = use_content_hash
+    self.cache_dir.mkdir(parents=True, exist_ok=True)
+    self._total_bytes = None
+
+  def source_id(self, source):
+    """
+    **source_id Method**
+    Returns a string identifying the source of a stage. Files are identified by their resolved
+    path, size and modification time, or by a hash of their content, and arrays by a hash of their
+    shape, dtype and data.
+
+    Args:
+      source (str, Path or np.ndarray, required): The image file or array the stage is computed
+                                                  from.
+
+    Returns:
+      str: The identifier of the source.
+
+    Raises:
+      TypeError: If `source` is neither a path nor a numpy array.
+    """
+    if isinstance(source, np.ndarray):
+      digest = hashlib.sha1(str((source.shape, source.dtype.str)).encode())
+      digest.update(np.ascontiguousarray(source).data)
+      return "array:" + digest.hexdigest()
+    if isinstance(source, (str, Path)):
+      path = Path(source).resolve()
+      if self.use_content_hash:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+          for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+        return "content:" + digest.hexdigest()
+      stat = path.stat()
+      return f"file:{path}:{stat.st_size}:{stat.st_mtime_ns}"
+    raise TypeError(f"source should be path-like or np.ndarray, not {type(source)}")
+
+  def key(self, source, stage, params=None):
+    """
+    **key Method**
+    Returns the cache key of a stage computed from a source with the given parameters.
+
+    Args:
+      source (str, Path or np.ndarray, required): The image file or array the stage is computed
+                                                  from.
+      stage (str, required): The name of the stage.
+      params (dict, optional): The parameters the stage depends on. Defaults to None.
+
+    Returns:
+      str: A hexadecimal key.
+    """
+    description = json.dumps([self.source_id(source), stage, params or {}],
+                             sort_keys=True, default=_json_default)
+    return hashlib.sha1(description.encode()).hexdigest()
+
+  def _entry_path(self, stage, key):
+    return self.cache_dir / stage / (key + ".npz")
+
+  def get(self, stage, key):
+    """
+    **get Method**
+    Returns the arrays stored for a key, or None if there is no such entry. Reading an entry marks
+    it as recently used.
+
+    Args:
+      stage (str, required): The name of the stage.
+      key (str, required): The key returned by `key`.
+
+    Returns:
+      dict or None: The stored arrays by name. Values stored as None are returned as None.
+    """
+    path = self._entry_path(stage, key)
+    try:
+      with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files if name != '__none__'}
+        if '__none__' in data.files:
+          arrays.update({str(name): None for name in data['__none__']})
+      os.utime(path)
+    except (FileNotFoundError, OSError, ValueError):
+      return None
+    return arrays
+
+  def put(self, stage, key, arrays):
+    """
+    **put Method**
+    Stores arrays for a key and evicts the least recently used entries if the running total of
+    the cache has grown beyond `max_bytes`. The file is written atomically, so that concurrent
+    processes never read a partial entry.
+
+    Args:
+      stage (str, required): The name of the stage.
+      key (str, required): The key returned by `key`.
+      arrays (dict, required): The arrays to store by name. None values are allowed.
+
+    Returns:
+      None
+    """
+    path = self._entry_path(stage, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    none_names = [name for name, value in arrays.items() if value is None]
+    to_save = {name: np.asarray(value) for name, value in arrays.items() if value is not None}
+    if none_names:
+      to_save['__none__'] = np.array(none_names)
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+      with os.fdopen(fd, "wb") as f:
+        np.savez_compressed(f, **to_save)
+      size = os.path.getsize(tmp_path)
+      replaced = os.path.getsize(path) if os.path.exists(path) else 0
+      os.replace(tmp_path, path)
+    except BaseException:
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+      raise
+    if self._total_bytes is None:
+      self._total_bytes = self.total_bytes()
+    else:
+      self._total_bytes += size - replaced
+    if self._total_bytes > self.max_bytes:
+      self.evict()
+
+  def cached(self, source, stage, params, compute):
+    """
+    **cached Method**
+    Returns the arrays of a stage from the cache, computing and storing them on a miss.
+
+    Args:
+      source (str, Path or np.ndarray, required): The image file or array the stage is computed
+                                                  from.
+      stage (str, required): The name of the stage.
+      params (dict, required): The parameters the stage depends on.
+      compute (callable, required): A function without arguments returning a dict of arrays.
+
+    Returns:
+      dict: The arrays of the stage by name.
+    """
+    key = self.key(source, stage, params)
+    arrays = self.get(stage, key)
+    if arrays is None:
+      arrays = compute()
+      self.put(stage, key, arrays)
+    return arrays
+
+  def entries(self):
+    """
+    **entries Method**
+    Returns the cached files with their size and last use time.
+
+    Args:
+
+    Returns:
+      list: A list of (path, size in bytes, last use time) tuples, least recently used first.
+    """
+    entries = []
+    for path in self.cache_dir.glob("*/*.npz"):
+      try:
+        stat = path.stat()
+      except FileNotFoundError:
+        continue
+      entries.append((path, stat.st_size, stat.st_mtime_ns))
+    return sorted(entries, key=lambda entry: entry[2])
+
+  def total_bytes(self):
+    """
+    **total_bytes Method**
+    Returns the total size of the cached files in bytes.
+    """
+    return sum(size for _, size, _ in self.entries())
+
+  def evict(self):
+    """
+    **evict Method**
+    Deletes the least recently used entries until the cache fits into `max_bytes`, and resets the
+    running total of the cache to the size of the remaining entries.
+
+    Args:
+
+    Returns:
+      int: The number of deleted entries.
+    """
+    entries = self.entries()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for path, size, _ in entries:
+      if total <= self.max_bytes:
+        break
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+      total -= size
+      removed += 1
+    self._total_bytes = total
+    return removed
+
+  def clear(self):
+    """
+    **clear Method**
+    Deletes all cached entries.
+    """
+    for path, _, _ in self.entries():
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+    self._total_bytes = 0
@@ -1,40 +1,115 @@
+from collections.abc import Sequence
+from itertools import chain, islice
+
 import numpy as np
 
 
-def stitch_wells(wells: list, nrows: int, ncols: int) -> np.ndarray :
+def stitch_wells(wells, nrows: int, ncols: int, dtype=None, out=None) -> np.ndarray :
   """
   **stitch_wells Function**
-  This function stitches a list of well images into a larger image array based on specified number 
-  of rows and columns. Ittakes a list of well images (each represented as a 2D numpy array), 
-  combines them into a single large image using the `combine_img_blocks` utility function, which 
-  arranges the images in a grid defined by `nrows` and `ncols`. The combined image is returned as a 
-  numpy array.
+  This function stitches well images into a larger image array based on specified number of rows 
+  and columns. The shape of the mosaic is computed up front and every well is written into its 
+  place in a single preallocated array, or in an on-disk memmap if `out` is a path, so the wells 
+  are copied once. `wells` may be a generator, e.g. of wells read one by one from disk, in which 
+  case only one well is held in memory at a time and all wells must have the shape of the first. 
+  A list of wells may have rows of different heights, as long as the wells of a row have the same 
+  height and all rows the same width.
   
   Args:
-    wells (list, required): A list of 2D numpy arrays, each representing an individual well image.
+    wells (list or iterable, required): The 2D numpy arrays of the well images, row by row. Each 
+                                      well is squeezed before it is placed.
     nrows (int, required): The number of rows in the final stitched image grid.
     ncols (int, required): The number of columns in the final stitched image grid.
+    dtype (np.dtype, optional): The data type of the stitched image. Defaults to None, which keeps 
+                              the data type of the first well.
+    out (str, Path or np.ndarray, optional): The `.npy` file of a memmap to write the stitched 
+                                            image into, or an array of the stitched shape. 
+                                            Defaults to None, which allocates a new array.
 
   Returns:
-    np.ndarray: A 2D numpy array representing the combined and stitched image of all wells, with 
-    each element being of type float32 if precision is crucial for further processing.
+    np.ndarray: A numpy array, or memmap, of the combined and stitched image of all wells.
       
   Raises:
     ValueError: If `wells` does not contain enough images to fill the specified number of rows and 
-    columns in the grid.
+    columns in the grid, if the well shapes do not tile the grid, or if `out` has another shape.
+  """
+  n_wells = nrows*ncols
+  if n_wells < 1:
+    raise ValueError('nrows and ncols must be positive')
+  if isinstance(wells, (Sequence, np.ndarray)):
+    if len(wells) < n_wells:
+      raise ValueError(f'Expected {n_wells} wells, got {len(wells)}')
+    wells = [np.squeeze(well) for well in wells[:n_wells]]
+    shapes = [well.shape for well in wells]
+  else:
+    wells = iter(wells)
+    first = next(wells, None)
+    if first is None:
+      raise ValueError(f'Expected {n_wells} wells, got 0')
+    first = np.squeeze(first)
+    shapes = [first.shape]*n_wells
+    wells = chain([first], (np.squeeze(well) for well in islice(wells, n_wells - 1)))
+  shape, offsets = _mosaic_layout(shapes, nrows, ncols)
+
+  stitched = None
+  placed = 0
+  for (well, (top, left)) in zip(wells, offsets):
+    if well.shape != shapes[placed]:
+      raise ValueError(f'Well {placed} has the shape {well.shape}, expected {shapes[placed]}')
+    if stitched is None:
+      stitched = _allocate(out, shape, well.dtype if dtype is None else dtype)
+    stitched[top:top + well.shape[0], left:left + well.shape[1]] = well
+    placed += 1
+  if placed < n_wells:
+    raise ValueError(f'Expected {n_wells} wells, got {placed}')
+  if isinstance(stitched, np.memmap):
+    stitched.flush()
+  return stitched
+
+def _mosaic_layout(shapes, nrows, ncols):
+  """
+  **_mosaic_layout Function**
+  Returns the shape of the mosaic and the (top, left) offset of every well from the well shapes.
+  """
+  offsets = []
+  top = 0
+  width = None
+  for r in range(nrows):
+    row = shapes[r*ncols:(r + 1)*ncols]
+    if any(len(s) < 2 or s[0] != row[0][0] or s[2:] != shapes[0][2:] for s in row):
+      raise ValueError(f'The wells of row {r} do not have the same height and channels')
+    left = 0
+    for s in row:
+      offsets.append((top, left))
+      left += s[1]
+    if width is not None and left != width:
+      raise ValueError(f'Row {r} is {left} pixels wide, expected {width}')
+    width = left
+    top += row[0][0]
+  return (top, width) + tuple(shapes[0][2:]), offsets
+
+def _allocate(out, shape, dtype):
+  """
+  **_allocate Function**
+  Returns the array the mosaic is written into: a new array, a new memmap or `out` itself.
   """
-  combined_img = combine_img_blocks(wells, nrows, ncols)
-  return combined_img
+  if out is None:
+    return np.empty(shape, dtype=dtype)
+  if isinstance(out, np.ndarray):
+    if out.shape != shape:
+      raise ValueError(f'out has the shape {out.shape}, expected {shape}')
+    return out
+  return np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
 
 def combine_img_blocks(img_array: list, nrows: int, ncols: int) -> np.ndarray:
   """
   **combine_img_blocks Function**
   This function combines a list of image blocks into a single array with specified number of 
   rows and columns. It takes a list of images (represented as arrays), where each block is expected 
-  to be squeezed before concatenation. It concatenates the first `ncols` images horizontally, 
-  then stacks these horizontal combinations vertically (`nrows` times) to produce a larger image 
-  array. The combined image is returned as a numpy array of type float32 for precision in further 
-  processing if needed.
+  to be squeezed before concatenation. The first `ncols` images form the first row of the combined 
+  image, the next `ncols` the second row and so on for `nrows` rows, written into a preallocated 
+  array by `stitch_wells`. The combined image is returned as a numpy array of type float32 for 
+  precision in further processing if needed.
   
   Args:
     img_array (list, required): A list of image arrays to be combined. Each element should be a 
@@ -47,14 +122,7 @@ def combine_img_blocks(img_array: list, nrows: int, ncols: int) -> np.ndarray:
     float32 for precision in further numerical operations if required.
       
   Raises:
-    IndexError: If `img_array` does not contain enough elements to form the specified number of 
+    ValueError: If `img_array` does not contain enough elements to form the specified number of 
     rows and columns.
   """
-  combined_img = np.array([])
-  for _ in range(nrows):
-    temp = np.concatenate([np.squeeze(img_array[i])
-    for i in range(ncols)],axis=1).astype(np.float32)
-    img_array = img_array[ncols:]
-    combined_img = np.vstack([combined_img,temp]).astype(np.float32) \
-    if combined_img.size else temp
-  return combined_img
+  return stitch_wells(img_array, nrows, ncols, dtype=np.float32)
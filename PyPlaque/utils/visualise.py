@@ -1,11 +1,5 @@
-from matplotlib.cbook import boxplot_stats
-import matplotlib.patches as mpatches
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-import seaborn as sns
 from tqdm.auto import tqdm
-from sklearn.preprocessing import MinMaxScaler
 
 def barplot_quants(abs_df, save_path=None,normalize=False):
     """
@@ -34,6 +28,9 @@ def barplot_quants(abs_df, save_path=None,normalize=False):
         TypeError: If any of the input arguments do not match their expected types as specified 
         in the method signature.
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     sns.set(font_scale=1.5)
     sns.set_style("ticks")
 
@@ -97,6 +94,11 @@ def boxplot_quants(plq_measures_df, col_name,return_stats = False,save_path=None
         TypeError: If any of the input arguments do not match their expected types as specified in 
         the method signature.
     """
+    from matplotlib.cbook import boxplot_stats
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+
     # extract relevant column
     plq_measures_df = plq_measures_df[col_name]
 
@@ -156,6 +158,9 @@ def create_grouped_bar_from_df(abs_df_img,abs_df_img_cont,col_name,normalize=Fal
         TypeError: If any of the input arguments do not match their expected types as specified 
         in the method signature.
     """
+    import pandas as pd
+    from sklearn.preprocessing import MinMaxScaler
+
     iter_ = len(abs_df_img)
     abs_iter_ls  = np.array(list(abs_df_img[col_name])).flatten()
     abs_df = pd.DataFrame({
@@ -220,6 +225,8 @@ def compare_plaque_detection_from_image(i,j,true_count, mask, plaques_list,
         TypeError: If any of the input arguments do not match their expected types as specified in 
         the method signature.
     """
+    import matplotlib.patches as mpatches
+    import matplotlib.pyplot as plt
     
     print(mask.name," true count : ", true_count)
     print(mask.name," : ", len(plaques_list))
@@ -249,7 +256,7 @@ def compare_plaque_detection_from_image(i,j,true_count, mask, plaques_list,
 
     return
 
-def plot_bbox_plaques_mask(i,j,mask,plaques_list,save_path=None):
+def plot_bbox_plaques_mask(i,j,mask,plaques_list,save_path=None,show=True):
     """
     **plot_bbox_plaques_mask Function**
     This function plots a masked image of plaques overlaid with bounding boxes and saves it if a 
@@ -269,6 +276,8 @@ def plot_bbox_plaques_mask(i,j,mask,plaques_list,save_path=None):
                                     draw rectangles on top of the `mask`.
         save_path (str or None, optional): The file path where the plot will be saved if provided;
                                     otherwise, it is displayed interactively. Defaults to `None`.
+        show (bool, optional): Whether to display the plot. If False, the figure is closed after 
+                            saving, e.g. for batch jobs without a display. Defaults to True.
     
     Returns:
         None: The function displays and optionally saves a matplotlib figure based on the 
@@ -278,7 +287,10 @@ def plot_bbox_plaques_mask(i,j,mask,plaques_list,save_path=None):
         TypeError: If any of the input arguments do not match their expected types as specified 
         in the method signature.
     """
-    _, ax = plt.subplots(figsize=(10, 6))
+    import matplotlib.patches as mpatches
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 6))
     ax.imshow(mask,cmap='gray')
     rect_list = [mpatches.Rectangle((plq.bbox[1], plq.bbox[0]), plq.bbox[3] - plq.bbox[1], 
                                 plq.bbox[2] - plq.bbox[0],
@@ -289,6 +301,9 @@ def plot_bbox_plaques_mask(i,j,mask,plaques_list,save_path=None):
     plt.tight_layout()
     if save_path:
         plt.savefig(save_path,bbox_inches='tight', dpi=300)
-    plt.show()
+    if show:
+        plt.show()
+    else:
+        plt.close(fig)
 
     return
\ No newline at end of file
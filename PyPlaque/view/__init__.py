@@ -1,4 +1,10 @@
-from PyPlaque.view.fp_readout_object import *
-from PyPlaque.view.fp_readout_image import *
-from PyPlaque.view.generate_plate_readout import *
-from PyPlaque.view.plate_image import *
\ No newline at end of file
+from PyPlaque.lazy_import import lazy_exports
+
+__getattr__, __dir__, __all__ = lazy_exports(__name__, {
+  'fp_readout_object': ['contour_eccentricity', 'PlaqueObjectReadout'],
+  'fp_readout_image': ['WellImageReadout'],
+  'fp_readout_label': ['LabelImageReadout'],
+  'generate_plate_readout': ['PlateReadout'],
+  'plate_image': ['PlateImage'],
+  'readout_store': ['READOUT_TABLE_COLUMNS', 'ReadoutStore']
+})
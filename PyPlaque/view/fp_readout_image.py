@@ -4,7 +4,7 @@ from skimage import measure
 
 from PyPlaque.utils import get_plaque_mask
 from PyPlaque.view import PlaqueObjectReadout
-from PyPlaque.utils import picks_area
+from PyPlaque.utils import increment_counter, picks_area_labels, stage_timer
 
 
 class WellImageReadout:
@@ -376,11 +376,11 @@ class WellImageReadout:
         label_image[~self.plaque_mask] = 0
         props = measure.regionprops(label_image)
         plaque_region_properties_area = 0
-        for prop in props:
-            if self.params['use_picks']:
-                plaque_area = picks_area(prop.image)
-            else:
-                plaque_area = prop.area
+        if self.params['use_picks']:
+            plaque_areas = picks_area_labels(label_image, [prop.label for prop in props])
+        else:
+            plaque_areas = [prop.area for prop in props]
+        for plaque_area in plaque_areas:
             if  self.params['min_plaque_area'] < plaque_area:
                 plaque_region_properties_area += plaque_area
         return round(plaque_region_properties_area/
@@ -405,6 +405,7 @@ class WellImageReadout:
         """
         return np.sum(self.plaque_mask)
     
+    @stage_timer('plaque_objects')
     def get_plaque_objects(self):
         """
         **get_plaque_objects Method**
@@ -426,13 +427,14 @@ class WellImageReadout:
         label_image[~self.plaque_mask] = 0
         props = measure.regionprops(label_image)
         plaque_region_properties = []
-        for prop in props:
-            if self.params['use_picks']:
-                plaque_area = picks_area(prop.image)
-            else:
-                plaque_area = prop.area
+        if self.params['use_picks']:
+            plaque_areas = picks_area_labels(label_image, [prop.label for prop in props])
+        else:
+            plaque_areas = [prop.area for prop in props]
+        for prop, plaque_area in zip(props, plaque_areas):
             if  self.params['min_plaque_area'] < plaque_area:
                 plaque_region_properties.append(prop)
+        increment_counter('objects_labelled', len(props))
         return plaque_region_properties
     
     def call_plaque_object_readout(self,plaque_object_properties, params):
@@ -0,0 +1,311 @@
+import numpy as np
+import skimage
+from skimage import measure
+
+from PyPlaque.utils import gaussian_blur, picks_area, picks_area_labels, picks_perimeter_labels
+from PyPlaque.utils import increment_counter, stage_timer
+from PyPlaque.view import WellImageReadout, contour_eccentricity
+
+
+def _box_sums(integral_image, bboxes):
+    """
+    **_box_sums Function**
+    Returns the sums of an image over many bounding boxes at once from its zero-padded integral
+    image.
+    """
+    min_row, min_col, max_row, max_col = bboxes.T
+    return (integral_image[max_row, max_col] - integral_image[min_row, max_col]
+            - integral_image[max_row, min_col] + integral_image[min_row, min_col])
+
+
+def _integral_image(image):
+    """
+    **_integral_image Function**
+    Returns the integral image of `image` padded with a leading row and column of zeros, so that
+    `_box_sums` can be used with regionprops bounding boxes directly. Integer and boolean images
+    are summed exactly in int64, floating point images in float64.
+    """
+    dtype = np.float64 if np.issubdtype(image.dtype, np.floating) else np.int64
+    integral_image = np.zeros((image.shape[0] + 1, image.shape[1] + 1), dtype=dtype)
+    np.cumsum(np.cumsum(image, axis=0, dtype=dtype), axis=1, out=integral_image[1:, 1:])
+    return integral_image
+
+
+class LabelImageReadout(WellImageReadout):
+    """
+    **LabelImageReadout Class**
+    The LabelImageReadout class computes the same well-level and object-level readouts as
+    WellImageReadout and PlaqueObjectReadout, but labels the plaque mask of the well only once and
+    derives all columns from that label image. Counts and box sums are computed for all objects at
+    once with `bincount`, `regionprops_table` and integral images, and the plaque peaks found while
+    generating the mask can be reused instead of segmenting the well a second time. The class
+    inherits from WellImageReadout.
+
+    Attributes:
+        nuclei_image_name (str, required): The name of the nuclei image, which serves as an
+                                        identifier for the nuclei image data.
+
+        plaque_image_name (str, required): The name of the plaque image, which serves as an
+                                        identifier for the plaque image data.
+
+        nuclei_image (np.ndarray, required): A 2D numpy array representing the image data of the
+                                            nuclei.
+
+        plaque_image (np.ndarray, required): A 2D numpy array representing the image data of the
+                                            plaque.
+
+        nuclei_mask (np.ndarray, required): A 2D numpy array serving as a mask for the nuclei image.
+
+        plaque_mask (np.ndarray, required): A 2D numpy array serving as a mask for the plaque image.
+
+        virus_params (dict, required): A dictionary containing parameters specific to virus
+                                    channels.
+
+        global_peak_coords (np.ndarray, optional): The peak coordinates returned by
+                                                `get_plaque_mask` together with `plaque_mask`. If
+                                                None, `get_plaque_mask` is run on the plaque image
+                                                when the plaque count is requested. Defaults to
+                                                None.
+
+    Raises:
+        TypeError: If the data types for any of the arguments do not match their expected types as
+        specified in the class definition.
+    """
+    def __init__(self,
+                 nuclei_image_name,
+                 plaque_image_name,
+                 nuclei_image,
+                 plaque_image,
+                 nuclei_mask,
+                 plaque_mask,
+                 virus_params,
+                 global_peak_coords=None):
+        super(LabelImageReadout, self).__init__(nuclei_image_name,
+                                                plaque_image_name,
+                                                nuclei_image,
+                                                plaque_image,
+                                                nuclei_mask,
+                                                plaque_mask,
+                                                virus_params)
+        self.global_peak_coords = global_peak_coords
+        self.label_image = None
+        self.object_labels = None
+        self.object_areas = None
+        self.object_readouts = None
+
+    def get_label_image(self):
+        """
+        **get_label_image Method**
+        Labels the plaque mask once and keeps the label image, the labels of the plaque objects
+        larger than 'min_plaque_area' and their areas for all following readouts.
+
+        Args:
+
+        Returns:
+            np.ndarray: A 2D numpy array of the labelled plaque mask.
+        """
+        if self.label_image is None:
+            label_image = measure.label(self.plaque_mask)
+            label_image[~self.plaque_mask] = 0
+
+            pixel_counts = np.bincount(label_image.ravel())
+            labels = np.nonzero(pixel_counts[1:])[0] + 1
+            if self.params['use_picks']:
+                areas = picks_area_labels(label_image, labels)
+            else:
+                areas = pixel_counts[labels]
+            keep = areas > self.params['min_plaque_area']
+
+            self.label_image = label_image
+            self.object_labels = labels[keep]
+            self.object_areas = areas[keep]
+            increment_counter('objects_labelled', len(labels))
+        return self.label_image
+
+    def get_plaque_count(self):
+        """
+        **get_plaque_count Method**
+        Returns the number of plaques in the well as the number of global peaks. The peaks passed
+        at construction are reused, otherwise `get_plaque_mask` is run on the plaque image.
+
+        Args:
+
+        Returns:
+            int: The total count of plaques as determined by the global peak detection in the
+            plaque image.
+        """
+        if self.global_peak_coords is None:
+            return super(LabelImageReadout, self).get_plaque_count()
+        return len(self.global_peak_coords)
+
+    def get_infected_nuclei_count(self):
+        """
+        **get_infected_nuclei_count Method**
+        Estimates the number of infected nuclei as the total area of the plaque objects larger than
+        'min_plaque_area' divided by the average cell area, using the areas of the label image.
+
+        Args:
+
+        Returns:
+            int: The estimated number of infected nuclei based on the total plaque area divided
+            by the average cell area.
+        """
+        self.get_label_image()
+        return round(np.sum(self.object_areas)/
+                     ((self.params['min_cell_area'] + self.params['max_cell_area'])/2))
+
+    @stage_timer('object_readouts')
+    def get_object_readouts(self):
+        """
+        **get_object_readouts Method**
+        Computes the object-level readouts of every plaque object larger than 'min_plaque_area' in
+        a single pass over the label image. The values are the same as those of the corresponding
+        PlaqueObjectReadout methods.
+
+        Args:
+
+        Returns:
+            dict: A dictionary of 1D numpy arrays with one element per plaque object, ordered by
+            label, with the keys 'Label', 'Area', 'Centroid_1', 'Centroid_2', 'MajorAxisLength',
+            'MinorAxisLength', 'Eccentricity', 'ConvexArea', 'Roundness', 'numberOfPeaks',
+            'numberOfNucleiInPlaque', 'numberOfInfectedNucleiInPlaque', 'maxIntensityGFP',
+            'totalIntensityGFP' and 'meanIntensityGFP'.
+        """
+        if self.object_readouts is not None:
+            return self.object_readouts
+
+        label_image = self.get_label_image()
+        labels = self.object_labels
+        kept_image = np.where(np.isin(label_image, labels), label_image, 0)
+        props = measure.regionprops_table(kept_image, properties=('label', 'bbox', 'centroid',
+                                                    'axis_major_length', 'axis_minor_length',
+                                                    'area_convex', 'image_convex'))
+        bboxes = np.stack([props['bbox-0'], props['bbox-1'], props['bbox-2'], props['bbox-3']],
+                          axis=1).astype(np.intp)
+        n_objects = len(labels)
+        cell_area = (self.params['min_cell_area'] + self.params['max_cell_area'])/2
+
+        # box sums over the bounding boxes, as PlaqueObjectReadout works on bounding box crops
+        gfp_image = self.plaque_image * self.plaque_mask
+        gfp_nonzero = gfp_image != 0
+        rows, cols = np.indices(gfp_image.shape)
+        total_gfp = _box_sums(_integral_image(gfp_image), bboxes)
+        nonzero_count = _box_sums(_integral_image(gfp_nonzero), bboxes)
+        nonzero_rows = _box_sums(_integral_image(gfp_nonzero * rows), bboxes) - \
+                        nonzero_count * bboxes[:, 0]
+        nonzero_cols = _box_sums(_integral_image(gfp_nonzero * cols), bboxes) - \
+                        nonzero_count * bboxes[:, 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_gfp = np.where(nonzero_count == 0, 0,
+                                (nonzero_rows + nonzero_cols)/(2 * nonzero_count))
+
+        eccentricity = np.zeros(n_objects)
+        peaks = np.zeros(n_objects, dtype=np.int64)
+        nuclei_in_plaque = np.zeros(n_objects)
+        infected_nuclei_in_plaque = np.zeros(n_objects)
+        max_gfp = np.zeros(n_objects)
+        for i, (min_row, min_col, max_row, max_col) in enumerate(bboxes):
+            object_image = kept_image[min_row:max_row, min_col:max_col] == labels[i]
+            nuclei_crop = self.nuclei_mask[min_row:max_row, min_col:max_col]
+            plaque_crop = self.plaque_image[min_row:max_row, min_col:max_col]
+
+            eccentricity[i] = contour_eccentricity(object_image)
+            max_gfp[i] = np.max(gfp_image[min_row:max_row, min_col:max_col])
+            if self.params['fine_plaque_detection_flag']:
+                blurred_image = gaussian_blur(plaque_crop * object_image,
+                                            sigma=self.params['plaque_gaussian_filter_sigma'],
+                                            truncate = self.params['plaque_gaussian_filter_size']/
+                                                self.params['plaque_gaussian_filter_sigma'],
+                                            method = self.params.get(
+                                                'plaque_gaussian_filter_method', 'exact'),
+                                            tolerance = self.params.get(
+                                                'plaque_gaussian_filter_tolerance', 2))
+                peaks[i] = len(skimage.feature.peak_local_max(blurred_image,
+                                                    min_distance=self.params['peak_region_size'],
+                                                    exclude_border = False))
+            nuclei_mask_in_plaque = props['image_convex'][i] * nuclei_crop
+            if self.params['use_picks']:
+                nuclei_in_plaque[i] = picks_area(nuclei_mask_in_plaque)
+                infected_nuclei_in_plaque[i] = picks_area(
+                                self.plaque_mask[min_row:max_row, min_col:max_col] * nuclei_crop)
+            else:
+                nuclei_in_plaque[i] = np.sum(nuclei_mask_in_plaque)
+
+        if self.params['use_picks']:
+            perimeter = picks_perimeter_labels(kept_image, labels)
+        else:
+            infected_nuclei_in_plaque = _box_sums(_integral_image(
+                                                self.plaque_mask * self.nuclei_mask), bboxes)
+
+        areas = self.object_areas.astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if self.params['use_picks']:
+                roundness = np.where(perimeter != 0, 4 * np.pi * areas / perimeter ** 2, 0)
+            else:
+                # radius is the distance between the bounding box corner and its centre
+                radius = np.sqrt(((bboxes[:, 3] - bboxes[:, 1])/2) ** 2 +
+                                ((bboxes[:, 2] - bboxes[:, 0])/2) ** 2)
+                perimeter = 2 * np.pi * radius
+                roundness = np.where(perimeter != 0, 4 * np.pi * areas / perimeter ** 2, 0)
+
+        self.object_readouts = {
+            'Label': labels,
+            'Area': areas,
+            'Centroid_1': props['centroid-0'],
+            'Centroid_2': props['centroid-1'],
+            'MajorAxisLength': props['axis_major_length'],
+            'MinorAxisLength': props['axis_minor_length'],
+            'Eccentricity': eccentricity,
+            'ConvexArea': props['area_convex'],
+            'Roundness': roundness,
+            'numberOfPeaks': peaks,
+            'numberOfNucleiInPlaque': nuclei_in_plaque/cell_area,
+            'numberOfInfectedNucleiInPlaque': infected_nuclei_in_plaque/cell_area,
+            'maxIntensityGFP': max_gfp,
+            'totalIntensityGFP': total_gfp,
+            'meanIntensityGFP': mean_gfp
+        }
+        return self.object_readouts
+
+    def get_well_readouts(self):
+        """
+        **get_well_readouts Method**
+        Computes all well-level readouts of the well.
+
+        Args:
+
+        Returns:
+            dict: A dictionary with the well-level column names of
+            `PlateReadout.generate_readouts_dataframe` as keys and the readouts as values.
+        """
+        return {
+            'NucleiImageName': self.nuclei_image_name,
+            'VirusImageName': self.plaque_image_name,
+            'maxNucleiIntensity': self.get_max_nuclei_intensity(),
+            'totalNucleiIntensity': self.get_total_nuclei_intensity(),
+            'meanNucleiIntensity': self.get_mean_nuclei_intensity(),
+            'numberOfNuclei': self.get_nuclei_count(),
+            'maxVirusIntensity': self.get_max_plaque_intensity(),
+            'totalVirusIntensity': self.get_total_plaque_intensity(),
+            'meanVirusIntensity': self.get_mean_plaque_intensity(),
+            'numberOfPlaques': self.get_plaque_count(),
+            'numberOfInfectedNuclei': self.get_infected_nuclei_count()
+        }
+
+    def get_mean_object_readouts(self):
+        """
+        **get_mean_object_readouts Method**
+        Averages the object-level readouts over all plaque objects of the well, as reported per
+        well by `PlateReadout.generate_readouts_dataframe`. Wells without plaque objects get 0 for
+        every readout.
+
+        Args:
+
+        Returns:
+            dict: A dictionary with the object-level column names as keys and the mean readouts
+            as values.
+        """
+        object_readouts = self.get_object_readouts()
+        if len(object_readouts['Label']) == 0:
+            return {k: 0 for k in object_readouts if k != 'Label'}
+        return {k: np.mean(v) for k, v in object_readouts.items() if k != 'Label'}
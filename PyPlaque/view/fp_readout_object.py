@@ -1,9 +1,10 @@
-import cv2
 import numpy as np
 import re
 import skimage
 
-from PyPlaque.utils import picks_area, picks_perimeter
+from PyPlaque.phenotypes.plaque import contour_eccentricity
+from PyPlaque.utils import gaussian_blur, picks_area, picks_perimeter
+
 
 class PlaqueObjectReadout:
     """
@@ -255,37 +256,7 @@ class PlaqueObjectReadout:
             handled here, but this method does not explicitly raise any errors itself.
         """
 
-        # find the contours
-        contours,_ = cv2.findContours(self.plaque_object_properties.image.astype(np.uint8).copy(), 
-                                                            cv2.RETR_TREE,cv2.CHAIN_APPROX_SIMPLE)
-
-        ecc = 0
-        # select the first contour that has more than 5 points and fit an ellipse based on that
-        if len(contours) != 0:
-            for i in range(len(contours)):
-                if len(contours[i]) >= 5:
-                    # fit the ellipse
-                    ellipse=cv2.fitEllipse(contours[i])
-                    if ellipse[2] == 0: #if rotation angle is zero results are not reliable
-                        ecc = 0
-                    else:
-                        semi_major_axis = ellipse[1][0]/2
-                        semi_minor_axis = ellipse[1][1]/2
-
-                        if semi_minor_axis > semi_major_axis:
-                            temp = semi_minor_axis
-                            semi_minor_axis = semi_major_axis
-                            semi_major_axis = temp
-
-                        if semi_minor_axis == 0:
-                            semi_minor_axis = 0.1
-                        if semi_major_axis == 0:
-                            semi_major_axis = 0.1
-                        ecc = np.sqrt(1-(semi_minor_axis**2/semi_major_axis**2))
-                        break
-        else:
-            ecc = 0
-        return ecc
+        return contour_eccentricity(self.plaque_object_properties.image)
 
     def get_eccentricity(self):
         """
@@ -391,7 +362,9 @@ class PlaqueObjectReadout:
         
         Identifies and returns the coordinates of peaks in the plaque object based on a 
         Gaussian-blurred image. The method applies a Gaussian filter to enhance peak detection, 
-        then uses skimage.feature.peak_local_max to find local maxima.
+        then uses skimage.feature.peak_local_max to find local maxima. The blur backend is chosen 
+        with the 'plaque_gaussian_filter_method' and 'plaque_gaussian_filter_tolerance' 
+        parameters, see `PyPlaque.utils.gaussian_blur`.
         
         Args:
         
@@ -410,10 +383,14 @@ class PlaqueObjectReadout:
             cur_plq_region= self.plaque_object * self.plaque_object_properties.image
             
             
-            blurred_image = skimage.filters.gaussian(cur_plq_region, 
+            blurred_image = gaussian_blur(cur_plq_region, 
                                             sigma=self.params['plaque_gaussian_filter_sigma'],
                                             truncate = self.params['plaque_gaussian_filter_size']/
-                                                self.params['plaque_gaussian_filter_sigma'] )
+                                                self.params['plaque_gaussian_filter_sigma'],
+                                            method = self.params.get(
+                                                'plaque_gaussian_filter_method', 'exact'),
+                                            tolerance = self.params.get(
+                                                'plaque_gaussian_filter_tolerance', 2))
             
             coordinates = skimage.feature.peak_local_max(blurred_image, 
                                                     min_distance=self.params['peak_region_size'],
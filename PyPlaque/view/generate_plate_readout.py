@@ -1,8 +1,42 @@
 import numpy as np
-import pandas as pd
 from tqdm.auto import tqdm
 
-from PyPlaque.view import WellImageReadout
+from PyPlaque.utils import scale_params, stage_timer
+from PyPlaque.view import LabelImageReadout, WellImageReadout
+
+
+def _timed_wells(wells):
+    """
+    **_timed_wells Function**
+    Yields the well records of `wells` and reports the time the consumer spends on each of them as 
+    a 'well_readouts' stage. Loading the next well is not included, it is reported by the loader.
+    """
+    for well in wells:
+        with stage_timer('well_readouts', well=str(well['virus_image_name']).split("/")[-1]):
+            yield well
+
+
+def _object_table_columns(well_ids, well_objects):
+    """
+    **_object_table_columns Function**
+    Concatenates the object-level readouts of all wells into one preallocated numpy column per 
+    readout, with the position of the well of every object in 'wellIndex'. Wells without objects 
+    contribute no rows.
+    """
+    counts = np.array([len(objects['Label']) for objects in well_objects], dtype=np.intp)
+    columns = {'wellIndex': np.repeat(np.arange(len(well_objects)), counts)}
+    for key, values in well_ids.items():
+        columns[key] = np.repeat(np.asarray(values, dtype=object), counts)
+    n_objects = int(counts.sum())
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    for key in (well_objects[0] if well_objects else {}):
+        column = np.empty(n_objects, dtype=np.result_type(*[objects[key] 
+                                                            for objects in well_objects]))
+        for i, objects in enumerate(well_objects):
+            column[offsets[i]:offsets[i + 1]] = objects[key]
+        columns[key] = column
+    return columns
+
 
 class PlateReadout:
     """
@@ -22,6 +56,11 @@ class PlateReadout:
         object_level_readouts (bool, optional): Flag to indicate whether to include object-level 
                     readouts. Default is True.
 
+        object_table (pd.DataFrame): The table with one row per plaque object of the last 
+                    single pass `generate_readouts_dataframe` call with object-level readouts, 
+                    holding the well position ('wellIndex'), the image names, the well row and 
+                    column, the object 'Label' and all object-level readouts. None before.
+
     Raises:
         ValueError: If both types of readouts are set to False. At least one should be True. 
         Please check again.
@@ -36,14 +75,68 @@ class PlateReadout:
         self.plate_id = plate_id
         self.well_level_readouts = well_level_readouts
         self.object_level_readouts = object_level_readouts
+        self.object_table = None
 
         if well_level_readouts == False and object_level_readouts==False:
             raise ValueError("Both types of readouts are set to False. At least one should be \
             True. Please check again.")
 
+    def iter_plate_wells(self):
+        """
+        **iter_plate_wells Method**
+
+        Yields the wells already loaded into the experiment's `plate_dict_w1` and `plate_dict_w2` 
+        as well records, in the same format as `FluorescenceMicroscopy.iter_wells`.
+
+        Args:
+
+        Yields:
+            dict: A well record with the keys 'nuclei_image_name', 'nuclei_image', 'nuclei_mask', 
+            'virus_image_name', 'virus_image', 'virus_mask' and 'virus_peaks', and the 
+            'preview_factor' of plates loaded with `preview=True`.
+
+        Raises:
+            ValueError: If the number of loaded images differs between both channels.
+        """
+        d = self.experiment.plate_indiv_dir[self.plate_id]
+        if len(self.experiment.plate_dict_w1[d]['img']) != len(
+                                                        self.experiment.plate_dict_w2[d]['img']):
+            raise ValueError("Expected equal number of image names, images and masks for \
+            both channels.Please check again.")
+
+        peaks = self.experiment.plate_dict_w2[d].get('peaks')
+        preview_factor = self.experiment.plate_dict_w2[d].get('preview_factor')
+        #Assuming that w1 is the nuclei channel and w2 as the plaque channel
+        for i in range(len(self.experiment.plate_dict_w2[d]['img'])):
+            well = {
+                'nuclei_image_name': self.experiment.plate_dict_w1[d]['image_name'][i],
+                'nuclei_image': self.experiment.plate_dict_w1[d]['img'][i],
+                'nuclei_mask': self.experiment.plate_dict_w1[d]['mask'][i],
+                'virus_image_name': self.experiment.plate_dict_w2[d]['image_name'][i],
+                'virus_image': self.experiment.plate_dict_w2[d]['img'][i],
+                'virus_mask': self.experiment.plate_dict_w2[d]['mask'][i],
+                'virus_peaks': peaks[i] if peaks else None
+            }
+            if preview_factor:
+                well['preview_factor'] = preview_factor
+            yield well
+
+    def _virus_params(self, well):
+        """
+        **_virus_params Method**
+        Returns the virus parameters of a well record, scaled to the reduced images of wells loaded 
+        with `preview=True`.
+        """
+        if well.get('preview_factor'):
+            return scale_params(self.experiment.params, well['preview_factor'])['virus']
+        return self.experiment.params['virus']
+
+    @stage_timer('generate_readouts_dataframe')
     def generate_readouts_dataframe(self, 
                                     row_pattern = r'([A-Z]{1})[0-9]{2}', 
-                                    column_pattern = r'[A-Z]{1}([0-9]{2})'):
+                                    column_pattern = r'[A-Z]{1}([0-9]{2})',
+                                    wells = None,
+                                    single_pass = True):
         """
         **generate_readouts_dataframe Method**
         
@@ -51,9 +144,27 @@ class PlateReadout:
 
         Args:
             row_pattern (regex, optional): A regular expression to find the row identifier in the 
-                                        well name.
+                                        well name. Not used for well records that already hold 
+                                        the parsed 'row', e.g. from 
+                                        `iter_wells(use_manifest=True)`.
             column_pattern (regex, optional): A regular expression to find the column identifier in 
-                                            the well name.
+                                            the well name. Not used for well records that already 
+                                            hold the parsed 'column'.
+            wells (iterable, optional): An iterable of well records, such as the generator returned 
+                                        by `FluorescenceMicroscopy.iter_wells`. Each well is 
+                                        released once its readouts are computed, so peak memory 
+                                        depends on a few wells only. If None, the wells loaded into 
+                                        the experiment's plate dictionaries are used. Wells 
+                                        loaded with `preview=True` are read out with the scaled 
+                                        parameters, in pixels of the reduced images. 
+                                        Default is None.
+            single_pass (bool, optional): If True, each well is segmented and labelled once with 
+                                        `LabelImageReadout` and all columns are computed from that 
+                                        label image. If False, the per-object 
+                                        `WellImageReadout` path is used. Both give the same 
+                                        columns. The single pass also keeps the readouts of every 
+                                        plaque object in `object_table` and derives the 
+                                        object-level means from it. Default is True.
 
         Returns:
             - If both well and object level readouts are present:
@@ -68,11 +179,10 @@ class PlateReadout:
             or during dataframe creation can be handled here, but this method does not explicitly 
             raise any errors itself.
         """
-        d = self.experiment.plate_indiv_dir[self.plate_id]
-        if len(self.experiment.plate_dict_w1[d]['img']) != len(
-                                                        self.experiment.plate_dict_w2[d]['img']):
-            raise ValueError("Expected equal number of image names, images and masks for \
-            both channels.Please check again.")
+        import pandas as pd
+
+        if wells is None:
+            wells = self.iter_plate_wells()
         
         abs_df_well = pd.DataFrame()
         abs_df_object = pd.DataFrame()
@@ -108,16 +218,43 @@ class PlateReadout:
         total_intensity_GFP_abs = []
         mean_intensity_GFP_abs = []
 
-        #Assuming that w1 is the nuclei channel and w2 as the plaque channel
-        for i in tqdm(range(len(self.experiment.plate_dict_w2[d]['img']))):
+        well_records = []
+        well_ids = {'NucleiImageName': [], 'VirusImageName': [], 'wellRow': [], 'wellColumn': []}
+        well_objects = []
+
+        for well in tqdm(_timed_wells(wells)):
+            if single_pass:
+                plq_image_readout = LabelImageReadout(nuclei_image_name=
+                str(well['nuclei_image_name']).split("/")[-1],
+                plaque_image_name=str(well['virus_image_name']).split("/")[-1],
+                nuclei_image=np.array(well['nuclei_image']),
+                plaque_image=np.array(well['virus_image']),
+                nuclei_mask=np.array(well['nuclei_mask']),
+                plaque_mask=np.array(well['virus_mask']),
+                virus_params = self._virus_params(well),
+                global_peak_coords = well.get('virus_peaks'))
+
+                if self.well_level_readouts:
+                    well_records.append(plq_image_readout.get_well_readouts())
+                if self.object_level_readouts:
+                    well_ids['NucleiImageName'].append(plq_image_readout.nuclei_image_name)
+                    well_ids['VirusImageName'].append(plq_image_readout.plaque_image_name)
+                    well_ids['wellRow'].append(well['row'] if 'row' in well else 
+                                               plq_image_readout.get_row(row_pattern = row_pattern))
+                    well_ids['wellColumn'].append(well['column'] if 'column' in well else 
+                                                  plq_image_readout.get_column(
+                                                                column_pattern = column_pattern))
+                    well_objects.append(plq_image_readout.get_object_readouts())
+                continue
+
             plq_image_readout = WellImageReadout(nuclei_image_name=
-            str(self.experiment.plate_dict_w1[d]['image_name'][i]).split("/")[-1],
-            plaque_image_name=str(self.experiment.plate_dict_w2[d]['image_name'][i]).split("/")[-1],
-            nuclei_image=np.array(self.experiment.plate_dict_w1[d]['img'][i]),
-            plaque_image=np.array(self.experiment.plate_dict_w2[d]['img'][i]),
-            nuclei_mask=np.array(self.experiment.plate_dict_w1[d]['mask'][i]),
-            plaque_mask=np.array(self.experiment.plate_dict_w2[d]['mask'][i]),
-            virus_params = self.experiment.params['virus'])
+            str(well['nuclei_image_name']).split("/")[-1],
+            plaque_image_name=str(well['virus_image_name']).split("/")[-1],
+            nuclei_image=np.array(well['nuclei_image']),
+            plaque_image=np.array(well['virus_image']),
+            nuclei_mask=np.array(well['nuclei_mask']),
+            plaque_mask=np.array(well['virus_mask']),
+            virus_params = self._virus_params(well))
 
             if self.well_level_readouts:
                 virus_image_name.append(plq_image_readout.plaque_image_name)
@@ -134,12 +271,14 @@ class PlateReadout:
             if self.object_level_readouts:
                 plq_objects = plq_image_readout.get_plaque_objects()
 
-                well_row.append(plq_image_readout.get_row(row_pattern = row_pattern))
-                well_column.append(plq_image_readout.get_column(column_pattern = column_pattern))
+                well_row.append(well['row'] if 'row' in well else 
+                                plq_image_readout.get_row(row_pattern = row_pattern))
+                well_column.append(well['column'] if 'column' in well else 
+                                   plq_image_readout.get_column(column_pattern = column_pattern))
 
                 if len(plq_objects) != 0:
                     plq_object_readouts = [plq_image_readout.call_plaque_object_readout(plq_object,
-                    self.experiment.params['virus']) for plq_object in plq_objects]
+                    self._virus_params(well)) for plq_object in plq_objects]
 
                 
 
@@ -193,35 +332,50 @@ class PlateReadout:
                     total_intensity_GFP_abs.append(0)
                     mean_intensity_GFP_abs.append(0)
         
-        if self.well_level_readouts:
-            abs_df_well['NucleiImageName'] = nuclei_image_name
-            abs_df_well['VirusImageName'] = virus_image_name
-            abs_df_well['maxNucleiIntensity'] = max_nuclei_intensity_abs
-            abs_df_well['totalNucleiIntensity'] = total_nuclei_intensity_abs
-            abs_df_well['meanNucleiIntensity'] = mean_nuclei_intensity_abs
-            abs_df_well['numberOfNuclei'] = nuclei_count_abs
-            abs_df_well['maxVirusIntensity'] = max_plaque_intensity_abs
-            abs_df_well['totalVirusIntensity'] = total_plaque_intensity_abs
-            abs_df_well['meanVirusIntensity'] = mean_plaque_intensity_abs
-            abs_df_well['numberOfPlaques'] = plaque_count_abs
-            abs_df_well['numberOfInfectedNuclei'] = infected_nuclei_count_abs
-        if self.object_level_readouts:
-            abs_df_object['wellRow'] = well_row
-            abs_df_object['wellColumn'] = well_column
-            abs_df_object['Area'] = area_abs
-            abs_df_object['Centroid_1'] = centroid_1_abs
-            abs_df_object['Centroid_2'] = centroid_2_abs
-            abs_df_object['MajorAxisLength'] = major_axis_length_abs
-            abs_df_object['MinorAxisLength'] = minor_axis_length_abs
-            abs_df_object['Eccentricity'] = eccentricity_abs
-            abs_df_object['ConvexArea'] = convex_area_abs
-            abs_df_object['Roundness'] = roundness_abs
-            abs_df_object['numberOfPeaks'] = peak_counts_abs
-            abs_df_object['numberOfNucleiInPlaque'] = nuclei_in_plaque_abs
-            abs_df_object['numberOfInfectedNucleiInPlaque'] = infected_nuclei_in_plaque_abs
-            abs_df_object['maxIntensityGFP'] = max_intensity_GFP_abs
-            abs_df_object['totalIntensityGFP'] = total_intensity_GFP_abs
-            abs_df_object['meanIntensityGFP'] = mean_intensity_GFP_abs
+        if single_pass:
+            if self.well_level_readouts:
+                abs_df_well = pd.DataFrame(well_records)
+            if self.object_level_readouts:
+                self.object_table = pd.DataFrame(_object_table_columns(well_ids, well_objects))
+                # mean of every object readout per well, 0 for wells without plaque objects
+                readout_columns = [c for c in self.object_table.columns 
+                                   if c not in well_ids and c not in ('wellIndex', 'Label')]
+                well_means = self.object_table.groupby('wellIndex')[readout_columns].mean()
+                well_means = well_means.reindex(range(len(well_objects)), fill_value=0)
+                abs_df_object = pd.DataFrame({'wellRow': well_ids['wellRow'], 
+                                              'wellColumn': well_ids['wellColumn']})
+                abs_df_object = pd.concat([abs_df_object, 
+                                           well_means.reset_index(drop=True)], axis=1)
+        else:
+            if self.well_level_readouts:
+                abs_df_well['NucleiImageName'] = nuclei_image_name
+                abs_df_well['VirusImageName'] = virus_image_name
+                abs_df_well['maxNucleiIntensity'] = max_nuclei_intensity_abs
+                abs_df_well['totalNucleiIntensity'] = total_nuclei_intensity_abs
+                abs_df_well['meanNucleiIntensity'] = mean_nuclei_intensity_abs
+                abs_df_well['numberOfNuclei'] = nuclei_count_abs
+                abs_df_well['maxVirusIntensity'] = max_plaque_intensity_abs
+                abs_df_well['totalVirusIntensity'] = total_plaque_intensity_abs
+                abs_df_well['meanVirusIntensity'] = mean_plaque_intensity_abs
+                abs_df_well['numberOfPlaques'] = plaque_count_abs
+                abs_df_well['numberOfInfectedNuclei'] = infected_nuclei_count_abs
+            if self.object_level_readouts:
+                abs_df_object['wellRow'] = well_row
+                abs_df_object['wellColumn'] = well_column
+                abs_df_object['Area'] = area_abs
+                abs_df_object['Centroid_1'] = centroid_1_abs
+                abs_df_object['Centroid_2'] = centroid_2_abs
+                abs_df_object['MajorAxisLength'] = major_axis_length_abs
+                abs_df_object['MinorAxisLength'] = minor_axis_length_abs
+                abs_df_object['Eccentricity'] = eccentricity_abs
+                abs_df_object['ConvexArea'] = convex_area_abs
+                abs_df_object['Roundness'] = roundness_abs
+                abs_df_object['numberOfPeaks'] = peak_counts_abs
+                abs_df_object['numberOfNucleiInPlaque'] = nuclei_in_plaque_abs
+                abs_df_object['numberOfInfectedNucleiInPlaque'] = infected_nuclei_in_plaque_abs
+                abs_df_object['maxIntensityGFP'] = max_intensity_GFP_abs
+                abs_df_object['totalIntensityGFP'] = total_intensity_GFP_abs
+                abs_df_object['meanIntensityGFP'] = mean_intensity_GFP_abs
 
 
         if (self.well_level_readouts and self.object_level_readouts):
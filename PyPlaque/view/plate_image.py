@@ -1,12 +1,10 @@
 import os
 
-import matplotlib.patches as mpatches
-import matplotlib.pyplot as plt
 import numpy as np
-from skimage.measure import label, regionprops
+from skimage.measure import label, regionprops_table
 from skimage.segmentation import clear_border
 
-from PyPlaque.utils import picks_area
+from PyPlaque.utils import fit_plate_grid, picks_area_labels, stage_timer
 
 
 class PlateImage:
@@ -64,7 +62,33 @@ class PlateImage:
       self.plate_mask = plate_mask
       self.use_picks = use_picks
       self.inverted = inverted
+      self.grid_fit = None
 
+  def _detect_wells(self, min_area):
+    """
+    **_detect_wells Method**
+    Labels the plate mask once, without wells touching its border, and returns the indices of the 
+    regions of at least `min_area`, in label order, together with their (minr, minc, maxr, maxc) 
+    bounding boxes.
+    """
+    label_image = label(clear_border(self.plate_mask))
+    props = regionprops_table(label_image, properties=('label', 'bbox', 'area'))
+    if self.use_picks:
+      well_areas = picks_area_labels(label_image, props['label'])
+    else:
+      well_areas = props['area']
+    indices = np.flatnonzero(np.asarray(well_areas) >= min_area)
+    bboxes = np.stack([props[f'bbox-{i}'] for i in range(4)], axis=-1)[indices]
+    return indices, bboxes.reshape(-1, 4).astype(int)
+
+  def _masked_image(self):
+    """
+    **_masked_image Method**
+    Returns the plate image raised to the power of the plate mask, computed once for all wells.
+    """
+    return self.plate_image ** self.plate_mask
+
+  @stage_timer('get_wells')
   def get_wells(self, min_area = 100):
     """
     **get_wells Method**
@@ -79,25 +103,38 @@ class PlateImage:
         
     Returns:
       list: A list of numpy arrays, where each array represents a well cropped from the 
-      plate image.
+      plate image. The arrays are views of a single masked plate image.
     
     Notes:
       Wells are identified based on their area threshold and are extracted using bounding boxes 
       derived from regionprops analysis after clearing border artifacts from the plate mask.
     """
-    well_crops = []
-    for _,well in enumerate(regionprops(label(clear_border(self.plate_mask)))):
-      if self.use_picks:
-        well_area = picks_area(well.image)
-      else:
-        well_area = well.area
-      if well_area >= min_area:
-        minr, minc, maxr, maxc = well.bbox
-        masked_img = self.plate_image ** self.plate_mask
-        well_crops.append(masked_img[minr:maxr, minc:maxc])
-    return well_crops
-
-  def get_well_positions(self, min_area = 100):
+    _, bboxes = self._detect_wells(min_area)
+    if len(bboxes) == 0:
+      return []
+    masked_img = self._masked_image()
+    return [masked_img[minr:maxr, minc:maxc] for (minr, minc, maxr, maxc) in bboxes]
+
+  def _grid_positions(self, bboxes):
+    """
+    **_grid_positions Method**
+    Assigns the row and column numbers of wells from their bounding boxes. Wells are ordered by 
+    their minimum column, every `n_rows` consecutive wells form a plate column, and the wells of a 
+    column are numbered by their maximum row. Ties keep the label order. Columns are numbered 
+    from 0, or down from `n_columns` if the plate is inverted.
+    """
+    n_wells = len(bboxes)
+    by_column = np.argsort(bboxes[:, 1], kind='stable')
+    chunks = np.arange(n_wells) // self.n_rows
+    order = by_column[np.lexsort((bboxes[by_column, 2], chunks))]
+    nrow = np.empty(n_wells, dtype=int)
+    ncol = np.empty(n_wells, dtype=int)
+    nrow[order] = np.arange(n_wells) % self.n_rows
+    ncol[order] = self.n_columns - chunks if self.inverted else chunks
+    return nrow, ncol
+
+  @stage_timer('get_well_positions')
+  def get_well_positions(self, min_area = 100, method = 'sorted'):
     """
     **get_well_positions Method**
     
@@ -108,6 +145,13 @@ class PlateImage:
     Args:
       min_area (int, optional): The minimum area in pixels for a well to be considered. 
                                 Default is 100.
+      method (str, optional): How rows and columns are assigned. 'sorted' orders the wells by 
+                            their bounding boxes and takes every `n_rows` wells as a column, 
+                            which assumes that no well is missing. 'grid' fits a lattice to the 
+                            well centres with `fit_plate_grid`, so that missing or merged wells 
+                            do not shift the other wells, and keeps the fit, including the empty 
+                            cells, in `grid_fit`. Wells outside of the fitted plate get a row and 
+                            column of None. Default is 'sorted'.
         
     Returns:
       dict: A dictionary where each key corresponds to an individual well, 
@@ -126,75 +170,48 @@ class PlateImage:
       The method processes the plate mask to identify and extract individual wells 
       based on area threshold.Wells are identified using bounding boxes derived from regionprops 
       analysis after clearing border artifacts. The returned dictionary is ordered by column 
-      unless the plate is inverted (in which case it orders by columns in reverse).
+      unless the plate is inverted (in which case it orders by columns in reverse). The images 
+      and masks of the wells are views of the plate arrays and of a single masked plate image.
+
+    Raises:
+      ValueError: If `method` is neither 'sorted' nor 'grid'.
     """
-    well_dict = {}
-    well_crops = []
-    lc_zip = []
-    for idx,well in enumerate(regionprops(label(clear_border(self.plate_mask)))
-    ):
-      if self.use_picks:
-        well_area = picks_area(well.image)
-      else:
-        well_area = well.area
-      if well_area >= min_area:
-        minr, minc, maxr, maxc = well.bbox
-        masked_img = self.plate_image ** self.plate_mask
-        well_crops.append(masked_img[minr:maxr, minc:maxc])
-        lc_zip.append((maxr,minc))
-        # minc, maxr make up the top right corner of the bounding box that
-        # encloses the well
-        # We order by minc and maxr together
-
-        well_dict[idx] = {}
-        well_dict[idx]['masked_img'] = masked_img[minr:maxr, minc:maxc]
-        well_dict[idx]['mask'] = self.plate_mask[minr:maxr, minc:maxc]
-        well_dict[idx]['img'] = self.plate_image[minr:maxr, minc:maxc]
-        well_dict[idx]['maxr'] = maxr
-        well_dict[idx]['minc'] = minc
-        well_dict[idx]['minr'] = minr
-        well_dict[idx]['maxc'] = maxc
-
-    l = lc_zip
-    if not self.inverted:
-      r_no = 0
-      c_no = 0
+    if method not in ('sorted', 'grid'):
+      raise ValueError(f"Unknown well position method {method}, expected 'sorted' or 'grid'")
+    indices, bboxes = self._detect_wells(min_area)
+    if method == 'grid':
+      centres = np.stack([bboxes[:, 0] + bboxes[:, 2], bboxes[:, 1] + bboxes[:, 3]], axis=-1)/2
+      self.grid_fit = fit_plate_grid(centres, self.n_rows, self.n_columns)
+    if len(bboxes) == 0:
+      return {}
+    masked_img = self._masked_image()
+    if method == 'grid':
+      nrow, ncol = self.grid_fit['nrow'], self.grid_fit['ncol']
+      if self.inverted:
+        ncol = np.where(ncol >= 0, self.n_columns - ncol, ncol)
+      nrow = [None if r < 0 else r for r in nrow.tolist()]
+      ncol = [None if c < 0 else c for c in ncol.tolist()]
     else:
-      r_no = 0
-      c_no = self.n_columns
-
-    while len(l)>0:
-      x_sorted = sorted(l, key=lambda tup: tup[1]) 
-      column = x_sorted[:self.n_rows]
-      y_sorted = sorted(column, key=lambda tup: tup[0])
-
-      if not self.inverted:
-        for (maxr,minc) in y_sorted:
-          temp  = [k for k,v in well_dict.items() if ((int(v['maxr'])
-          == maxr) and (int(v['minc']) == minc))]
-          well_dict[temp[0]]['nrow'] = r_no
-          well_dict[temp[0]]['ncol'] = c_no
-          r_no +=1
-
-        c_no +=1
-        r_no = 0
-      else:
-        for (maxr,minc) in y_sorted:
-          temp  = [k for k,v in well_dict.items() if ((int(v['maxr'])
-          == maxr) and (int(v['minc']) == minc))]
-          well_dict[temp[0]]['nrow'] = r_no
-          well_dict[temp[0]]['ncol'] = c_no
-          r_no +=1
-
-        c_no -=1
-        r_no = 0
-
-      l = x_sorted[self.n_rows:]
-
+      nrow, ncol = self._grid_positions(bboxes)
+      nrow, ncol = nrow.tolist(), ncol.tolist()
 
+    well_dict = {}
+    for (idx, (minr, minc, maxr, maxc), r_no, c_no) in zip(indices.tolist(), bboxes.tolist(),
+                                                            nrow, ncol):
+      well_dict[idx] = {
+        'masked_img': masked_img[minr:maxr, minc:maxc],
+        'mask': self.plate_mask[minr:maxr, minc:maxc],
+        'img': self.plate_image[minr:maxr, minc:maxc],
+        'maxr': maxr,
+        'minc': minc,
+        'minr': minr,
+        'maxc': maxc,
+        'nrow': r_no,
+        'ncol': c_no
+      }
     return well_dict
 
-  def plot_well_positions(self,save_path = None):
+  def plot_well_positions(self,save_path = None,show = True):
     """
     **plot_well_positions Method**
 
@@ -208,6 +225,8 @@ class PlateImage:
     Args:
       save_path (str, optional): File path where the plot image will be saved. If None (default), 
       the figure is shown but not saved.
+      show (bool, optional): Whether to display the plot. If False, the figure is closed after 
+      saving, e.g. for batch jobs without a display. Defaults to True.
 
     Returns:
       None
@@ -217,7 +236,10 @@ class PlateImage:
       
       >>> instance_of_plate.plot_well_positions(save_path='path/to/save/figure.png')
     """
-    _, ax = plt.subplots(figsize=(10, 6))
+    import matplotlib.patches as mpatches
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 6))
     ax.imshow(self.plate_mask, cmap='gray')
 
     well_dict = self.get_well_positions()
@@ -236,5 +258,8 @@ class PlateImage:
     plt.tight_layout()
     if save_path:
       plt.savefig(save_path,bbox_inches='tight', dpi=300)
-    plt.show()
+    if show:
+      plt.show()
+    else:
+      plt.close(fig)
     return
@@ -0,0 +1,244 @@
+import os
+from pathlib import Path
+import tempfile
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# column names and types of the stored tables, intensities are stored as float64 whatever the
+# image dtype so that the schema is the same for every plate
+_STRING = 'string'
+_INT = 'int64'
+_FLOAT = 'float64'
+_OBJECT_READOUT_COLUMNS = [
+    ('Area', _FLOAT), ('Centroid_1', _FLOAT), ('Centroid_2', _FLOAT),
+    ('MajorAxisLength', _FLOAT), ('MinorAxisLength', _FLOAT), ('Eccentricity', _FLOAT),
+    ('ConvexArea', _FLOAT), ('Roundness', _FLOAT), ('numberOfPeaks', _FLOAT),
+    ('numberOfNucleiInPlaque', _FLOAT), ('numberOfInfectedNucleiInPlaque', _FLOAT),
+    ('maxIntensityGFP', _FLOAT), ('totalIntensityGFP', _FLOAT), ('meanIntensityGFP', _FLOAT)
+]
+READOUT_TABLE_COLUMNS = {
+    'well': [
+        ('NucleiImageName', _STRING), ('VirusImageName', _STRING),
+        ('maxNucleiIntensity', _FLOAT), ('totalNucleiIntensity', _FLOAT),
+        ('meanNucleiIntensity', _FLOAT), ('numberOfNuclei', _INT),
+        ('maxVirusIntensity', _FLOAT), ('totalVirusIntensity', _FLOAT),
+        ('meanVirusIntensity', _FLOAT), ('numberOfPlaques', _INT),
+        ('numberOfInfectedNuclei', _INT)
+    ],
+    'object': [('wellRow', _STRING), ('wellColumn', _STRING)] + _OBJECT_READOUT_COLUMNS,
+    'plaque': [
+        ('wellIndex', _INT), ('NucleiImageName', _STRING), ('VirusImageName', _STRING),
+        ('wellRow', _STRING), ('wellColumn', _STRING), ('Label', _INT)
+    ] + [(name, _INT if name == 'numberOfPeaks' else dtype)
+         for (name, dtype) in _OBJECT_READOUT_COLUMNS]
+}
+
+
+def _to_arrow(df, columns):
+    """
+    **_to_arrow Function**
+    Converts a readout DataFrame into an Arrow table with the fixed column order and types of
+    `columns`.
+    """
+    missing = [name for (name, _) in columns if name not in df.columns]
+    if missing:
+        raise ValueError(f"Readout table is missing the columns {missing}")
+    arrays = []
+    for (name, dtype) in columns:
+        if dtype == _STRING:
+            arrays.append(pa.array([str(v) for v in df[name]], type=pa.string()))
+        else:
+            arrays.append(pa.array(np.asarray(df[name], dtype=dtype)))
+    return pa.Table.from_arrays(arrays, schema=pa.schema([(name, dtype)
+                                                          for (name, dtype) in columns]))
+
+
+class ReadoutStore:
+    """
+    **ReadoutStore Class**
+    The ReadoutStore class writes the readouts of `PlateReadout` into partitioned Parquet datasets
+    below a root directory, one per table: 'well' (well-level readouts), 'object' (object-level
+    means per well) and 'plaque' (one row per plaque object, see `PlateReadout.object_table`).
+    Each dataset is partitioned by experiment and plate as
+    `<root>/<table>/experiment=<experiment>/plate=<plate>/part-0.parquet`, with a fixed schema and
+    row group statistics, so plates can be added one at a time and queried across many plates
+    with filters that only read the matching partitions and row groups. Requires pyarrow, which
+    is installed with the 'parquet' extra.
+
+    Attributes:
+        root (str or Path, required): The directory of the store.
+
+        experiment (str, optional): The experiment partition that plates are written to.
+                    Defaults to 'default'.
+
+    Raises:
+        ImportError: If pyarrow is not available.
+    """
+    def __init__(self, root, experiment='default'):
+        if pa is None:
+            raise ImportError("Could not import pyarrow. The ReadoutStore requires pyarrow, "
+                              "install it with the 'parquet' extra of PyPlaque.")
+        self.root = Path(root)
+        self.experiment = str(experiment)
+
+    def _partition(self, table, plate, experiment=None):
+        """
+        **_partition Method**
+        Returns the directory of the partition of a plate.
+        """
+        experiment = self.experiment if experiment is None else str(experiment)
+        return (self.root / table / f"experiment={quote(experiment, safe='')}" /
+                f"plate={quote(str(plate), safe='')}")
+
+    def write_plate(self,
+                    plate,
+                    abs_df_well=None,
+                    abs_df_object=None,
+                    object_table=None,
+                    row_group_size=None):
+        """
+        **write_plate Method**
+        Writes the readout tables of one plate into their partitions. A plate that is already in
+        the store is replaced. Each file is written to a temporary file and renamed, so readers
+        never see a partially written plate.
+
+        Args:
+            plate (str, required): The name of the plate partition.
+            abs_df_well (pd.DataFrame, optional): The well-level readouts. Defaults to None.
+            abs_df_object (pd.DataFrame, optional): The object-level means per well.
+                                                Defaults to None.
+            object_table (pd.DataFrame, optional): The readouts of every plaque object.
+                                                Defaults to None.
+            row_group_size (int, optional): The maximum number of rows per row group. Defaults to
+                                            None, which uses the pyarrow default.
+
+        Returns:
+            list: The paths of the written files.
+
+        Raises:
+            ValueError: If a table lacks columns of its schema.
+        """
+        written = []
+        for (table, df) in (('well', abs_df_well), ('object', abs_df_object),
+                            ('plaque', object_table)):
+            if df is None:
+                continue
+            arrow_table = _to_arrow(df, READOUT_TABLE_COLUMNS[table])
+            partition = self._partition(table, plate)
+            partition.mkdir(parents=True, exist_ok=True)
+            path = partition / "part-0.parquet"
+            fd, tmp_path = tempfile.mkstemp(dir=partition, suffix=".parquet.tmp")
+            os.close(fd)
+            try:
+                pq.write_table(arrow_table, tmp_path, row_group_size=row_group_size,
+                               write_statistics=True)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            written.append(path)
+        return written
+
+    def write_readouts(self, plate_readout, plate=None, row_group_size=None, **kwargs):
+        """
+        **write_readouts Method**
+        Generates the readouts of a `PlateReadout` and writes them with `write_plate`. The
+        per-plaque table is written as well if the readouts are generated in a single pass.
+
+        Args:
+            plate_readout (PlateReadout, required): The plate readout to generate and store.
+            plate (str, optional): The name of the plate partition. Defaults to None, which uses
+                                the plate directory name of the experiment.
+            row_group_size (int, optional): The maximum number of rows per row group.
+                                            Defaults to None.
+            **kwargs: Keyword arguments of `PlateReadout.generate_readouts_dataframe`, e.g.
+                    `wells`.
+
+        Returns:
+            list: The paths of the written files.
+        """
+        if plate is None:
+            plate = plate_readout.experiment.plate_indiv_dir[plate_readout.plate_id]
+        result = plate_readout.generate_readouts_dataframe(**kwargs)
+        tables = {}
+        if plate_readout.well_level_readouts and plate_readout.object_level_readouts:
+            tables['abs_df_well'], tables['abs_df_object'] = result
+        elif plate_readout.well_level_readouts:
+            tables['abs_df_well'] = result
+        else:
+            tables['abs_df_object'] = result
+        if plate_readout.object_level_readouts and kwargs.get('single_pass', True):
+            tables['object_table'] = plate_readout.object_table
+        return self.write_plate(str(plate), row_group_size=row_group_size, **tables)
+
+    def plates(self, table='well', experiment=None):
+        """
+        **plates Method**
+        Returns the names of the plates stored for an experiment, e.g. to skip plates that were
+        written by an earlier run.
+
+        Args:
+            table (str, optional): The table to look in. Defaults to 'well'.
+            experiment (str, optional): The experiment. Defaults to None, which uses the
+                                        experiment of the store.
+
+        Returns:
+            list: The sorted plate names.
+        """
+        experiment_dir = self._partition(table, '', experiment).parent
+        if not experiment_dir.is_dir():
+            return []
+        return sorted(unquote(p.name[len('plate='):]) for p in experiment_dir.iterdir()
+                      if p.name.startswith('plate=') and (p / "part-0.parquet").exists())
+
+    def dataset(self, table='well'):
+        """
+        **dataset Method**
+        Opens a stored table of all experiments and plates as a pyarrow dataset, with the
+        'experiment' and 'plate' partition columns.
+
+        Args:
+            table (str, optional): One of 'well', 'object' and 'plaque'. Defaults to 'well'.
+
+        Returns:
+            pyarrow.dataset.Dataset: The dataset.
+
+        Raises:
+            ValueError: If the table name is unknown.
+        """
+        if table not in READOUT_TABLE_COLUMNS:
+            raise ValueError(f"Unknown readout table {table}, expected one of "
+                             f"{list(READOUT_TABLE_COLUMNS)}")
+        partitioning = ds.partitioning(pa.schema([('experiment', pa.string()),
+                                                  ('plate', pa.string())]), flavor='hive')
+        return ds.dataset(self.root / table, format='parquet', partitioning=partitioning)
+
+    def read(self, table='well', columns=None, filter=None):
+        """
+        **read Method**
+        Reads a stored table into a DataFrame. Only the partitions and row groups that can match
+        `filter` are read, e.g.
+
+        ```
+        store.read('plaque', filter=(pc.field('plate') == 'P1') & (pc.field('Area') > 500))
+        ```
+
+        with `import pyarrow.compute as pc`.
+
+        Args:
+            table (str, optional): One of 'well', 'object' and 'plaque'. Defaults to 'well'.
+            columns (list, optional): The columns to read. Defaults to None, which reads all.
+            filter (pyarrow.compute.Expression, optional): A row filter. Defaults to None.
+
+        Returns:
+            pd.DataFrame: The matching rows.
+        """
+        return self.dataset(table).to_table(columns=columns, filter=filter).to_pandas()
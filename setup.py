@@ -41,8 +41,12 @@ setup(
           'tqdm>=4.66.4',
           'tifffile>=2023.2.28'
       ],
+  entry_points={
+          'console_scripts': ['pyplaque=PyPlaque.cli:main']
+      },
   extras_require={
-          'test': ['pytest>=8.1.1']
+          'test': ['pytest>=8.1.1'],
+          'parquet': ['pyarrow>=14.0.0']
       },
   classifiers=[
      'Development Status :: 3 - Alpha',
@@ -0,0 +1,112 @@
+import json
+
+import numpy as np
+
+from PyPlaque.bench import benchmark_preview, compare_benchmarks, make_fluorescence_plate
+from PyPlaque.bench import run_benchmarks
+from PyPlaque.bench import synthetic_crystal_violet_well, synthetic_fluorescence_well, well_names
+
+
+def test_synthetic_wells():
+    """
+    **test_synthetic_wells Function**
+    This test checks that the synthetic well generators are reproducible for a given seed and 
+    return images of the requested size and type.
+
+    Args:
+
+    Returns:
+        None
+    """
+    nuclei_image, virus_image, plaques = synthetic_fluorescence_well(image_size=128, 
+                                                                     plaque_radius=(5, 15), seed=3)
+    assert nuclei_image.shape == virus_image.shape == (128, 128)
+    assert nuclei_image.dtype == virus_image.dtype == np.uint16
+    again = synthetic_fluorescence_well(image_size=128, plaque_radius=(5, 15), seed=3)
+    assert np.array_equal(virus_image, again[1]) and plaques == again[2]
+    assert all(5 <= radius <= 15 for _, _, radius in plaques)
+
+    image, plaques = synthetic_crystal_violet_well(image_size=64, seed=1)
+    assert image.shape == (64, 64) and image.dtype == np.uint8
+    assert np.array_equal(image, synthetic_crystal_violet_well(image_size=64, seed=1)[0])
+    assert well_names(14)[-3:] == ['A12', 'B01', 'B02']
+
+
+def test_run_benchmarks(tmp_path):
+    """
+    **test_run_benchmarks Function**
+    This test runs both benchmarks on tiny synthetic plates and checks that every stage is timed, 
+    that the fluorescence pipeline finds plaques, that the results are written as JSON and that a 
+    clearly slower run is reported as a regression.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+
+    Returns:
+        None
+    """
+    image_folder, _, ground_truth = make_fluorescence_plate(tmp_path / 'plate', n_wells=2, 
+                                                            image_size=64)
+    assert sorted(ground_truth) == ['A01', 'A02']
+    assert len(list((tmp_path / 'plate' / 'images' / 'plate1').glob('*.tif'))) == 4
+
+    output = tmp_path / 'bench.json'
+    results = run_benchmarks(output=output, repeats=2,
+                             fluorescence_kwargs={'n_wells': 2, 'image_size': 96,
+                                                  'plaque_radius': (5, 15)},
+                             crystal_violet_kwargs={'n_wells': 2, 'image_size': 96})
+    with open(output) as f:
+        assert json.load(f)['suites'] == results['suites']
+    assert set(results['suites']['fluorescence']) == {'load', 'artifact_removal', 
+                                                      'background_removal', 'segmentation', 
+                                                      'readouts', 'total'}
+    assert set(results['suites']['crystal_violet']) == {'load', 'segmentation', 'readouts', 
+                                                        'total'}
+    assert len(results['suites']['fluorescence']['total']['times']) == 2
+    assert len(results['plaque_counts']['fluorescence']) == 2
+    assert sum(results['plaque_counts']['fluorescence']) > 0, "No plaques found in the benchmark"
+    assert len(results['plaque_counts']['crystal_violet']) == 2
+
+    assert compare_benchmarks(output, results) == []
+    slower = json.loads(json.dumps(results))
+    slower['suites']['fluorescence']['segmentation']['median'] *= 2
+    regressions = compare_benchmarks(results, slower)
+    assert [(r['suite'], r['stage']) for r in regressions] == [('fluorescence', 'segmentation')]
+
+
+def test_benchmark_preview(tmp_path):
+    """
+    **test_benchmark_preview Function**
+    This test compares the preview mode with full resolution and with the synthetic ground truth 
+    on tiny plates, and checks that the counts agree and that the results are standard JSON.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+
+    Returns:
+        None
+    """
+    result = benchmark_preview(tmp_path / 'fluorescence', factor=2, n_wells=4, repeats=1, 
+                               image_size=128, plaque_radius=(5, 15))
+    assert result['factor'] == 2 and result['full_time'] > 0 and result['preview_time'] > 0
+    assert len(result['full_counts']) == len(result['preview_counts']) == 4
+    assert sum(result['ground_truth_counts']) > 0 and sum(result['full_counts']) > 0
+    assert result['agreement']['exact'] >= 0.75 and result['agreement']['correlation'] > 0.9
+    for counts in ('full', 'preview'):
+        agreement = result['ground_truth_agreement'][counts]
+        assert agreement['relative_error'] <= 0.25 and agreement['correlation'] > 0.9
+
+    output = tmp_path / 'bench.json'
+    results = run_benchmarks(suites=('crystal_violet',), output=output, folder=tmp_path / 'bench', 
+                             repeats=1, crystal_violet_kwargs={'n_wells': 3, 'image_size': 96}, 
+                             preview_factor=2)
+    assert results['config']['preview_factor'] == 2
+    preview = results['preview']['crystal_violet']
+    assert len(preview['full_counts']) == len(preview['ground_truth_counts']) == 3
+    assert preview['speedup'] == preview['full_time'] / preview['preview_time']
+    assert preview['agreement']['relative_error'] <= 0.5
+
+    def non_standard(constant):
+        raise ValueError(f"{constant} is not standard JSON")
+    with open(output) as f:
+        assert json.load(f, parse_constant=non_standard)['preview'] == results['preview']
@@ -0,0 +1,145 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from PyPlaque.bench import make_crystal_violet_plate, make_fluorescence_plate
+from PyPlaque import cli
+from PyPlaque.experiment import CrystalViolet
+
+
+@pytest.fixture()
+def run_config(tmp_path):
+    """
+    **run_config Function**
+    This fixture writes three small synthetic fluorescence plates and returns the JSON 
+    configuration of a batch run over them.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+
+    Returns:
+        pathlib.Path: The configuration file.
+    """
+    for plate in ['P1', 'P2', 'P3']:
+        image_folder, mask_folder, _ = make_fluorescence_plate(tmp_path / 'exp', n_wells=2, 
+                                                               plate_name=plate, image_size=96, 
+                                                               plaque_radius=(5, 15))
+    config = {
+        'plate_folder': image_folder,
+        'plate_mask_folder': mask_folder,
+        'output': str(tmp_path / 'results'),
+        'prefetch': 0,
+        'params': {
+            'nuclei': {'correction_ball_radius': 10},
+            'virus': {'min_plaque_area': 20, 'plaque_gaussian_filter_size': 10, 
+                      'plaque_gaussian_filter_sigma': 5, 'peak_region_size': 5, 
+                      'correction_ball_radius': 10}
+        }
+    }
+    with open(tmp_path / 'config.json', 'w') as f:
+        json.dump(config, f)
+    return tmp_path / 'config.json'
+
+
+def test_run_resume(run_config, monkeypatch):
+    """
+    **test_run_resume Function**
+    This test checks that a batch run writes the readout tables of every plate, that shards split 
+    the plates, and that an interrupted run resumes without processing completed wells again.
+
+    Args:
+        run_config (pathlib.Path): The fixture with the run configuration.
+        monkeypatch (pytest.MonkeyPatch): The pytest fixture used to interrupt a run.
+
+    Returns:
+        None
+    """
+    results = run_config.parent / 'results'
+    summary = cli.run(run_config, shard=1, num_shards=2)
+    assert summary == {'plates': 1, 'skipped_plates': 0, 'wells': 2, 'skipped_wells': 0}
+    well_df = pd.read_csv(results / 'P2' / 'well_readouts.csv')
+    assert list(well_df['VirusImageName']) == ['P2_A01_s1_w2.tif', 'P2_A02_s1_w2.tif']
+    object_df = pd.read_csv(results / 'P2' / 'object_readouts.csv', dtype={'wellColumn': str})
+    assert list(object_df['wellColumn']) == ['01', '02']
+
+    def interrupt(plate_dir, well_names):
+        raise RuntimeError("interrupted")
+
+    # the wells of P1 are completed, but the run stops before the plate is
+    monkeypatch.setattr(cli, '_write_plate_tables', interrupt)
+    with pytest.raises(RuntimeError):
+        cli.run(run_config)
+    monkeypatch.undo()
+
+    assert cli.main(['run', str(run_config)]) == 0
+    manifest = cli.RunManifest(results)
+    assert manifest.plates == {'P1', 'P2', 'P3'}
+    assert manifest.done_wells('P1') == {'P1_A01_s1_w2.tif', 'P1_A02_s1_w2.tif'}
+    assert cli.run(run_config) == {'plates': 0, 'skipped_plates': 3, 'wells': 0, 
+                                   'skipped_wells': 0}
+    assert len(pd.read_csv(results / 'P1' / 'well_readouts.csv')) == 2
+
+    # forced runs process completed wells again instead of reusing their results
+    (results / 'P1' / 'wells' / 'P1_A01_s1_w2.tif.json').unlink()
+    summary = cli.run(run_config, processes=2, force=True)
+    assert (results / 'P1' / 'wells' / 'P1_A01_s1_w2.tif.json').exists()
+    assert summary == {'plates': 3, 'skipped_plates': 0, 'wells': 6, 'skipped_wells': 0}
+    with pytest.raises(ValueError):
+        cli.load_run_config({'plate_folder': 'a', 'plate_mask_folder': 'b'})
+
+
+def test_run_crystal_violet(tmp_path, monkeypatch):
+    """
+    **test_run_crystal_violet Function**
+    This test checks that a batch run of crystal violet plates, with masks generated from the 
+    images, writes the plaque counts of every well and that an interrupted run resumes without 
+    processing completed wells again.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+        monkeypatch (pytest.MonkeyPatch): The pytest fixture used to interrupt a run and record 
+                                          the generated masks.
+
+    Returns:
+        None
+    """
+    for plate in ['P1', 'P2']:
+        image_folder, mask_folder, _ = make_crystal_violet_plate(tmp_path / 'exp', n_wells=3, 
+                                                                 plate_name=plate, image_size=96)
+    config = {'experiment': 'crystal_violet', 'plate_folder': image_folder, 
+              'plate_mask_folder': mask_folder, 'output': str(tmp_path / 'results')}
+    results = tmp_path / 'results'
+    write_json = cli._write_json
+
+    def interrupt(path, data):
+        if path == results / 'P2' / 'wells' / 'A03.png.json':
+            raise RuntimeError("interrupted")
+        write_json(path, data)
+
+    # P1 is completed and the run stops at the last well of P2
+    monkeypatch.setattr(cli, '_write_json', interrupt)
+    with pytest.raises(RuntimeError):
+        cli.run(config)
+    monkeypatch.undo()
+    assert cli.RunManifest(results).done_wells('P2') == {'A01.png', 'A02.png'}
+
+    masks = []
+    get_runtime_mask = CrystalViolet.get_runtime_mask
+    def record_mask(exp, name, img, *args, **kwargs):
+        masks.append(Path(img).name)
+        return get_runtime_mask(exp, name, img, *args, **kwargs)
+    monkeypatch.setattr(CrystalViolet, 'get_runtime_mask', record_mask)
+    assert cli.run(config) == {'plates': 1, 'skipped_plates': 1, 'wells': 1, 'skipped_wells': 2}
+    assert masks == ['A03.png'], "Completed wells were processed again"
+    monkeypatch.undo()
+
+    exp = CrystalViolet(image_folder, mask_folder)
+    exp.get_individual_plates()
+    for (plate_id, plate) in enumerate(exp.plate_indiv_dir):
+        exp.load_well_images_and_masks_for_plate(plate_id, read_mask=False, all_grayscale=True)
+        well_df = pd.read_csv(results / plate / 'well_readouts.csv')
+        assert list(well_df['ImageName']) == ['A01.png', 'A02.png', 'A03.png']
+        assert list(well_df['numberOfPlaques']) == exp.get_plaque_counts(plate_id)
+        assert well_df['numberOfPlaques'].sum() > 0
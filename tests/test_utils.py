@@ -1,10 +1,31 @@
+import importlib
+import os
+import subprocess
+import sys
+import time
+import types
+
+import cv2
 import numpy as np
-from skimage import filters
+from skimage import feature, filters, measure
 import pytest
+import tifffile
 
+from PyPlaque.phenotypes import Plaque, PlaqueCollection
+from PyPlaque.specimen import measure_plaques, PlaquesMask
 from PyPlaque.utils import remove_artifacts, remove_background
 from PyPlaque.utils import centroid, check_numbers, fixed_threshold
-from PyPlaque.utils import get_plaque_mask
+from PyPlaque.utils import gaussian_blur, get_all_plaque_regions, get_plaque_mask, parallel_map
+from PyPlaque.utils import picks_area, picks_area_labels, picks_perimeter, picks_perimeter_labels
+from PyPlaque.utils import pack_plate_stack, PlateManifest, PlateStack, StageCache
+from PyPlaque.utils import fit_plate_grid, PLATE_FORMATS
+from PyPlaque.utils import combine_img_blocks, stitch_wells
+from PyPlaque.utils import build_image_pyramid, ImagePyramid
+from PyPlaque.utils import count_agreement, read_preview, reduce_image, scale_params
+from PyPlaque.utils import CallbackSink, increment_counter, instrument, instrumentation_enabled
+from PyPlaque.utils import JSONLinesSink, MemorySink, stage_timer
+from PyPlaque.utils import qc_panel, render_qc_report
+from PyPlaque.view import contour_eccentricity as view_eccentricity
 
 @pytest.fixture()
 def utils_remove_artifacts_input():
@@ -317,3 +338,781 @@ def test_remove_background():
     # Add assertion to check that the background is correctly subtracted
     assert np.allclose(IMG, background + foreground), "Background subtraction is incorrect"
 
+
+def test_parallel_map(capsys):
+    """
+    **test_parallel_map Function**
+    This function tests that parallel_map returns the results in the order of the inputs, whether 
+    the items are processed serially, in a thread pool or in a process pool, and that it shows a 
+    progress bar only if asked to.
+    
+    Args:
+        capsys (pytest.CaptureFixture): Fixture capturing the output of the progress bars.
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    ITEMS = list(range(-20, 20))
+    EXPECTED = [abs(i) for i in ITEMS]
+
+    assert parallel_map(abs, ITEMS) == EXPECTED, "Serial results are incorrect"
+    assert parallel_map(abs, ITEMS, workers=4) == EXPECTED, "Thread pool changed the order"
+    assert parallel_map(abs, ITEMS, workers=2, 
+                        use_processes=True) == EXPECTED, "Process pool changed the order"
+    assert capsys.readouterr().err, "No progress bar was shown"
+
+    assert parallel_map(abs, ITEMS, progress=False) == EXPECTED
+    assert parallel_map(abs, ITEMS, workers=4, progress=False) == EXPECTED
+    assert not capsys.readouterr().err, "A progress bar was shown with progress=False"
+
+
+def test_picks_labels():
+    """
+    **test_picks_labels Function**
+    This function tests that picks_area_labels and picks_perimeter_labels give exactly the values 
+    of picks_area and picks_perimeter on the bounding box image of every label, including labels 
+    that touch each other and the image border.
+    
+    Args:
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    rng = np.random.default_rng(0)
+    LABEL_IMAGES = [measure.label(rng.random((60, 60)) < 0.45),
+                    rng.integers(0, 5, size=(40, 40))]
+
+    for label_image in LABEL_IMAGES:
+        props = measure.regionprops(label_image)
+        for neighbourhood in (4, 8):
+            areas = [picks_area(prop.image, neighbourhood) for prop in props]
+            perimeters = [picks_perimeter(prop.image, neighbourhood) for prop in props]
+            assert np.array_equal(picks_area_labels(label_image, neighbourhood=neighbourhood),
+                                  areas), "Pick's areas are incorrect"
+            assert np.array_equal(picks_perimeter_labels(label_image, neighbourhood=neighbourhood),
+                                  perimeters), "Pick's perimeters are incorrect"
+
+    LABELS = [props[2].label, 1000]
+    assert np.array_equal(picks_area_labels(label_image, LABELS, neighbourhood),
+                          [areas[2], 0]), \
+        "Requested labels are incorrect"
+
+
+def test_gaussian_blur_peaks():
+    """
+    **test_gaussian_blur_peaks Function**
+    This function tests that the fast gaussian_blur methods find the same number of peaks as the 
+    exact blur on a synthetic plaque region, each within the requested tolerance of an exact peak.
+    
+    Args:
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    SIGMA, TRUNCATE, TOLERANCE = 40, 2, 2
+    # the recursive blur is not truncated, so neighbouring plaques shift its peaks a little more
+    IIR_TOLERANCE = 0.15*SIGMA
+    # a tolerance above the estimated displacement of the recursive blur, so that it is used
+    IIR_ACCEPTED = 10
+    yy, xx = np.mgrid[:400, :500]
+    IMG = np.zeros((400, 500))
+    for (y, x, r) in [(100, 100, 30), (300, 150, 40), (200, 380, 50)]:
+        IMG += 5000*np.exp(-((yy - y)**2 + (xx - x)**2)/(2*r**2))
+    IMG = IMG.astype(np.uint16)
+
+    exact = gaussian_blur(IMG, SIGMA, TRUNCATE)
+    assert np.allclose(exact, filters.gaussian(IMG, sigma=SIGMA, truncate=TRUNCATE))
+    exact_peaks = feature.peak_local_max(exact, min_distance=20, exclude_border=False)
+
+    for method in ('fft', 'pyramid', 'iir'):
+        blurred = gaussian_blur(IMG, SIGMA, TRUNCATE, method=method, 
+                                tolerance=IIR_ACCEPTED if method == 'iir' else TOLERANCE)
+        assert blurred.shape == IMG.shape, f"{method} blur changed the shape"
+        peaks = feature.peak_local_max(blurred, min_distance=20, exclude_border=False)
+        assert len(peaks) == len(exact_peaks), f"{method} blur found a different number of peaks"
+        for peak in peaks:
+            assert np.min(np.linalg.norm(exact_peaks - peak, axis=1)) <= \
+                (IIR_TOLERANCE if method == 'iir' else TOLERANCE), \
+                f"{method} blur moved a peak by more than the tolerance"
+
+    # the recursive blur is replaced by the FFT blur when it cannot meet the tolerance
+    fft = gaussian_blur(IMG, SIGMA, TRUNCATE, method='fft')
+    assert not np.allclose(gaussian_blur(IMG, SIGMA, TRUNCATE, method='iir', 
+                                         tolerance=IIR_ACCEPTED), fft)
+    sink = MemorySink()
+    with instrument(sink), pytest.warns(RuntimeWarning, match="fft"):
+        fallback = gaussian_blur(IMG, SIGMA, TRUNCATE, method='iir', tolerance=TOLERANCE)
+    assert np.array_equal(fallback, fft)
+    assert sink.counters['iir_fallbacks'] == 1
+
+    with pytest.raises(ValueError):
+        gaussian_blur(IMG, SIGMA, method='box')
+
+
+def test_remove_background_methods():
+    """
+    **test_remove_background_methods Function**
+    This function tests that the 'decomposed' method of remove_background gives exactly the 
+    'opencv' result and that the 'downsampled' background stays below the image and close to the 
+    exact background on a smooth synthetic background with small bright objects.
+    
+    Args:
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    rng = np.random.default_rng(0)
+    for (shape, radius) in [((60, 45), 7), ((30, 80), 25), ((1, 20), 3)]:
+        IMG = rng.integers(0, 65535, size=shape, dtype=np.uint16)
+        background, foreground = remove_background(IMG, radius)
+        background_dec, foreground_dec = remove_background(IMG, radius, method='decomposed')
+        assert np.array_equal(background, background_dec), "Decomposed background is incorrect"
+        assert np.array_equal(foreground, foreground_dec), "Decomposed foreground is incorrect"
+
+    yy, xx = np.mgrid[:300, :300]
+    IMG = 3000 + 1000*np.sin(xx/100)*np.cos(yy/80) + rng.normal(0, 50, (300, 300))
+    IMG[(yy % 40 < 6) & (xx % 40 < 6)] += 6000
+    IMG = IMG.astype(np.uint16)
+    background, _ = remove_background(IMG, 30)
+    background_down, foreground_down = remove_background(IMG, 30, method='downsampled')
+    assert np.all(background_down <= IMG), "Downsampled background exceeds the image"
+    assert np.allclose(IMG, background_down + foreground_down)
+    assert np.abs(background_down.astype(float) - background).max() < 300, \
+        "Downsampled background is too far from the exact background"
+
+    with pytest.raises(ValueError):
+        remove_background(IMG, 30, method='rolling_ball')
+
+
+def test_stage_cache(tmp_path):
+    """
+    **test_stage_cache Function**
+    This function tests that the StageCache stores and returns arrays and None values, computes a 
+    stage only once per source and parameters, keys files by their modification and evicts the 
+    least recently used entries when it grows beyond its size limit.
+    
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    cache = StageCache(tmp_path / "cache")
+    IMG = np.arange(100, dtype=np.uint16).reshape(10, 10)
+    calls = []
+    def compute():
+        calls.append(1)
+        return {'mask': IMG > 50, 'peaks': None}
+
+    first = cache.cached(IMG, 'stage', {'threshold': 50}, compute)
+    second = cache.cached(IMG.copy(), 'stage', {'threshold': 50}, compute)
+    assert len(calls) == 1, "Cached stage was computed again"
+    assert np.array_equal(first['mask'], second['mask']) and second['peaks'] is None
+    cache.cached(IMG, 'stage', {'threshold': 60}, compute)
+    cache.cached(IMG + 1, 'stage', {'threshold': 50}, compute)
+    assert len(calls) == 3, "Changed source or parameters did not miss the cache"
+
+    path = tmp_path / "image.npy"
+    np.save(path, IMG)
+    key = cache.key(path, 'stage')
+    assert key == cache.key(str(path), 'stage')
+    np.save(path, IMG[:5])
+    assert key != cache.key(path, 'stage'), "Modified file kept its key"
+
+    cache = StageCache(tmp_path / "small_cache", max_bytes=1)
+    cache.put('stage', 'a', {'image': IMG})
+    cache.put('stage', 'b', {'image': IMG})
+    assert cache.get('stage', 'a') is None and cache.get('stage', 'b') is None
+    cache.max_bytes = 10**6
+    for (i, name) in enumerate('abc'):
+        cache.put('stage', name, {'image': IMG})
+        os.utime(cache.cache_dir / 'stage' / (name + '.npz'), ns=(i, i))
+    cache.get('stage', 'a')
+    # writes below the size limit do not scan the cache directory
+    scans = []
+    entries = cache.entries
+    cache.entries = lambda: scans.append(1) or entries()
+    cache.put('stage', 'c', {'image': IMG})
+    os.utime(cache.cache_dir / 'stage' / 'c.npz', ns=(2, 2))
+    assert scans == []
+    del cache.entries
+    cache.max_bytes = cache.total_bytes() - 1
+    assert cache.evict() == 1
+    assert cache.get('stage', 'a') is not None and cache.get('stage', 'b') is None
+    cache.clear()
+    assert cache.total_bytes() == 0
+
+    with pytest.raises(TypeError):
+        StageCache(1)
+    with pytest.raises(ValueError):
+        StageCache(tmp_path, max_bytes=0)
+
+
+def test_plate_stack(tmp_path):
+    """
+    **test_plate_stack Function**
+    This function tests that a packed plate stack returns the packed images by name and position as 
+    read-only views, detects source files changed after or while they were packed and rejects 
+    images of different shapes.
+    
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    rng = np.random.default_rng(0)
+    IMGS = [rng.integers(0, 65535, size=(20, 30), dtype=np.uint16) for _ in range(3)]
+    files = []
+    for (i, img) in enumerate(IMGS):
+        files.append(tmp_path / f"A0{i}_w1.npy")
+        np.save(files[-1], img)
+
+    packed = pack_plate_stack(files, tmp_path / "stacks" / "plate", np.load, workers=2)
+    stack = PlateStack(tmp_path / "stacks" / "plate.npy")
+    assert len(stack) == len(packed) == 3 and "A01_w1.npy" in stack
+    for (i, img) in enumerate(IMGS):
+        assert np.array_equal(stack[i], img)
+        assert np.array_equal(stack[files[i].name], img)
+        assert stack.is_current(files[i].name, files[i])
+    assert not stack["A00_w1.npy"].flags.writeable
+
+    np.save(files[0], IMGS[0][:10])
+    assert not stack.is_current(files[0].name, files[0]), "Changed file is still current"
+    with pytest.raises(ValueError):
+        pack_plate_stack(files, tmp_path / "stacks" / "plate2", np.load)
+    assert not (tmp_path / "stacks" / "plate2.npy").exists()
+
+    def rewriting_reader(f):
+        img = np.load(f)
+        if f == files[2]:
+            np.save(f, np.vstack([img, img]))
+        return img
+
+    stack = pack_plate_stack(files[1:], tmp_path / "stacks" / "plate3", rewriting_reader)
+    assert stack.is_current(files[1].name, files[1])
+    assert not stack.is_current(files[2].name, files[2]), "File changed while packing is current"
+
+
+def test_stitch_wells(tmp_path):
+    """
+    **test_stitch_wells Function**
+    This function tests that wells are stitched row by row in their source data type, from a list 
+    or a generator and into a memmap, and that missing wells or wells of other shapes are rejected.
+    
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    rng = np.random.default_rng(0)
+    WELLS = [rng.integers(0, 65535, size=(1, 20, 30), dtype=np.uint16) for _ in range(6)]
+    expected = np.block([[np.squeeze(w) for w in WELLS[:3]], [np.squeeze(w) for w in WELLS[3:]]])
+
+    stitched = stitch_wells(WELLS, 2, 3)
+    assert stitched.dtype == np.uint16 and np.array_equal(stitched, expected)
+    combined = combine_img_blocks(WELLS, 2, 3)
+    assert combined.dtype == np.float32 and np.array_equal(combined, expected)
+
+    stitched = stitch_wells((w for w in WELLS), 2, 3, out=tmp_path / "mosaic.npy")
+    assert isinstance(stitched, np.memmap) and np.array_equal(stitched, expected)
+    assert np.array_equal(np.load(tmp_path / "mosaic.npy"), expected)
+
+    # rows of different heights from a list
+    rows = [np.ones((5, 4)), np.ones((5, 6)), np.zeros((3, 4)), np.zeros((3, 6))]
+    stitched = stitch_wells(rows, 2, 2)
+    assert stitched.shape == (8, 10) and stitched[:5].all() and not stitched[5:].any()
+    with pytest.raises(ValueError):
+        stitch_wells(rows[:2] + [np.zeros((3, 6)), np.zeros((3, 6))], 2, 2)
+
+    with pytest.raises(ValueError):
+        stitch_wells((w for w in WELLS[:5]), 2, 3)
+    with pytest.raises(ValueError):
+        stitch_wells(WELLS[:5], 2, 3)
+    with pytest.raises(ValueError):
+        stitch_wells(iter(WELLS[:3] + [np.ones((20, 20))] + WELLS[4:]), 2, 3)
+
+
+def test_image_pyramid(tmp_path):
+    """
+    **test_image_pyramid Function**
+    This function tests that a pyramid of a mosaic file halves the image per level in its data 
+    type, reads regions across chunks, picks the coarsest level that fits a target and counts 
+    bright regions on a coarse level like at full resolution.
+    
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    rng = np.random.default_rng(0)
+    IMG = rng.integers(0, 1000, size=(301, 450), dtype=np.uint16)
+    for (r, c) in [(40, 40), (40, 200), (150, 100), (250, 380)]:
+        IMG[r - 12:r + 12, c - 12:c + 12] = 60000
+    np.save(tmp_path / "mosaic.npy", IMG)
+
+    pyramid = build_image_pyramid(tmp_path / "mosaic.npy", min_size=64, chunk_size=32)
+    assert pyramid.path == tmp_path / "mosaic.pyramid" and pyramid.levels == [0, 1, 2, 3]
+    assert pyramid.level_shape(1) == (151, 225) and pyramid.level_shape(3) == (38, 57)
+    level = pyramid.read(1)
+    assert level.dtype == np.uint16
+    assert level[0, 0] == np.rint(IMG[:2, :2].mean()) and level[-1, 0] == np.rint(IMG[-1, :2].mean())
+    assert np.array_equal(pyramid.read(1, (20, 30, 70, 100)), level[20:70, 30:100])
+    assert np.array_equal(ImagePyramid(pyramid.path).read(0), IMG)
+
+    assert pyramid.select_level(50) == 3 and pyramid.select_level((70, 100)) == 2
+    assert pyramid.select_level(1000) == 0
+    assert pyramid.thumbnail(40).shape == (27, 40)
+    assert pyramid.quick_count(0.5, 1, 400, min_pixels=20) == (4, 2)
+    assert pyramid.quick_count(0.5, 1, 400, min_pixels=1000) == (4, 0)
+
+    panel = qc_panel(pyramid, downsample=4)
+    assert panel['image'].shape == (75, 112)
+    with pytest.raises(ValueError):
+        build_image_pyramid(IMG, min_size=64)
+
+
+def test_plate_manifest(tmp_path, monkeypatch):
+    """
+    **test_plate_manifest Function**
+    This function tests that the plate manifest parses well, site and channel of the files of a 
+    plate folder, pairs channels by well instead of by position, reuses its disk cache until the 
+    folder changes and rescans only modified folders.
+    
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+        monkeypatch (pytest.MonkeyPatch): Fixture to patch attributes.
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    plate = tmp_path / "plate"
+    (plate / "2020-06-03").mkdir(parents=True)
+    for name in ["P1_A01_s1_w1.tif", "P1_A01_s1_w2.tif", "P1_A02_s1_w2.tif", "P1_B01_s2_w1.tif",
+                 "P1_B01_s2_w2.tif", "2020-06-03/P1_AA12_s1_w1.tif", "2020-06-03/P1_AA12_s1_w2.tif",
+                 "thumbs.tif", "P1_A01_s1_w1.txt"]:
+        (plate / name).write_bytes(b"0")
+
+    manifest = PlateManifest(plate, cache_path=tmp_path / "manifest.json")
+    assert len(manifest) == 8 and len(manifest.files('w2')) == 4
+    assert manifest.get('B', '01', 'w2', site=2) == plate / "P1_B01_s2_w2.tif"
+    assert manifest.get('B', '01', 'w2') is None
+    assert manifest.lookup("P1_AA12_s1_w1.tif")['row'] == 'AA'
+    assert manifest.lookup(plate / "thumbs.tif")['site'] == -1
+    pairs = manifest.pairs(('w1', 'w2'))
+    assert [(p['row'], p['column'], p['site']) for p in pairs] == [('A', '01', 1), ('B', '01', 2),
+                                                                    ('AA', '12', 1)]
+    assert all(p['w1'].name.replace('w1', 'w2') == p['w2'].name for p in pairs)
+    assert manifest.incomplete() == [('A', '02', 1)]
+
+    def scan(self):
+        raise AssertionError("Cached manifest was rescanned")
+    with monkeypatch.context() as m:
+        m.setattr(PlateManifest, '_scan', scan)
+        cached = PlateManifest(plate, cache_path=tmp_path / "manifest.json")
+    assert np.array_equal(cached.sites, manifest.sites)
+    assert cached.get('A', '01', 'w1') == manifest.get('A', '01', 'w1')
+
+    (plate / "P1_A02_s1_w1.tif").write_bytes(b"0")
+    os.utime(plate, ns=(0, 0))
+    refreshed = PlateManifest(plate, cache_path=tmp_path / "manifest.json")
+    assert len(refreshed) == 9 and refreshed.incomplete() == []
+
+    # only the modified directory is scanned again, new subfolders are picked up
+    (plate / "2020-06-03" / "P1_AA12_s1_w2.tif").unlink()
+    (plate / "2020-06-04").mkdir()
+    (plate / "2020-06-04" / "P1_C03_s1_w1.tif").write_bytes(b"00")
+    os.utime(plate, ns=(1, 1))
+    os.utime(plate / "2020-06-03", ns=(1, 1))
+    assert refreshed.refresh() and not refreshed.refresh()
+    assert refreshed.incomplete() == [('C', '03', 1), ('AA', '12', 1)]
+    assert refreshed.stat("2020-06-04/P1_C03_s1_w1.tif")[0] == 2
+    assert refreshed.stat("P1_C03_s1_w1.tif") is None
+    assert len(PlateManifest(plate, cache_path=tmp_path / "manifest.json")) == 9
+    with pytest.raises(ValueError):
+        PlateManifest(plate / "P1_A01_s1_w1.tif")
+
+def test_plaque_collection():
+    """
+    **test_plaque_collection Function**
+    This function tests that the plaques of a mask are measured into a PlaqueCollection whose 
+    arrays match the Plaque views it returns, and which filters plaques by area and border.
+    
+    Args:
+        None
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    MASK = np.zeros((100, 120), dtype=np.uint8)
+    MASK[10:20, 10:30] = 1
+    MASK[40:71, 50:61] = 1
+    MASK[80:83, 80:83] = 1
+    MASK[0:10, 100:110] = 1
+
+    for use_picks in (False, True):
+        plaques = PlaquesMask("well", MASK, use_picks=use_picks).get_plaques(50, 1000)
+        assert isinstance(plaques, PlaqueCollection) and len(plaques) == 2
+        assert np.array_equal(plaques.bboxes, [[10, 10, 20, 30], [40, 50, 71, 61]])
+        views = list(plaques)
+        assert all(isinstance(plq, Plaque) for plq in views) and len(plaques[::-1]) == 2
+        assert np.allclose(plaques.areas, [plq.area for plq in views])
+        assert np.allclose(plaques.perimeters, [plq.perimeter for plq in views])
+        assert np.allclose(plaques.centroids, [plq.centroid for plq in views])
+        assert np.allclose(plaques.eccentricities, [plq.eccentricity() for plq in views])
+        # the fluorescence object readouts use the same eccentricity on boolean masks
+        assert np.allclose(plaques.eccentricities, 
+                           [view_eccentricity(plq.mask > 0) for plq in views])
+    assert np.allclose(plaques.centroids, [[14.5, 19.5], [55, 55]])
+    small = PlaquesMask("well", MASK).get_plaques(0, 10)
+    assert np.array_equal(small.bboxes, [[80, 80, 83, 83]]) and small.areas[0] == 9
+    with pytest.raises(ValueError):
+        PlaqueCollection(MASK, [1], np.zeros((2, 4)), np.zeros((1, 2)), [1], [1])
+
+def test_measure_plaques_scaling():
+    """
+    **test_measure_plaques_scaling Function**
+    This function tests that the measures of a PlaqueCollection equal those of its Plaque objects, 
+    also with overlapping bounding boxes and Pick's method, and that computing them grows linearly 
+    with the number of plaques.
+    
+    Args:
+        None
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    yy, xx = np.mgrid[:120, :120]
+    MASK = np.zeros((120, 120), dtype=np.uint8)
+    MASK[10:20, 10:30] = 1
+    MASK[(yy - 60)**2 / 400 + (xx - 50)**2 / 100 <= 1] = 1
+    MASK[40:44, 59:72] = 1
+    MASK[95:110, 90:100] = 1
+    for use_picks in (False, True):
+        plaques_mask = PlaquesMask("well", MASK, use_picks=use_picks)
+        plaques = plaques_mask.get_plaques(20, 1000)
+        assert len(plaques) == 4 and (plaques.bbox_pixel_counts > plaques.pixel_counts).any()
+        assert plaques_mask.get_measure(plaques) == plaques_mask.get_measure(list(plaques))
+    with pytest.warns(RuntimeWarning):
+        empty = plaques_mask.get_measure(plaques_mask.get_plaques(5000, 6000))
+    assert empty['mean_plq_size'] == 0 and empty['centroid'] == [None, None]
+
+    rng = np.random.default_rng(0)
+    def measure_time(n):
+        bboxes = np.sort(rng.integers(0, 2000, (n, 4)), axis=1)
+        areas = rng.integers(1, 1000, n)
+        start = time.perf_counter()
+        measure_plaques(areas, bboxes, rng.random(n))
+        return time.perf_counter() - start
+    measure_time(10**4)
+    small = min(measure_time(10**4) for _ in range(3))
+    large = min(measure_time(10**5) for _ in range(3))
+    assert large < 40 * small + 0.05, "measure_plaques does not scale linearly"
+
+def test_fit_plate_grid():
+    """
+    **test_fit_plate_grid Function**
+    This function tests that the plate grid fit assigns every detected well of rotated, sheared 
+    and jittered plates of all standard formats to its row and column, and reports empty cells, 
+    duplicate detections and detections outside of the plate.
+    
+    Args:
+        None
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    rng = np.random.default_rng(0)
+    for (n_rows, n_columns) in PLATE_FORMATS.values():
+        pitch = 9000 / n_columns
+        theta = np.radians(rng.uniform(-4, 4))
+        rows, cols = np.mgrid[:n_rows, :n_columns].reshape(2, -1)
+        keep = rng.random(rows.size) > 0.1
+        keep[[0, -1]] = True
+        rows, cols = rows[keep], cols[keep]
+        y = 300 + rows*pitch*1.01*np.cos(theta) + cols*pitch*np.sin(theta)
+        x = 200 - rows*pitch*1.01*np.sin(theta) + cols*pitch*np.cos(theta)
+        points = np.stack([y, x], axis=-1) + rng.normal(0, pitch*0.05, (len(rows), 2))
+        order = rng.permutation(len(points))
+
+        fit = fit_plate_grid(points[order], n_rows, n_columns)
+        assert np.array_equal(fit['nrow'], rows[order])
+        assert np.array_equal(fit['ncol'], cols[order])
+        assert len(fit['empty_cells']) == (~keep).sum() and fit['duplicate_cells'] == []
+        if n_rows*n_columns >= 96:
+            assert np.isclose(fit['rotation'], np.degrees(theta), atol=0.5)
+        assert np.allclose(fit['origin'], [300, 200], atol=pitch*0.1)
+
+    # a split well and a detection beyond the plate
+    extra = np.array([points[0] + pitch*0.1, fit['origin'] + n_rows*fit['row_step']])
+    fit = fit_plate_grid(np.concatenate([points, extra]), n_rows, n_columns)
+    assert fit['duplicate_cells'] == [(0, 0)] and list(fit['outside']) == [len(points) + 1]
+    assert fit['nrow'][-1] == fit['ncol'][-1] == -1
+    assert fit_plate_grid(np.zeros((0, 2)), 2, 3)['empty_cells'] == [(r, c) for r in range(2)
+                                                                     for c in range(3)]
+    with pytest.raises(ValueError):
+        fit_plate_grid(np.zeros((4, 3)), 2, 3)
+
+def test_get_all_plaque_regions_tiled():
+    """
+    **test_get_all_plaque_regions_tiled Function**
+    This function tests that tiled plaque region labelling gives exactly the untiled label image, 
+    including the numbering of the labels, for regions crossing tile seams and corners.
+    
+    Args:
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    rng = np.random.default_rng(0)
+    for (shape, density, plq_connect) in [((90, 70), 0.02, 2.5), ((64, 128), 0.002, 6), 
+                                          ((1, 50), 0.1, 1), ((40, 40), 0, 3)]:
+        IMG = rng.random(shape) < density
+        expected = get_all_plaque_regions(IMG, 0.5, plq_connect)
+        for (tile_size, workers) in [(8, None), (17, 2), (32, None)]:
+            res = get_all_plaque_regions(IMG, 0.5, plq_connect, tile_size=tile_size, 
+                                         workers=workers)
+            assert res.dtype == expected.dtype
+            assert np.array_equal(res, expected), "Tiled label image is incorrect"
+
+
+def test_instrumentation(tmp_path, input_image, virus_params):
+    """
+    **test_instrumentation Function**
+    This function tests that stage timers and counters reach the registered sinks, that callback 
+    sinks filter by name and that nothing is recorded once the sinks are removed.
+    
+    Args:
+        tmp_path (Path, required): A temporary directory provided by pytest.
+        input_image (np.ndarray, required): The input image of get_plaque_mask.
+        virus_params (dict, required): The parameters of get_plaque_mask.
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    summary = MemorySink()
+    peaks = []
+    with instrument(summary, CallbackSink(peaks.append, names=['peaks_found']),
+                    JSONLinesSink(tmp_path / "events.jsonl")) as (_, _, lines):
+        assert instrumentation_enabled()
+        _, global_peak_coords = get_plaque_mask(input_image, virus_params)
+        with pytest.raises(ValueError):
+            with stage_timer('failing', well='A01'):
+                raise ValueError()
+        lines.close()
+
+    assert not instrumentation_enabled()
+    stats = summary.summary()
+    assert stats['stages']['get_plaque_mask']['calls'] == 1
+    assert stats['stages']['plaque_regions']['calls'] == 1
+    assert stats['counters']['peaks_found'] == len(global_peak_coords)
+    assert 'objects_labelled' in stats['counters']
+    assert [e['name'] for e in peaks] == ['peaks_found']
+    assert summary.events[-1]['failed'] and summary.events[-1]['well'] == 'A01'
+    with open(tmp_path / "events.jsonl") as f:
+        assert len(f.readlines()) == len(summary.events)
+
+    increment_counter('peaks_found', 10)
+    get_plaque_mask(input_image, virus_params)
+    assert summary.summary() == stats, "Events were recorded without registered sinks"
+
+
+def test_lazy_imports():
+    """
+    **test_lazy_imports Function**
+    This function tests that importing the segmentation functions in a fresh interpreter does not 
+    import the plotting and dataframe dependencies, and that every name exported by a subpackage 
+    resolves to the object of its submodule.
+    
+    Args:
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    code = ("import sys\n"
+            "from PyPlaque.utils import get_plaque_mask, remove_background\n"
+            "from PyPlaque.experiment import FluorescenceMicroscopy\n"
+            "from PyPlaque.view import LabelImageReadout\n"
+            "print(' '.join(m for m in ('matplotlib', 'seaborn', 'sklearn', 'pandas') "
+            "if m in sys.modules))")
+    res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert res.stdout.strip() == "", f"Importing segmentation loaded {res.stdout.strip()}"
+
+    # functions named like their submodule are not hidden by a submodule imported first
+    names = ('centroid', 'check_numbers', 'fixed_threshold', 'gaussian_blur', 'parallel_map', 
+             'remove_artifacts', 'remove_background', 'stitch_wells')
+    code = ("import importlib, types\n"
+            f"names = {names}\n"
+            "for name in names:\n"
+            "    importlib.import_module(f'PyPlaque.utils.{name}')\n"
+            "from PyPlaque.utils.gaussian_blur import GAUSSIAN_BLUR_METHODS\n"
+            "import PyPlaque.utils as utils\n"
+            "print(' '.join(n for n in names if isinstance(getattr(utils, n), types.ModuleType)))")
+    res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert res.stdout.strip() == "", f"Modules returned for {res.stdout.strip()}"
+
+    for subpackage in ('bench', 'experiment', 'phenotypes', 'specimen', 'utils', 'view'):
+        package = importlib.import_module(f"PyPlaque.{subpackage}")
+        for name in package.__all__:
+            assert not isinstance(getattr(package, name), types.ModuleType), \
+                f"PyPlaque.{subpackage}.{name} is a module"
+
+
+def test_qc_report(tmp_path):
+    """
+    **test_qc_report Function**
+    This function tests that QC panels are downsampled and rendered headless into a tiled montage 
+    and a multi-page PDF.
+    
+    Args:
+        tmp_path (Path, required): A temporary directory provided by pytest.
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    rng = np.random.default_rng(0)
+    IMG = rng.normal(1000, 50, (200, 160))
+    MASK = np.zeros((200, 160), dtype=bool)
+    MASK[40:80, 60:100] = True
+    panel = qc_panel(IMG, title="A01", mask=MASK, peaks=[[60, 80]], boxes=[[40, 60, 80, 100]])
+    assert panel['image'].shape == panel['mask'].shape == (50, 40)
+    assert np.array_equal(panel['peaks'], [[15, 20]])
+    with pytest.raises(ValueError):
+        qc_panel(IMG[None])
+
+    montage = render_qc_report([panel] * 5, tmp_path / "qc" / "plate.png", ncols=3, 
+                               panel_size=64)
+    assert cv2.imread(str(montage)).shape == (128, 192, 3)
+    pdf = render_qc_report([panel] * 5, tmp_path / "plate.pdf", ncols=2, per_page=2, 
+                           panel_size=64, workers=2)
+    with open(pdf, 'rb') as f:
+        content = f.read()
+    assert content.startswith(b"%PDF") and content.count(b"/Type /Page ") == 3
+
+
+def test_preview(tmp_path):
+    """
+    **test_preview Function**
+    This function tests that parameters are scaled for previews, that images are reduced by the 
+    mean, maximum or nearest pixel and read at reduced resolution from TIFF and PNG files, and 
+    that preview counts are compared with full resolution counts.
+    
+    Args:
+        tmp_path (Path, required): A temporary directory provided by pytest.
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    params = {'virus': {'min_plaque_area': 2000, 'plaque_gaussian_filter_sigma': 50.0, 
+                        'peak_region_size': 2, 'virus_threshold': 0.2}, 'min_area': 100}
+    scaled = scale_params(params, 4)
+    assert scaled == {'virus': {'min_plaque_area': 125, 'plaque_gaussian_filter_sigma': 12.5, 
+                                'peak_region_size': 1, 'virus_threshold': 0.2}, 'min_area': 6}
+    assert params['virus']['min_plaque_area'] == 2000
+    with pytest.raises(ValueError):
+        scale_params(params, 0)
+
+    IMG = np.arange(30, dtype=np.uint16).reshape(5, 6)
+    assert np.array_equal(reduce_image(IMG, 2, 'nearest'), IMG[::2, ::2])
+    assert np.array_equal(reduce_image(IMG, 2, 'max'), [[7, 9, 11], [19, 21, 23], [25, 27, 29]])
+    mean = reduce_image(IMG * 2, 2)
+    assert mean.dtype == np.uint16
+    assert np.array_equal(mean, [[7, 11, 15], [31, 35, 39], [49, 53, 57]])
+    with pytest.raises(ValueError):
+        reduce_image(IMG, 2, 'median')
+
+    IMG = np.random.default_rng(0).integers(0, 255, (64, 48), dtype=np.uint8)
+    tiff_path = tmp_path / "well.tif"
+    with tifffile.TiffWriter(tiff_path) as tif:
+        tif.write(IMG, subifds=1)
+        tif.write(reduce_image(IMG, 2), subfiletype=1)
+    assert np.array_equal(read_preview(tiff_path, 4), reduce_image(reduce_image(IMG, 2), 2))
+    assert np.array_equal(read_preview(tiff_path, 4, method='max'), reduce_image(IMG, 4, 'max'))
+    png_path = tmp_path / "well.png"
+    cv2.imwrite(str(png_path), IMG)
+    assert np.array_equal(read_preview(png_path, 4, "grayscale", "nearest"), IMG[::4, ::4])
+    assert read_preview(png_path, 4, "rgb").shape == (16, 12, 3)
+
+    agreement = count_agreement([2, 0, 4, 2], [2, 1, 4, 3])
+    assert agreement['n_wells'] == 4 and agreement['exact'] == 0.5
+    assert agreement['mean_absolute_error'] == 0.5 and agreement['relative_error'] == 0.25
+    assert 0.9 < agreement['correlation'] < 1
+    undefined = count_agreement([0, 0], [0, 1])
+    assert undefined['relative_error'] is None and undefined['correlation'] is None
+    with pytest.raises(ValueError):
+        count_agreement([1, 2], [1])
+
+
+def test_crystal_violet_instrumentation(tmp_path):
+    """
+    **test_crystal_violet_instrumentation Function**
+    This function tests that a crystal violet plate whose masks are generated at runtime loads with 
+    instrumentation enabled and that the mask of every well is timed under its name.
+    
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    from PyPlaque.bench import make_crystal_violet_plate
+    from PyPlaque.experiment import CrystalViolet
+
+    image_folder, mask_folder, _ = make_crystal_violet_plate(tmp_path / "cv", n_wells=2, 
+                                                             image_size=64)
+    exp = CrystalViolet(image_folder, mask_folder)
+    exp.get_individual_plates()
+    summary = MemorySink()
+    with instrument(summary):
+        exp.load_well_images_and_masks_for_plate(read_mask=False, all_grayscale=True)
+
+    assert len(exp.well_dict[exp.plate_indiv_dir[0]]['mask']) == 2
+    assert summary.summary()['stages']['crystal_violet_mask']['calls'] == 2
+    wells = [e['well'] for e in summary.events if e['name'] == 'crystal_violet_mask']
+    assert wells == [exp.plate_indiv_dir[0] + "-0,0", exp.plate_indiv_dir[0] + "-0,1"]
+
+
+def test_stage_cache_sources(tmp_path, monkeypatch):
+    """
+    **test_stage_cache_sources Function**
+    This function tests that the experiments key cached stages on the image files, so that a 
+    cached crystal violet mask is returned without decoding its file and the wells of a 
+    fluorescence plate share their entries between the loaders.
+    
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+        monkeypatch (pytest.MonkeyPatch): The pytest fixture used to detect decoding.
+    
+    Returns:
+        None: The function asserts expected outcomes directly.
+    """
+    from PyPlaque.bench import make_crystal_violet_plate, make_fluorescence_plate
+    from PyPlaque.experiment import CrystalViolet, FluorescenceMicroscopy
+
+    image_folder, mask_folder, _ = make_crystal_violet_plate(tmp_path / "cv", n_wells=2, 
+                                                             image_size=64)
+    exp = CrystalViolet(image_folder, mask_folder, cache=tmp_path / "cache")
+    exp.get_individual_plates()
+    exp.load_well_images_and_masks_for_plate(read_mask=False, all_grayscale=True)
+    image_file = exp.well_dict[exp.plate_indiv_dir[0]]['image_name'][0]
+    def decode(*args, **kwargs):
+        raise AssertionError("A cached mask decoded its image")
+    monkeypatch.setattr(exp, 'read_from_path', decode)
+    mask = exp.get_runtime_mask("well", image_file)
+    assert np.array_equal(mask, exp.well_dict[exp.plate_indiv_dir[0]]['mask'][0])
+    monkeypatch.undo()
+
+    image_folder, mask_folder, _ = make_fluorescence_plate(tmp_path / "fl", n_wells=2, 
+                                                           image_size=64)
+    exp = FluorescenceMicroscopy(image_folder, mask_folder, cache=tmp_path / "cache")
+    exp.get_individual_plates()
+    list(exp.iter_wells(nuclei_file_pattern=r'_w1', virus_file_pattern=r'_w2', prefetch=0))
+    exp.load_wells_for_plate_virus(file_pattern=r'_w2')
+    exp.load_wells_for_plate_nuclei(file_pattern=r'_w1')
+    for stage in ('plaque_mask', 'remove_background'):
+        assert len(list((tmp_path / "cache" / stage).glob("*.npz"))) == 2
+    list(exp.iter_wells(nuclei_file_pattern=r'_w1', virus_file_pattern=r'_w2', prefetch=0, 
+                        preview=True))
+    assert len(list((tmp_path / "cache" / 'plaque_mask').glob("*.npz"))) == 4
@@ -0,0 +1,309 @@
+import os
+
+import numpy as np
+import pytest
+
+from PyPlaque.bench import make_fluorescence_plate
+from PyPlaque.experiment import FluorescenceMicroscopy
+from PyPlaque.utils import get_plaque_mask
+from PyPlaque.view import LabelImageReadout, PlateImage, PlateReadout, ReadoutStore
+from PyPlaque.view import WellImageReadout
+
+@pytest.fixture()
+def view_well_input(tmp_path):
+    """
+    **view_well_input Function**
+    This fixture returns the arguments of a well image readout built from a small synthetic well
+    with a few plaques of different sizes on a grid of nuclei, together with the virus parameters
+    used to segment it.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+
+    Returns:
+        tuple: A tuple containing the readout keyword arguments and the global peak coordinates.
+    """
+    params = FluorescenceMicroscopy(str(tmp_path), str(tmp_path)).get_params()
+    virus_params = params['virus']
+    virus_params['min_plaque_area'] = 100
+    virus_params['plaque_gaussian_filter_size'] = 20
+    virus_params['plaque_gaussian_filter_sigma'] = 10
+    virus_params['peak_region_size'] = 10
+
+    yy, xx = np.mgrid[:256, :256]
+    nuclei_image = np.zeros((256, 256), dtype=np.uint16)
+    nuclei_image[(yy % 8 < 3) & (xx % 8 < 3)] = 4000
+    plaque_image = np.zeros((256, 256), dtype=np.float64)
+    for (y, x, r) in [(60, 60, 25), (170, 80, 15), (120, 190, 35), (230, 230, 5)]:
+        plaque_image += 8000*np.exp(-((yy - y)**2 + (xx - x)**2)/(2*r**2))
+    plaque_image = plaque_image.astype(np.uint16)
+
+    plaque_mask, global_peak_coords = get_plaque_mask(plaque_image, virus_params)
+    readout_args = {
+        'nuclei_image_name': 'P1_A01_s1_w1.tif',
+        'plaque_image_name': 'P1_A01_s1_w2.tif',
+        'nuclei_image': nuclei_image,
+        'plaque_image': plaque_image,
+        'nuclei_mask': np.where(nuclei_image > 0, 1, 0),
+        'plaque_mask': plaque_mask,
+        'virus_params': virus_params
+    }
+    return readout_args, global_peak_coords
+
+def test_label_image_readout(view_well_input):
+    """
+    **test_label_image_readout Function**
+    This test checks that the single pass LabelImageReadout gives the same well level and mean
+    object level readouts as the per-object WellImageReadout.
+
+    Args:
+        view_well_input (tuple): The fixture with the readout arguments and peak coordinates.
+
+    Returns:
+        None
+    """
+    readout_args, global_peak_coords = view_well_input
+    well_readout = WellImageReadout(**readout_args)
+    label_readout = LabelImageReadout(**readout_args, global_peak_coords=global_peak_coords)
+
+    well_res = label_readout.get_well_readouts()
+    assert well_res['maxNucleiIntensity'] == well_readout.get_max_nuclei_intensity()
+    assert well_res['totalNucleiIntensity'] == well_readout.get_total_nuclei_intensity()
+    assert well_res['numberOfNuclei'] == well_readout.get_nuclei_count()
+    assert well_res['numberOfPlaques'] == well_readout.get_plaque_count()
+    assert well_res['numberOfInfectedNuclei'] == well_readout.get_infected_nuclei_count()
+
+    plq_object_readouts = [well_readout.call_plaque_object_readout(plq_object,
+                            readout_args['virus_params'])
+                            for plq_object in well_readout.get_plaque_objects()]
+    object_res = label_readout.get_object_readouts()
+    assert len(object_res['Label']) == len(plq_object_readouts) > 0
+    assert np.array_equal(object_res['Area'],
+                          [plq.get_area() for plq in plq_object_readouts])
+    assert np.allclose(object_res['Eccentricity'],
+                       [plq.get_eccentricity() for plq in plq_object_readouts])
+    assert np.allclose(object_res['Roundness'],
+                       [plq.get_roundness() for plq in plq_object_readouts])
+    assert np.array_equal(object_res['numberOfPeaks'],
+                          [len(plq.get_number_of_peaks()) for plq in plq_object_readouts])
+    assert np.allclose(object_res['numberOfNucleiInPlaque'],
+                       [plq.get_nuclei_in_plaque() for plq in plq_object_readouts])
+    assert np.allclose(object_res['totalIntensityGFP'],
+                       [plq.get_total_intensity_GFP() for plq in plq_object_readouts])
+    assert np.allclose(object_res['meanIntensityGFP'],
+                       [plq.get_mean_intensity_GFP() for plq in plq_object_readouts])
+
+def test_label_image_readout_float(view_well_input):
+    """
+    **test_label_image_readout_float Function**
+    This test checks that the intensity readouts of LabelImageReadout keep the fractions of 
+    floating point plaque images, like the per-object readouts do.
+
+    Args:
+        view_well_input (tuple): The fixture with the readout arguments and peak coordinates.
+
+    Returns:
+        None
+    """
+    readout_args, global_peak_coords = view_well_input
+    readout_args = dict(readout_args, plaque_image=readout_args['plaque_image'] / 7.3 + 0.25)
+    well_readout = WellImageReadout(**readout_args)
+    label_readout = LabelImageReadout(**readout_args, global_peak_coords=global_peak_coords)
+
+    plq_object_readouts = [well_readout.call_plaque_object_readout(plq_object,
+                            readout_args['virus_params'])
+                            for plq_object in well_readout.get_plaque_objects()]
+    object_res = label_readout.get_object_readouts()
+    assert object_res['totalIntensityGFP'].dtype == np.float64
+    assert np.allclose(object_res['totalIntensityGFP'],
+                       [plq.get_total_intensity_GFP() for plq in plq_object_readouts])
+    assert np.allclose(object_res['meanIntensityGFP'],
+                       [plq.get_mean_intensity_GFP() for plq in plq_object_readouts])
+
+def test_plate_readout_object_table(tmp_path, view_well_input):
+    """
+    **test_plate_readout_object_table Function**
+    This test checks that the single pass plate readout keeps one row per plaque object in its 
+    object table and that the object-level means per well are derived from it, with 0 for wells 
+    without plaque objects.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+        view_well_input (tuple): The fixture with the readout arguments and peak coordinates.
+
+    Returns:
+        None
+    """
+    readout_args, global_peak_coords = view_well_input
+    exp = FluorescenceMicroscopy(str(tmp_path), str(tmp_path))
+    exp.params['virus'] = readout_args['virus_params']
+    well = {
+        'nuclei_image_name': readout_args['nuclei_image_name'],
+        'nuclei_image': readout_args['nuclei_image'],
+        'nuclei_mask': readout_args['nuclei_mask'],
+        'virus_image_name': readout_args['plaque_image_name'],
+        'virus_image': readout_args['plaque_image'],
+        'virus_mask': readout_args['plaque_mask'],
+        'virus_peaks': global_peak_coords
+    }
+    empty_well = dict(well, nuclei_image_name='P1_B02_s1_w1.tif',
+                      virus_mask=np.zeros_like(readout_args['plaque_mask']))
+
+    plate_readout = PlateReadout(exp)
+    _, abs_df_object = plate_readout.generate_readouts_dataframe(wells=[well, empty_well])
+    object_res = LabelImageReadout(**readout_args,
+                                   global_peak_coords=global_peak_coords).get_object_readouts()
+    table = plate_readout.object_table
+    assert len(table) == len(object_res['Label']) > 0
+    assert np.array_equal(table['Label'], object_res['Label'])
+    assert np.array_equal(table['Area'], object_res['Area'])
+    assert (table['wellRow'] == 'A').all() and (table['wellIndex'] == 0).all()
+
+    assert list(abs_df_object['wellRow']) == ['A', 'B']
+    assert list(abs_df_object['wellColumn']) == ['01', '02']
+    for key in ('Area', 'Roundness', 'numberOfPeaks', 'totalIntensityGFP'):
+        assert np.isclose(abs_df_object[key][0], np.mean(object_res[key]))
+        assert abs_df_object[key][1] == 0
+
+def test_readout_store(tmp_path, view_well_input):
+    """
+    **test_readout_store Function**
+    This test checks that plate readouts written to the partitioned Parquet store are read back 
+    with their fixed schema, partition columns and filters, and that rewriting a plate replaces it.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+        view_well_input (tuple): The fixture with the readout arguments and peak coordinates.
+
+    Returns:
+        None
+    """
+    pytest.importorskip("pyarrow")
+    import pyarrow.compute as pc
+
+    readout_args, global_peak_coords = view_well_input
+    exp = FluorescenceMicroscopy(str(tmp_path), str(tmp_path))
+    exp.params['virus'] = readout_args['virus_params']
+    well = {
+        'nuclei_image_name': readout_args['nuclei_image_name'],
+        'nuclei_image': readout_args['nuclei_image'],
+        'nuclei_mask': readout_args['nuclei_mask'],
+        'virus_image_name': readout_args['plaque_image_name'],
+        'virus_image': readout_args['plaque_image'],
+        'virus_mask': readout_args['plaque_mask'],
+        'virus_peaks': global_peak_coords
+    }
+
+    store = ReadoutStore(tmp_path / "store", experiment="exp/1")
+    for plate in ["P1", "P2", "P1"]:
+        store.write_readouts(PlateReadout(exp), plate=plate, wells=[well])
+    assert store.plates() == store.plates('plaque') == ["P1", "P2"]
+    assert store.plates(experiment="other") == []
+
+    well_df = store.read('well')
+    assert len(well_df) == 2 and set(well_df['experiment']) == {"exp/1"}
+    assert well_df['maxNucleiIntensity'].dtype == np.float64
+    plaques = store.read('plaque')
+    n_objects = len(plaques) // 2
+    assert n_objects > 0 and plaques['Label'].dtype == np.int64
+    large = store.read('plaque', columns=['plate', 'Area'],
+                       filter=(pc.field('plate') == "P2") & (pc.field('Area') > 1000))
+    assert list(large.columns) == ['plate', 'Area'] and (large['Area'] > 1000).all()
+    assert len(large) == np.sum(plaques['Area'][plaques['plate'] == "P2"] > 1000)
+    with pytest.raises(ValueError):
+        store.read('plates')
+
+def test_watch_wells(tmp_path):
+    """
+    **test_watch_wells Function**
+    This test checks that wells of a plate that is still being written are read out once both 
+    channel files are complete, that later calls only load new or rewritten wells, and that the 
+    watcher feeds the wells into the plate readouts.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary directory provided by pytest.
+
+    Returns:
+        None
+    """
+    image_folder, mask_folder, _ = make_fluorescence_plate(tmp_path / 'exp', n_wells=3, 
+                                                           plate_name='P1', image_size=96, 
+                                                           plaque_radius=(5, 15))
+    plate = tmp_path / 'exp' / 'images' / 'P1'
+    pending = (plate / 'P1_A03_s1_w2.tif').read_bytes()
+    os.remove(plate / 'P1_A03_s1_w2.tif')
+
+    exp = FluorescenceMicroscopy(image_folder, mask_folder)
+    exp.params['nuclei']['correction_ball_radius'] = 10
+    exp.params['virus'].update({'min_plaque_area': 20, 'plaque_gaussian_filter_size': 10, 
+                                'plaque_gaussian_filter_sigma': 5, 'peak_region_size': 5, 
+                                'correction_ball_radius': 10})
+    exp.get_individual_plates()
+    wells = list(exp.iter_new_wells(settle=0, prefetch=0))
+    assert [(w['row'], w['column']) for w in wells] == [('A', '01'), ('A', '02')]
+    assert list(exp.iter_new_wells(settle=0)) == []
+
+    (plate / 'P1_A03_s1_w2.tif').write_bytes(pending)
+    assert list(exp.iter_new_wells(settle=3600)) == []
+    os.utime(plate / 'P1_A01_s1_w1.tif', ns=(0, 0))
+    assert [w['column'] for w in exp.iter_new_wells(settle=0)] == ['01', '03']
+
+    processed = {}
+    abs_df_well, abs_df_object = PlateReadout(exp).generate_readouts_dataframe(
+        wells=exp.watch_wells(settle=0, interval=0, expected_wells=3, processed=processed))
+    assert list(abs_df_well['VirusImageName']) == ['P1_A01_s1_w2.tif', 'P1_A02_s1_w2.tif', 
+                                                   'P1_A03_s1_w2.tif']
+    assert list(abs_df_object['wellColumn']) == ['01', '02', '03'] and len(processed) == 6
+    assert list(exp.watch_wells(settle=0, interval=0, idle_timeout=0, processed=processed)) == []
+
+def test_plate_image_wells():
+    """
+    **test_plate_image_wells Function**
+    This test checks that the wells of a plate image are extracted as views of the plate, masked 
+    once, and numbered by row and column, also with jittered and missing wells and inverted 
+    plates.
+
+    Returns:
+        None
+    """
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[:400, :600]
+    mask = np.zeros((400, 600), dtype=np.uint8)
+    centres = {}
+    for r in range(4):
+        for c in range(6):
+            if (r, c) == (2, 3):
+                continue
+            centre = (50 + 100*r + rng.integers(-8, 9), 50 + 100*c + rng.integers(-8, 9))
+            mask[(yy - centre[0])**2 + (xx - centre[1])**2 <= 30**2] = 1
+            centres[(r, c)] = centre
+    image = rng.integers(1, 255, (400, 600), dtype=np.uint8)
+
+    plate = PlateImage(4, 6, image, mask)
+    well_dict = plate.get_well_positions()
+    assert len(well_dict) == 23 == len(plate.get_wells())
+    for well in well_dict.values():
+        assert np.shares_memory(well['img'], image)
+        assert np.array_equal(well['masked_img'], np.where(well['mask'] == 1, well['img'], 1))
+    # the columns before the missing well are complete
+    first_columns = [w for w in well_dict.values() if w['ncol'] < 3]
+    assert len(first_columns) == 12
+    for well in first_columns:
+        centre = centres[(well['nrow'], well['ncol'])]
+        assert well['minr'] < centre[0] < well['maxr'] and well['minc'] < centre[1] < well['maxc']
+    masked = plate.get_wells()
+    assert all(w.base is masked[0].base is not None for w in masked)
+
+    # fitting the plate grid is not thrown off by the missing well
+    grid_plate = PlateImage(4, 6, image, mask)
+    grid_dict = grid_plate.get_well_positions(method='grid')
+    for well in grid_dict.values():
+        centre = centres[(well['nrow'], well['ncol'])]
+        assert well['minr'] < centre[0] < well['maxr'] and well['minc'] < centre[1] < well['maxc']
+    assert grid_plate.grid_fit['empty_cells'] == [(2, 3)]
+    with pytest.raises(ValueError):
+        grid_plate.get_well_positions(method='nearest')
+
+    inverted = PlateImage(4, 6, image, mask, inverted=True).get_well_positions()
+    assert [w['ncol'] for w in inverted.values()] == [6 - w['ncol'] for w in well_dict.values()]
+    assert PlateImage(4, 6, image, np.zeros_like(mask)).get_well_positions() == {}